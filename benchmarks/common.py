@@ -0,0 +1,44 @@
+"""Helpers shared by the benchmarks."""
+
+import os
+from dotenv import dotenv_values
+from sqlalchemy import create_engine, make_url
+
+
+def load_environment(environment="prod"):
+    """Load `.env` (and `.env.<environment>`) the same way `main.py` does."""
+    base_env = dotenv_values(".env")
+    if environment != "prod":
+        base_env.update(dotenv_values(f".env.{environment}"))
+    os.environ.update(base_env)
+
+
+def schema_url(schema):
+    """
+    The `DATABASE_URL` with its search path set to a single schema.
+
+    Unqualified table names, including those in the models and views, then
+    resolve to that schema instead of `public`.
+    """
+    url = make_url(os.getenv("DATABASE_URL"))
+    url = url.update_query_dict({"options": f"-csearch_path={schema}"})
+    return url.render_as_string(hide_password=False)
+
+
+def schema_engine(schema):
+    """An engine whose connections only see one schema."""
+    return create_engine(schema_url(schema))
+
+
+def use_schema(schema):
+    """
+    Point `DATABASE_URL` at a single schema for the rest of the process.
+
+    Code that builds its own engine from the environment, like `create_views`,
+    then works on the benchmark's tables instead of the real ones.
+
+    Returns:
+        Engine: An engine for the schema.
+    """
+    os.environ["DATABASE_URL"] = schema_url(schema)
+    return create_engine(os.environ["DATABASE_URL"])
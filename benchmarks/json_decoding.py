@@ -0,0 +1,92 @@
+"""
+Compare the JSON decoders `database.decoding` can use on real data files.
+
+Reads every bill, amendment and vote file the loaders would, into memory, then
+times decoding them with each installed decoder. No database is needed:
+
+    python -m benchmarks.json_decoding --data_dir data --congress 119 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+from database import decoding
+from database.bills import BillOrm
+from database.votes import VoteOrm
+from database.amendments import AmendmentOrm
+from shared_meta import downloaded_sessions
+
+LOADERS = {"bills": BillOrm, "amendments": AmendmentOrm, "votes": VoteOrm}
+
+
+def read_documents(data_dir, congress_nums):
+    """Read the raw bytes of every data file, by kind."""
+    documents = {}
+    for kind, orm_class in LOADERS.items():
+        orm = orm_class(data_dir, congress_nums)
+        documents[kind] = [orm.source.read_bytes(path) for path in orm.datafiles()]
+    return documents
+
+
+def timed(fn, raws, repeat):
+    """Decode every document `repeat` times; return the median seconds per pass."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for raw in raws:
+            fn(raw)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    """Read the data files, decode them with each decoder and print the timings."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data_dir",
+        default="data",
+        help="Directory containing the data, or an archive of it (default: 'data')",
+    )
+    parser.add_argument(
+        "--congress",
+        help="Congress number to read; separate multiple numbers with a comma",
+    )
+    parser.add_argument("--repeat", default=5, type=int, help="Passes per decoder")
+    args = parser.parse_args()
+
+    congress_nums = (
+        [x for x in args.congress.split(",") if x.isdigit()]
+        if args.congress
+        else [str(x) for x in downloaded_sessions(args.data_dir)]
+    )
+    documents = read_documents(args.data_dir, congress_nums)
+    print(
+        f"Decoders installed: {', '.join(decoding.DECODERS)} "
+        f"(in use: {decoding.decoder_name()})"
+    )
+
+    print(
+        f"{'kind':<11} {'decoder':<8} {'files':>7} {'MB':>8} "
+        f"{'seconds':>9} {'MB/s':>8} {'speedup':>8}"
+    )
+    for kind, raws in documents.items():
+        if not raws:
+            continue
+        megabytes = sum(len(raw) for raw in raws) / 1024 / 1024
+        expected = [decoding.DECODERS["json"](raw) for raw in raws]
+        baseline = None
+        for name, fn in reversed(decoding.DECODERS.items()):
+            if [fn(raw) for raw in raws] != expected:
+                print(f"{kind:<11} {name:<8} decodes differently from json, skipped")
+                continue
+            seconds = timed(fn, raws, args.repeat)
+            baseline = baseline or seconds
+            print(
+                f"{kind:<11} {name:<8} {len(raws):>7} {megabytes:>8.1f} "
+                f"{seconds:>9.3f} {megabytes / seconds:>8.1f} "
+                f"{baseline / seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
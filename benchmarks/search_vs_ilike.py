@@ -0,0 +1,187 @@
+"""
+Compare full-text search with the ILIKE queries it replaces.
+
+Loads synthetic bills and amendments into a throwaway `benchmark_search`
+schema, then times the same searches both ways:
+
+    python -m benchmarks.search_vs_ilike --rows 200000 --repeat 5
+"""
+
+import random
+import argparse
+import statistics
+import time
+from sqlalchemy import text
+from benchmarks.common import load_environment, schema_engine
+from database.base import copy_rows
+from database.search import AMENDMENT_SEARCH_SQL, BILL_SEARCH_SQL, search
+
+SCHEMA = "benchmark_search"
+
+TOPICS = [
+    "health",
+    "veterans",
+    "tax",
+    "credit",
+    "education",
+    "energy",
+    "border",
+    "security",
+    "agriculture",
+    "housing",
+    "infrastructure",
+    "water",
+    "broadband",
+    "medicare",
+    "firearms",
+    "appropriations",
+]
+VERBS = ["amend", "establish", "prohibit", "require", "extend", "repeal", "improve"]
+
+SEARCHES = ["health", "veterans housing", "tax credit", "broadband", "zzyzx"]
+
+
+def synthetic_text(rng, filler):
+    """A bill title-ish sentence."""
+    words = [rng.choice(VERBS), "the"]
+    words += rng.sample(TOPICS, 2)
+    words += rng.sample(filler, 6)
+    rng.shuffle(words)
+    return "To " + " ".join(words) + ", and for other purposes."
+
+
+def load(engine, rows, seed):
+    """Create the benchmark schema and fill it with synthetic rows."""
+    rng = random.Random(seed)
+    filler = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(7))
+        for _ in range(5000)
+    ]
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"""
+CREATE TABLE {SCHEMA}.bills (
+  bill_id varchar PRIMARY KEY,
+  title varchar NOT NULL,
+  short_title varchar,
+  congress varchar NOT NULL,
+  search_vector tsvector GENERATED ALWAYS AS ({BILL_SEARCH_SQL}) STORED
+)"""))
+        conn.execute(text(f"""
+CREATE TABLE {SCHEMA}.amendments (
+  amendment_id varchar PRIMARY KEY,
+  bill_id varchar,
+  purpose varchar,
+  congress varchar NOT NULL,
+  search_vector tsvector GENERATED ALWAYS AS ({AMENDMENT_SEARCH_SQL}) STORED
+)"""))
+
+    bills = (
+        {
+            "bill_id": f"hr{i}-119",
+            "title": synthetic_text(rng, filler),
+            "short_title": None if i % 3 else f"{rng.choice(TOPICS).title()} Act",
+            "congress": "119",
+        }
+        for i in range(rows)
+    )
+    copy_rows(
+        engine,
+        f"{SCHEMA}.bills",
+        ["bill_id", "title", "short_title", "congress"],
+        bills,
+    )
+    amendments = (
+        {
+            "amendment_id": f"hamdt{i}-119",
+            "bill_id": f"hr{rng.randrange(rows)}-119",
+            "purpose": synthetic_text(rng, filler),
+            "congress": "119",
+        }
+        for i in range(rows // 2)
+    )
+    copy_rows(
+        engine,
+        f"{SCHEMA}.amendments",
+        ["amendment_id", "bill_id", "purpose", "congress"],
+        amendments,
+    )
+
+    with engine.begin() as conn:
+        for table in ("bills", "amendments"):
+            conn.execute(
+                text(f"CREATE INDEX ON {SCHEMA}.{table} USING gin (search_vector)")
+            )
+            conn.execute(text(f"ANALYZE {SCHEMA}.{table}"))
+
+
+def ilike_search(engine, query, limit=20):
+    """The substring search the site used before full-text search."""
+    with engine.connect() as conn:
+        return conn.execute(
+            text("""
+SELECT bill_id AS id FROM bills
+WHERE title ILIKE :pattern OR short_title ILIKE :pattern
+UNION ALL
+SELECT amendment_id FROM amendments WHERE purpose ILIKE :pattern
+ORDER BY id
+LIMIT :limit"""),
+            {"pattern": f"%{query}%", "limit": limit},
+        ).all()
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times; return the median milliseconds and last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    """Load synthetic data, run both kinds of search and print the timings."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rows", default=100000, type=int, help="Synthetic bills to load"
+    )
+    parser.add_argument("--repeat", default=5, type=int, help="Runs per search")
+    parser.add_argument("--seed", default=119, type=int, help="Random seed")
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the benchmark schema afterwards"
+    )
+    parser.add_argument(
+        "--environment",
+        default="prod",
+        type=str,
+        help="The environment to use (default: 'prod')",
+    )
+    args = parser.parse_args()
+
+    load_environment(args.environment)
+    engine = schema_engine(SCHEMA)
+
+    print(f"Loading {args.rows} bills and {args.rows // 2} amendments...")
+    load(engine, args.rows, args.seed)
+
+    print(f"{'query':<20} {'ilike ms':>10} {'fts ms':>10} {'speedup':>8}")
+    try:
+        for query in SEARCHES:
+            ilike_ms, _ = timed(lambda q=query: ilike_search(engine, q), args.repeat)
+            fts_ms, _ = timed(lambda q=query: search(engine, q), args.repeat)
+            print(
+                f"{query:<20} {ilike_ms:>10.1f} {fts_ms:>10.1f} "
+                f"{ilike_ms / fts_ms:>7.1f}x"
+            )
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
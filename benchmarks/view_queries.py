@@ -0,0 +1,577 @@
+"""
+Catch query performance regressions in the views and the tables behind them.
+
+Creates the real tables and views in a throwaway `benchmark_views` schema,
+loads deterministic synthetic data at a few sizes, and runs a fixed catalog of
+queries under `EXPLAIN (ANALYZE, BUFFERS)`. Each query's best execution time,
+buffers touched and plan shape are compared with a stored baseline:
+
+    # Record a baseline, eg. before changing a view or index
+    python -m benchmarks.view_queries --save_baseline
+
+    # Later: exits with status 1 if a query got slower or reads more buffers
+    python -m benchmarks.view_queries
+
+Timings only compare meaningfully on the machine the baseline was recorded on,
+and even there they're noisy, so the time tolerance is loose. Buffer counts
+are far more stable and catch most real regressions, like a lost index. Plan
+changes are reported too, but only fail the run with --strict_plans: ANALYZE
+samples rows at random, so plans with near-equal costs can flip between runs.
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from benchmarks.common import load_environment, use_schema
+from database.base import Base, copy_rows
+from database.bills import Bill
+from database.amendments import Amendment
+from database.congress import Congress, SessionLookup
+from database.legislators import Legislator
+from database.views import create_views
+from database.votes import (
+    OTHER_POSITION,
+    RESPONSE_NAMES,
+    Vote,
+    VoteMeta,
+    VotePosition,
+    VotePositionException,
+    latest_vote_ids,
+    unique_matching_field,
+)
+
+SCHEMA = "benchmark_views"
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "views.json")
+
+TABLES = [
+    Legislator,
+    Congress,
+    Bill,
+    Amendment,
+    VotePosition,
+    VoteMeta,
+    Vote,
+    VotePositionException,
+]
+
+SESSIONS = [
+    {"congress": "118", "chamber": chamber, "session": session, "party": party}
+    | {"start_date": f"{year}-01-03", "end_date": f"{year + 1}-01-03"}
+    for chamber, party in (("h", "R"), ("s", "D"))
+    for session, year in ((1, 2023), (2, 2024))
+] + [
+    {"congress": "119", "chamber": chamber, "session": session, "party": "R"}
+    | {"start_date": f"{year}-01-03", "end_date": f"{year + 1}-01-03"}
+    for chamber in ("h", "s")
+    for session, year in ((1, 2025), (2, 2026))
+]
+
+HOUSE_SEATS = 435
+SENATE_SEATS = 100
+STATES = ["AL", "CA", "FL", "IL", "NY", "OH", "PA", "TX", "VA", "WA"]
+RESULTS = ["Passed", "Failed", "Agreed to", "Rejected"]
+
+# Every query runs against each loaded size. Parameters point at rows the
+# generator always creates, so the same query plans against the same data.
+QUERIES = {
+    "latest_for_bill": (
+        "SELECT * FROM latest_vote_ids WHERE bill_id = 'hr1-119'",
+        "One bill's latest roll call",
+    ),
+    "latest_by_chamber": (
+        "SELECT chamber, count(*) FROM latest_vote_ids GROUP BY chamber",
+        "Aggregate over every latest roll call",
+    ),
+    "enriched_recent": (
+        "SELECT * FROM enriched_vote_meta ORDER BY date DESC LIMIT 50",
+        "Front page: most recent votes with sponsors",
+    ),
+    "enriched_one_vote": (
+        "SELECT * FROM enriched_vote_meta WHERE vote_id = 'h1-119.2025'",
+        "Vote page header",
+    ),
+    "enriched_latest_join": (
+        """
+SELECT e.vote_id, e.sponsor_name, e.sponsor_party
+FROM enriched_vote_meta e
+JOIN latest_vote_ids l USING (vote_id)
+WHERE e.chamber = 's'""",
+        "Latest Senate votes with sponsors",
+    ),
+    "vote_tally": (
+        """
+SELECT position, count(*) FROM votes_text
+WHERE vote_id = 'h1-119.2025'
+GROUP BY position""",
+        "Totals for one roll call",
+    ),
+    "vote_party_breakdown": (
+        """
+SELECT l.party, v.position, count(*)
+FROM votes v JOIN legislators l USING (legislator_key)
+WHERE v.vote_id = 'h1-119.2025'
+GROUP BY l.party, v.position""",
+        "Party breakdown for one roll call",
+    ),
+    "legislator_record": (
+        """
+SELECT v.vote_id, v.position, vm.date, vm.bill_id
+FROM votes_text v JOIN vote_meta vm USING (vote_id)
+WHERE v.legislator_id = 'H000001'
+ORDER BY vm.date DESC
+LIMIT 100""",
+        "A representative's recent votes",
+    ),
+    "bill_votes": (
+        """
+SELECT vote_id, date, result FROM vote_meta
+WHERE bill_id = 'hr1-119'
+ORDER BY date""",
+        "Every roll call on one bill",
+    ),
+    "congress_participation": (
+        """
+SELECT legislator_key, count(*) FILTER (WHERE position = 1) AS missed, count(*)
+FROM votes JOIN vote_meta USING (vote_id)
+WHERE vote_meta.congress = '119'
+GROUP BY legislator_key""",
+        "Whole-congress scan of every position",
+    ),
+}
+
+
+def synthetic_legislators():
+    """Full House and Senate delegations, with stable ids and keys."""
+    legislators = []
+    for i in range(HOUSE_SEATS):
+        legislators.append(
+            {
+                "id": f"H{i:06d}",
+                "bioguide_id": f"H{i:06d}",
+                "lis_id": None,
+                "term_type": "rep",
+                "district": str(i % 50),
+            }
+        )
+    for i in range(SENATE_SEATS):
+        legislators.append(
+            {
+                "id": f"S{i:03d}",
+                "bioguide_id": f"S{i:06d}",
+                "lis_id": f"S{i:03d}",
+                "term_type": "sen",
+                "district": "N/A",
+            }
+        )
+    for key, legislator in enumerate(legislators, start=1):
+        party = "R" if key % 2 else "D"
+        legislator.update(
+            name=f"Member {legislator['id']}",
+            state=STATES[key % len(STATES)],
+            party=party,
+            caucus=party,
+            legislator_key=key,
+        )
+    return legislators
+
+
+def synthetic_meta(rng, size):
+    """
+    Roll calls over two congresses, with bills and amendments they refer to.
+
+    Returns:
+        tuple[list[dict], list[dict], list[dict]]: Bills, amendments and
+            vote_meta rows.
+    """
+    lookup = SessionLookup(SESSIONS)
+    bills, amendments, meta = [], [], []
+    numbers = {}
+    per_congress = size // 2
+    for congress, start in (
+        ("118", datetime(2023, 1, 4)),
+        ("119", datetime(2025, 1, 4)),
+    ):
+        bill_count = max(per_congress // 6, 1)
+        for n in range(1, bill_count + 1):
+            bills.append(
+                {
+                    "bill_id": f"hr{n}-{congress}",
+                    "bill_type": "hr",
+                    "bill_number": str(n),
+                    "title": f"To improve program {n}, and for other purposes.",
+                    "short_title": f"Program {n} Act" if n % 3 == 0 else None,
+                    "sponsor_id": f"H{rng.randrange(HOUSE_SEATS):06d}",
+                    "sponsor_key": None,
+                    "status": "INTRODUCED",
+                    "status_at": start,
+                    "congress": congress,
+                    "source_filename": f"data/{congress}/bills/hr/hr{n}/data.json",
+                }
+            )
+        for n in range(1, max(per_congress // 10, 1) + 1):
+            amendments.append(
+                {
+                    "amendment_id": f"hamdt{n}-{congress}",
+                    "bill_id": f"hr{rng.randint(1, bill_count)}-{congress}",
+                    "sponsor_id": f"H{rng.randrange(HOUSE_SEATS):06d}",
+                    "sponsor_key": None,
+                    "chamber": "h",
+                    "purpose": f"An amendment to adjust funding for program {n}.",
+                    "congress": congress,
+                    "source_filename": (
+                        f"data/{congress}/amendments/hamdt/hamdt{n}/data.json"
+                    ),
+                }
+            )
+        congress_amendments = [a for a in amendments if a["congress"] == congress]
+
+        for i in range(per_congress):
+            # The first House vote of each congress is always on its first bill,
+            # so the queries above have something to find.
+            chamber = "h" if i == 0 or rng.random() < 0.6 else "s"
+            date = start + timedelta(minutes=int(i / per_congress * 720 * 24 * 60))
+            number = numbers[(chamber, congress, date.year)] = (
+                numbers.get((chamber, congress, date.year), 0) + 1
+            )
+            bill_id, amendment_id, nomination_title = None, None, None
+            kind = 0.0 if i == 0 else rng.random()
+            if kind < 0.6:
+                bill_id = f"hr{rng.randint(1, bill_count) if i else 1}-{congress}"
+                category = rng.choice(["passage", "cloture", "procedural"])
+            elif kind < 0.8 and chamber == "h":
+                amendment = rng.choice(congress_amendments)
+                amendment_id, bill_id = amendment["amendment_id"], amendment["bill_id"]
+                category = "amendment"
+            else:
+                nomination_title = (
+                    f"PN{rng.randint(1, 200)} Nominee, of Ohio, to be a Judge"
+                )
+                category = rng.choice(["nomination", "cloture"])
+
+            session = lookup.find(chamber, date)
+            meta.append(
+                {
+                    "vote_number": number,
+                    "vote_id": f"{chamber}{number}-{congress}.{date.year}",
+                    "bill_id": bill_id,
+                    "chamber": chamber,
+                    "date": date,
+                    "result": rng.choice(RESULTS),
+                    "category": category,
+                    "nomination_title": nomination_title,
+                    "amendment_id": amendment_id,
+                    "source_filename": (
+                        f"data/{congress}/votes/{date.year}/{chamber}{number}/data.json"
+                    ),
+                    "congress": congress,
+                    "session": session["session"],
+                    "majority_party": session["party"],
+                    "unique_matching_field": unique_matching_field(
+                        bill_id, nomination_title
+                    ),
+                }
+            )
+
+    latest = latest_vote_ids(
+        (row["vote_id"], row["unique_matching_field"], row["date"]) for row in meta
+    )
+    for row in meta:
+        row["is_latest"] = row["vote_id"] in latest
+    return bills, amendments, meta
+
+
+def synthetic_votes(rng, meta, legislators, exceptions):
+    """
+    Every member's position on every roll call, as `votes` rows.
+
+    Now and then a House vote is a leadership election with names instead of
+    Yea/Nay, which get stored as exceptions like the real ones do.
+    """
+    codes = {name: code for code, name in enumerate(RESPONSE_NAMES + [OTHER_POSITION])}
+    members = {
+        "h": [l for l in legislators if l["term_type"] == "rep"],
+        "s": [l for l in legislators if l["term_type"] == "sen"],
+    }
+    for index, vote in enumerate(meta):
+        leadership = vote["chamber"] == "h" and index % 250 == 125
+        winner = rng.choice(["R", "D"])
+        for member in members[vote["chamber"]]:
+            roll = rng.random()
+            if roll < 0.03:
+                position = "Not Voting"
+            elif roll < 0.035:
+                position = "Present"
+            elif leadership:
+                position = OTHER_POSITION
+                exceptions.append(
+                    {
+                        "vote_id": vote["vote_id"],
+                        "legislator_id": member["id"],
+                        "original_position": f"Member H{rng.randrange(5):06d}",
+                    }
+                )
+            elif (member["party"] == winner) == (roll < 0.92):
+                position = "Yea"
+            else:
+                position = "Nay"
+            yield {
+                "vote_id": vote["vote_id"],
+                "legislator_id": member["id"],
+                "legislator_key": member["legislator_key"],
+                "position": codes[position],
+                "original_position": codes[position],
+            }
+
+
+def load(engine, size, seed):
+    """Recreate the benchmark schema, fill it, and create the views."""
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    Base.metadata.create_all(engine, tables=[table.__table__ for table in TABLES])
+
+    legislators = synthetic_legislators()
+    bills, amendments, meta = synthetic_meta(rng, size)
+    exceptions = []
+    copy_rows(
+        engine,
+        VotePosition.__tablename__,
+        ["code", "name"],
+        (
+            {"code": code, "name": name}
+            for code, name in enumerate(RESPONSE_NAMES + [OTHER_POSITION])
+        ),
+    )
+    for table, rows in (
+        (Legislator, legislators),
+        (Congress, SESSIONS),
+        (Bill, bills),
+        (Amendment, amendments),
+        (VoteMeta, meta),
+    ):
+        copy_rows(engine, table.__tablename__, list(rows[0]), rows)
+    copy_rows(
+        engine,
+        Vote.__tablename__,
+        ["vote_id", "legislator_id", "legislator_key", "position", "original_position"],
+        synthetic_votes(rng, meta, legislators, exceptions),
+    )
+    copy_rows(
+        engine,
+        VotePositionException.__tablename__,
+        ["vote_id", "legislator_id", "original_position"],
+        exceptions,
+    )
+
+    create_views("data")
+    with engine.begin() as conn:
+        for table in TABLES:
+            conn.execute(text(f"ANALYZE {table.__tablename__}"))
+        return conn.execute(text("SELECT count(*) FROM votes")).scalar()
+
+
+def plan_shape(node):
+    """
+    Describe a plan by its node types, relations and indexes, ignoring costs.
+
+    Returns:
+        str: eg. "Limit(Sort(Seq Scan on vote_meta))".
+    """
+    shape = node["Node Type"]
+    if "Relation Name" in node:
+        shape += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        shape += f" using {node['Index Name']}"
+    children = [plan_shape(child) for child in node.get("Plans", [])]
+    if children:
+        shape += f"({', '.join(children)})"
+    return shape
+
+
+def explain(engine, sql, repeat):
+    """
+    Run a query under EXPLAIN (ANALYZE, BUFFERS) a few times.
+
+    The first run only warms the cache. The fastest of the others is kept, since
+    the slower ones mostly measure whatever else the machine was doing.
+
+    Returns:
+        dict: The best `execution_ms` and `planning_ms`, the `buffers` (shared
+            blocks hit or read) and `rows` of the last run, and its `plan` shape.
+    """
+    runs = []
+    with engine.connect() as conn:
+        for _ in range(repeat + 1):
+            explained = conn.execute(
+                text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            ).scalar()
+            runs.append(explained[0])
+    runs = runs[1:]
+    plan = runs[-1]["Plan"]
+    return {
+        "execution_ms": round(min(r["Execution Time"] for r in runs), 3),
+        "planning_ms": round(min(r["Planning Time"] for r in runs), 3),
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "rows": plan["Actual Rows"],
+        "plan": plan_shape(plan),
+    }
+
+
+def compare(result, baseline, args):
+    """
+    Find what got worse in one query compared with its baseline.
+
+    Time has to grow by more than `--tolerance` and by at least `--min_ms` to
+    count, so sub-millisecond noise doesn't fail the run.
+
+    Returns:
+        tuple[list[str], list[str]]: Regressions, and changes only worth
+            mentioning (plan changes, unless `--strict_plans`).
+    """
+    problems, notes = [], []
+    before, after = baseline["execution_ms"], result["execution_ms"]
+    if after > before * (1 + args.tolerance) and after - before >= args.min_ms:
+        problems.append(f"time {before:.2f} -> {after:.2f} ms")
+    before, after = baseline["buffers"], result["buffers"]
+    if after > before * (1 + args.buffer_tolerance):
+        problems.append(f"buffers {before} -> {after}")
+    if result["plan"] != baseline["plan"]:
+        change = (
+            f"plan changed:\n    was: {baseline['plan']}\n    now: {result['plan']}"
+        )
+        (problems if args.strict_plans else notes).append(change)
+    return problems, notes
+
+
+def main():
+    """Load each size, run the query catalog, and report against the baseline."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        default="1000,4000",
+        help="Comma-separated numbers of roll calls to load (default: 1000,4000)",
+    )
+    parser.add_argument("--repeat", default=5, type=int, help="Runs per query")
+    parser.add_argument("--seed", default=119, type=int, help="Random seed")
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="Baseline file to compare with or save to",
+    )
+    parser.add_argument(
+        "--save_baseline",
+        action="store_true",
+        help="Record this run as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        default=1.0,
+        type=float,
+        help="Allowed growth in execution time, as a fraction (default: 1.0)",
+    )
+    parser.add_argument(
+        "--buffer_tolerance",
+        default=0.2,
+        type=float,
+        help="Allowed growth in buffers touched, as a fraction (default: 0.2)",
+    )
+    parser.add_argument(
+        "--min_ms",
+        default=5.0,
+        type=float,
+        help="Ignore slowdowns smaller than this many milliseconds (default: 5)",
+    )
+    parser.add_argument(
+        "--strict_plans",
+        action="store_true",
+        help="Count plan changes as regressions",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the benchmark schema afterwards"
+    )
+    parser.add_argument(
+        "--environment",
+        default="prod",
+        type=str,
+        help="The environment to use (default: 'prod')",
+    )
+    args = parser.parse_args()
+
+    load_environment(args.environment)
+    engine = use_schema(SCHEMA)
+
+    baseline = {}
+    if not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save_baseline first.")
+            sys.exit(1)
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("seed") != args.seed:
+            print(f"Baseline was recorded with --seed {baseline.get('seed')}.")
+            sys.exit(1)
+
+    results = {}
+    regressions, notes = [], []
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            positions = load(engine, size, args.seed)
+            print(f"\n{size} roll calls, {positions} positions")
+            print(
+                f"{'query':<24} {'ms':>9} {'baseline':>9} {'buffers':>8} "
+                f"{'baseline':>9}  status"
+            )
+            sized = results[str(size)] = {}
+            for name, (sql, description) in QUERIES.items():
+                result = sized[name] = explain(engine, sql, args.repeat)
+                before = baseline.get("sizes", {}).get(str(size), {}).get(name)
+                problems, changes = (
+                    compare(result, before, args) if before else ([], [])
+                )
+                label = f"{name} ({description}, {size} roll calls)"
+                regressions += [(label, problem) for problem in problems]
+                notes += [(label, change) for change in changes]
+                status = "REGRESSED" if problems else "new" if not before else "ok"
+                if changes and not problems:
+                    status = "ok, plan changed"
+                print(
+                    f"{name:<24} {result['execution_ms']:>9.2f} "
+                    f"{before['execution_ms'] if before else '-':>9} "
+                    f"{result['buffers']:>8} "
+                    f"{before['buffers'] if before else '-':>9}  {status}"
+                )
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(
+                {"seed": args.seed, "repeat": args.repeat, "sizes": results},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"\nSaved baseline to {args.baseline}")
+        return
+
+    for label, change in notes:
+        print(f"\n{label}: {change}")
+    if regressions:
+        print(f"\n{len(regressions)} regressions:")
+        for label, problem in regressions:
+            print(f"  {label}: {problem}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
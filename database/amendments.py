@@ -1,12 +1,13 @@
 """Maintain and load data for `amendments` table."""
 
-from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
-from database.base import Base, BaseOrm, load_json
-from sqlalchemy import Column, String, ForeignKey, inspect
+from functools import cached_property
+from database.base import Base, BaseOrm, only_if_changed
+from database.sources import source_filename
+from database.search import AMENDMENT_SEARCH_SQL, ensure_search_column
+from database.legislators import LegislatorKeyMap, ensure_key_column
+from sqlalchemy import Column, Computed, Index, Integer, String, ForeignKey, inspect
 from sqlalchemy.orm import Session, relationship
-from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
 
 
 class Amendment(Base):
@@ -17,10 +18,16 @@ class Amendment(Base):
     amendment_id = Column(String, primary_key=True)
     bill_id = Column(String, ForeignKey("bills.bill_id"))
     sponsor_id = Column(String, ForeignKey("legislators.bioguide_id"))
+    sponsor_key = Column(Integer, index=True)
     chamber = Column(String, nullable=False)
     purpose = Column(String)
     congress = Column(String, nullable=False)
     source_filename = Column(String, nullable=False)
+    search_vector = Column(TSVECTOR, Computed(AMENDMENT_SEARCH_SQL, persisted=True))
+
+    __table_args__ = (
+        Index("ix_amendments_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     sponsor = relationship("Legislator")
     bill = relationship("Bill")
@@ -29,8 +36,13 @@ class Amendment(Base):
 class AmendmentOrm(BaseOrm):
     """ORM class to interact with the amendments table."""
 
-    def __init__(self, data_dir="./"):
-        super().__init__(data_dir)
+    def __init__(self, data_dir="./", congress_nums=None, schema=None, atomic=False):
+        super().__init__(data_dir, congress_nums, schema, atomic)
+
+    @cached_property
+    def legislator_keys(self):
+        """Look up legislator keys, through the database once it's first needed."""
+        return LegislatorKeyMap(self.engine)
 
     def drop_all_tables(self):
         """Override to restrict dropping tables."""
@@ -38,8 +50,14 @@ class AmendmentOrm(BaseOrm):
 
     def create_table(self):
         """Create the bills table."""
+        if self.schema:
+            self.create_staging_table(Amendment.__table__)
+            return
+
         if not inspect(self.engine).has_table(Amendment.__tablename__):
             Amendment.__table__.create(self.engine)
+        ensure_search_column(self.engine, Amendment.__table__, AMENDMENT_SEARCH_SQL)
+        ensure_key_column(self.engine, Amendment.__table__, "sponsor_key", "sponsor_id")
 
     def drop_table(self):
         """Drop the bills table."""
@@ -48,61 +66,75 @@ class AmendmentOrm(BaseOrm):
 
     def upsert(self, session: Session, record_dict: dict):
         """Upsert a record into the database."""
+        record_dict = {
+            **record_dict,
+            "sponsor_key": self.legislator_keys.get(record_dict["sponsor_id"]),
+        }
         stmt = insert(Amendment).values(**record_dict)
         update_dict = {
             col: stmt.excluded[col] for col in record_dict if col != "amendment_id"
         }
 
         stmt = stmt.on_conflict_do_update(
-            index_elements=["amendment_id"], set_=update_dict
+            index_elements=["amendment_id"],
+            set_=update_dict,
+            where=only_if_changed(stmt, update_dict),
         )
 
-        try:
-            session.execute(stmt)
-        except IntegrityError as e:
-            print(f"Failed to upsert {record_dict.get('amendment_id')}: {e}")
-            session.rollback()
-
-    def populate(self):
-        """Populate the Amendments table."""
+        self.execute_upsert(session, stmt, record_dict.get("amendment_id"))
 
-        amendment_files = [
-            str(path)
-            for path in Path(self.data_dir).glob("*/amendments/*/*/data.json")
-            if path.is_file()
+    def datafiles(self):
+        """List the amendment data files for every congress in this load."""
+        return [
+            path
+            for path in self.source.glob("*/amendments/*/*/data.json")
+            if self.includes_congress(path.split("/")[0])
         ]
 
-        with ThreadPoolExecutor() as executor:
-            amendment_data = [
-                {"filename": str(path), "data": data}
-                for path, data in zip(
-                    amendment_files, executor.map(load_json, amendment_files)
-                )
-            ]
+    def transform(self, path, data=None):
+        """Turn an amendment data file into rows for the amendments table."""
+        if data is None:
+            data = self.source.load_json(path)
 
-        with Session(self.engine) as session:
-            for entry in amendment_data:
-                filename = entry["filename"]
-                data = entry["data"]
-
-                amendment = {
-                    "amendment_id": data.get("amendment_id"),
-                    "bill_id": data.get("amends_bill").get("bill_id"),
-                    "sponsor_id": data.get("sponsor").get("bioguide_id"),
-                    "chamber": data.get("chamber"),
-                    "purpose": data.get("purpose"),
-                    "congress": data.get("congress"),
-                    "source_filename": filename,
-                }
-
-                self.upsert(session, amendment)
+        amendment = {
+            "amendment_id": data.get("amendment_id"),
+            "bill_id": data.get("amends_bill").get("bill_id"),
+            "sponsor_id": data.get("sponsor").get("bioguide_id"),
+            "chamber": data.get("chamber"),
+            "purpose": data.get("purpose"),
+            "congress": data.get("congress"),
+            "source_filename": source_filename(path),
+        }
+        return {Amendment.__tablename__: [amendment]}
 
-            session.commit()
+    def write_rows(self, session: Session, rows: dict):
+        """Write amendment rows produced by `transform`."""
+        for amendment in rows.get(Amendment.__tablename__, []):
+            self.upsert(session, amendment)
 
-    def create_placeholder(self, amendment_id, bill_id, sponsor_id, congress, session):
-        """Create a placeholder amendment so that a vote can be stored."""
+    def populate(self, writers: int = 0):
+        """
+        Populate the Amendments table.
 
-        amendment = {
+        Args:
+            writers (int): When non-zero, overlap parsing and writing using this
+                many writer connections.
+        """
+
+        if writers:
+            self.populate_pipelined(writers)
+            return
+
+        amendment_rows = self.transform_all()
+
+        with Session(self.engine) as session:
+            self.write_rows(session, amendment_rows)
+            session.commit()
+
+    @staticmethod
+    def placeholder(amendment_id, bill_id, sponsor_id, congress):
+        """Build a placeholder amendment row so that a vote can be stored."""
+        return {
             "amendment_id": amendment_id,
             "bill_id": bill_id,
             "sponsor_id": sponsor_id,
@@ -112,6 +144,11 @@ class AmendmentOrm(BaseOrm):
             "source_filename": "na",
         }
 
+    def create_placeholder(self, amendment_id, bill_id, sponsor_id, congress, session):
+        """Create a placeholder amendment so that a vote can be stored."""
+
+        amendment = self.placeholder(amendment_id, bill_id, sponsor_id, congress)
+
         # Don't create a new session, use the injected one instead.
         # Also don't run session.commit() because we may not want to commit at
         # this stage.
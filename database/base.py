@@ -1,40 +1,245 @@
 """Define base methods for working with the database."""
 
+import io
 import os
-import json
-from sqlalchemy import create_engine, MetaData
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, MetaData, text, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base
+from database import decoding
+from database.changes import active_feed
+from database.sources import open_source
+from database.row_cache import active_row_cache
+from database.pipeline import merge_rows, run_pipeline
 
 
 # Declarative base
 Base = declarative_base()
 
+# Reference tables whose codes are stored in other tables. Their rows survive
+# `drop_all_tables`, so codes stay stable across full reloads.
+PERSISTENT_TABLES = {"vote_positions", "legislator_keys"}
 
-def load_json(path):
-    """Load a json file safely.
+# Errors a loader's `transform` raises on a document that doesn't have the
+# expected shape.
+TRANSFORM_ERRORS = (ValueError, AttributeError, TypeError, KeyError, IndexError)
+
+
+def only_if_changed(stmt, columns):
+    """Build an ON CONFLICT DO UPDATE condition skipping rows that wouldn't change.
 
     Args:
-        path (str): The path to load.
+        stmt (Insert): The postgresql insert statement.
+        columns (Iterable[str]): The columns the upsert updates.
+    """
+    columns = list(columns)
+    return tuple_(*[stmt.table.c[col] for col in columns]).is_distinct_from(
+        tuple_(*[stmt.excluded[col] for col in columns])
+    )
+
 
-    Returns:
-        Any: The data from the json file.
+def _copy_value(value):
+    """Render a value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(engine, table_name, columns, rows):
+    """Bulk load rows into a table with COPY, on a connection of its own.
+
+    Args:
+        engine (Engine): The engine to take a connection from.
+        table_name (str): The table to load into.
+        columns (list[str]): The columns to load, in order.
+        rows (Iterable[dict]): The rows to load, keyed by column name.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[col]) for col in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table_name} ({', '.join(columns)}) FROM STDIN", buffer
+            )
+        connection.commit()
+    finally:
+        connection.close()
 
 
 class BaseOrm:
     """Base class to use when creating and populating ORM tables."""
 
-    def __init__(self, data_dir):
+    # Bump when `transform` changes what it returns for the same data file, so
+    # rows cached by the old version aren't used.
+    TRANSFORM_VERSION = 1
+
+    def __init__(self, data_dir, congress_nums=None, schema=None, atomic=False):
         self.data_dir = data_dir
-        self.engine = create_engine(os.getenv("DATABASE_URL"))
+        self.atomic = atomic
+        self.congress_nums = (
+            None if congress_nums is None else [str(c) for c in congress_nums]
+        )
+        self.schema = schema
+
+    @cached_property
+    def engine(self):
+        """The database engine, created on first use so parsing needs no database."""
+        engine = create_engine(os.getenv("DATABASE_URL"))
+        if self.schema:
+            # Send ORM statements to the staging schema instead of public.
+            engine = engine.execution_options(schema_translate_map={None: self.schema})
+        return engine
+
+    @property
+    def source(self):
+        """The data directory or archive this loader reads from."""
+        return open_source(self.data_dir)
+
+    def includes_congress(self, congress_num):
+        """Determine if a congress number is part of this load."""
+        return self.congress_nums is None or str(congress_num) in self.congress_nums
+
+    def qualified_name(self, table):
+        """Name a table for raw SQL, including the staging schema if there is one."""
+        return f"{self.schema}.{table.name}" if self.schema else table.name
+
+    def create_staging_table(self, table):
+        """Create an empty copy of a public table in the staging schema.
+
+        The copy keeps columns, defaults and indexes but not foreign keys, so
+        staged rows can be loaded before the rows they reference.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {self.qualified_name(table)} "
+                    f"(LIKE public.{table.name} INCLUDING ALL)"
+                )
+            )
+
+    def execute_upsert(self, session, stmt, label):
+        """
+        Run an upsert, skipping it with a message if it breaks a constraint.
+
+        When loading atomically, the upsert runs in a savepoint so that a
+        failure discards only this statement instead of the whole transaction.
+        Written rows are reported to the change feed, if one is running, once
+        the transaction commits.
+        """
+        feed = active_feed()
+        if feed and not self.schema and feed.tracks(stmt.table):
+            stmt = stmt.returning(*feed.returning_columns(stmt.table))
+        else:
+            feed = None
+
+        if self.atomic:
+            try:
+                with session.begin_nested():
+                    result = session.execute(stmt)
+                    if feed:
+                        feed.record_on_commit(session, stmt.table, result.all())
+            except IntegrityError as e:
+                print(f"Failed to upsert {label}: {e}")
+            return
+
+        try:
+            result = session.execute(stmt)
+            if feed:
+                feed.record_on_commit(session, stmt.table, result.all())
+        except IntegrityError as e:
+            print(f"Failed to upsert {label}: {e}")
+            session.rollback()
 
     def drop_all_tables(self):
-        """Drop all tables in the database, all at once."""
+        """Drop all tables in the database, all at once, except `PERSISTENT_TABLES`."""
 
         metadata = MetaData(schema="public")
         metadata.reflect(bind=self.engine)
+        feed = active_feed()
         with self.engine.begin() as conn:
             for tbl in reversed(metadata.sorted_tables):
-                conn.execute(tbl.delete())
+                if tbl.name in PERSISTENT_TABLES:
+                    continue
+                if feed and feed.tracks(tbl):
+                    returning = feed.returning_columns(tbl, inserted=False)
+                    result = conn.execute(tbl.delete().returning(*returning))
+                    feed.record_removed(tbl, result.all())
+                else:
+                    conn.execute(tbl.delete())
+
+    def datafiles(self):
+        """List the data files this loader ingests."""
+        raise NotImplementedError("Subclasses that load data files must override.")
+
+    def transform(self, path, data=None):
+        """
+        Turn a single data file into a dict of table name -> list of rows.
+
+        Args:
+            path (str): The data file, relative to the data folder.
+            data (dict | None): Its parsed contents, if they've already been read.
+        """
+        raise NotImplementedError("Subclasses that load data files must override.")
+
+    def cache_namespace(self):
+        """Identify this loader's transform in row cache keys."""
+        return f"{type(self).__name__}/{self.TRANSFORM_VERSION}"
+
+    def cacheable(self, data):
+        """Determine if a data file's rows depend on nothing but the file itself."""
+        return True
+
+    def transform_cached(self, path):
+        """Transform a data file, reusing its rows from the row cache if one is open."""
+        cache = active_row_cache()
+        if cache is None:
+            return self.transform(path)
+
+        raw = self.source.read_bytes(path)
+        key = cache.key(self.cache_namespace(), path, raw)
+        rows = cache.get(key)
+        if rows is None:
+            data = decoding.loads(raw)
+            rows = self.transform(path, data)
+            if self.cacheable(data):
+                cache.put(key, rows)
+        return rows
+
+    def write_rows(self, session, rows):
+        """Write a dict of table name -> list of rows using the given session."""
+        raise NotImplementedError("Subclasses that load data files must override.")
+
+    def write_batch(self, session, rows):
+        """Write one batch handed over by the pipeline. Committed by the caller."""
+        self.write_rows(session, rows)
+
+    def transform_all(self):
+        """Parse every data file in parallel and merge the rows per table."""
+        all_rows = {}
+        with ThreadPoolExecutor() as executor:
+            for rows in executor.map(self.transform_cached, self.datafiles()):
+                merge_rows(all_rows, rows)
+        return all_rows
+
+    def populate_pipelined(self, writers=1, batch_size=1000):
+        """Parse and write at the same time, using `writers` connections."""
+        run_pipeline(
+            self.engine,
+            self.datafiles(),
+            self.transform_cached,
+            self.write_batch,
+            writers=writers,
+            batch_size=batch_size,
+        )
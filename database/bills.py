@@ -1,11 +1,26 @@
 """Maintain and load data for `bills` table."""
 
-import glob
-import json
+from functools import cached_property
 from dateutil import parser
-from database.base import Base, BaseOrm
-from sqlalchemy import Column, String, ForeignKey, DateTime, text, inspect
+from database.base import Base, BaseOrm, only_if_changed
+from database.sources import source_filename
+from database.search import BILL_SEARCH_SQL, ensure_search_column
+from database.legislators import LegislatorKeyMap, ensure_key_column
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    inspect,
+    text,
+)
 from sqlalchemy.orm import Session, relationship
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, insert
 
 
 class Bill(Base):
@@ -21,71 +36,299 @@ class Bill(Base):
     title = Column(String, nullable=False)
     short_title = Column(String)
     sponsor_id = Column(String, ForeignKey("legislators.bioguide_id"))
+    sponsor_key = Column(Integer, index=True)
     status = Column(String, nullable=False)
     status_at = Column(DateTime, nullable=False)
     congress = Column(String, nullable=False)
     source_filename = Column(String, nullable=False)
+    search_vector = Column(TSVECTOR, Computed(BILL_SEARCH_SQL, persisted=True))
+
+    __table_args__ = (
+        Index("ix_bills_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     # Relationship to Legislators
     sponsor = relationship("Legislator")
 
 
+class BillAction(Base):
+    """
+    ORM class for the actions taken on a bill, in the order they were listed.
+    """
+
+    __tablename__ = "bill_actions"
+
+    bill_id = Column(
+        String, ForeignKey("bills.bill_id", ondelete="CASCADE"), primary_key=True
+    )
+    ordinal = Column(Integer, primary_key=True)
+    acted_at = Column(DateTime, index=True)
+    action_type = Column(String, index=True)
+    text = Column(String)
+    committees = Column(ARRAY(String))
+
+
+class BillCosponsor(Base):
+    """
+    ORM class for a bill's cosponsors, including those who withdrew.
+    """
+
+    __tablename__ = "bill_cosponsors"
+
+    bill_id = Column(
+        String, ForeignKey("bills.bill_id", ondelete="CASCADE"), primary_key=True
+    )
+    # Not a foreign key: cosponsors can predate the legislators in the load.
+    cosponsor_id = Column(String, primary_key=True, index=True)
+    cosponsor_key = Column(Integer, index=True)
+    sponsored_at = Column(Date)
+    withdrawn_at = Column(Date)
+    original_cosponsor = Column(Boolean)
+
+
+class BillCommittee(Base):
+    """
+    ORM class for the committees and subcommittees a bill was referred to.
+    """
+
+    __tablename__ = "bill_committees"
+
+    bill_id = Column(
+        String, ForeignKey("bills.bill_id", ondelete="CASCADE"), primary_key=True
+    )
+    ordinal = Column(Integer, primary_key=True)
+    committee_id = Column(String, index=True)
+    subcommittee_id = Column(String)
+    committee = Column(String)
+    activity = Column(ARRAY(String))
+
+
+# Tables filled from the same data files as `bills`, replaced bill by bill.
+BILL_CHILDREN = [BillAction, BillCosponsor, BillCommittee]
+
+
+def _parse_date(value):
+    return parser.parse(value).date() if value else None
+
+
 class BillOrm(BaseOrm):
-    """ORM class to interact with the bills table."""
+    """ORM class to interact with the bills table and its child tables."""
+
+    # 2: bill files also produce actions, cosponsors and committees.
+    TRANSFORM_VERSION = 2
 
-    def __init__(self, data_dir="./"):
-        super().__init__(data_dir)
+    def __init__(self, data_dir="./", congress_nums=None, schema=None, atomic=False):
+        super().__init__(data_dir, congress_nums, schema, atomic)
+
+    @cached_property
+    def legislator_keys(self):
+        """Look up legislator keys, through the database once it's first needed."""
+        return LegislatorKeyMap(self.engine)
 
     def drop_all_tables(self):
         """Override to restrict dropping tables."""
         raise NotImplementedError("This operation is not allowed in subclasses.")
 
     def create_table(self):
-        """Create the bills table."""
+        """Create the bills table and its child tables."""
+        if self.schema:
+            self.create_staging_table(Bill.__table__)
+            for model in BILL_CHILDREN:
+                self.create_staging_table(model.__table__)
+            return
+
         if not inspect(self.engine).has_table(Bill.__tablename__):
             Bill.__table__.create(self.engine)
+        ensure_search_column(self.engine, Bill.__table__, BILL_SEARCH_SQL)
+        ensure_key_column(self.engine, Bill.__table__, "sponsor_key", "sponsor_id")
+        for model in BILL_CHILDREN:
+            if not inspect(self.engine).has_table(model.__tablename__):
+                model.__table__.create(self.engine)
 
     def drop_table(self):
-        """Drop the bills table."""
-        if inspect(self.engine).has_table(Bill.__tablename__):
-            Bill.__table__.drop(self.engine)
+        """Drop the bills table and its child tables."""
+        for model in reversed([Bill] + BILL_CHILDREN):
+            if inspect(self.engine).has_table(model.__tablename__):
+                model.__table__.drop(self.engine)
+
+    def datafiles(self):
+        """List the bill data files for every congress in this load."""
+
+        pathspecs = []
+        for congress_num in self.source.congress_dirs():
+            if self.includes_congress(congress_num):
+                pathspecs.extend(self.source.glob(f"{congress_num}/bills/**/*.json"))
+        return pathspecs
+
+    def transform(self, path, data=None):
+        """
+        Turn a bill data file into rows for the bills table and its child tables.
+
+        The actions, cosponsors and committees come from the same parse as the
+        bill, so each data file is only read once.
+        """
+
+        if data is None:
+            data = self.source.load_json(path)
+
+        bill = {
+            "source_filename": source_filename(path),
+            "bill_id": data.get("bill_id"),
+            "bill_type": data.get("bill_type"),
+            "bill_number": data.get("number"),
+            "title": data.get("official_title"),
+            "short_title": data.get("short_title"),
+            "sponsor_id": data.get("sponsor").get("bioguide_id"),
+            "status": data.get("status"),
+            "status_at": parser.parse(data.get("status_at")),
+            "congress": data.get("congress"),
+        }
+        bill_id = bill["bill_id"]
+
+        actions = [
+            {
+                "bill_id": bill_id,
+                "ordinal": ordinal,
+                "acted_at": (
+                    parser.parse(action["acted_at"])
+                    if action.get("acted_at")
+                    else None
+                ),
+                "action_type": action.get("type"),
+                "text": action.get("text"),
+                "committees": action.get("committees"),
+            }
+            for ordinal, action in enumerate(data.get("actions") or [])
+        ]
+
+        # Someone who withdrew and cosponsored again is listed twice; the last
+        # entry is the current one.
+        cosponsors = {
+            cosponsor.get("bioguide_id"): {
+                "bill_id": bill_id,
+                "cosponsor_id": cosponsor.get("bioguide_id"),
+                "sponsored_at": _parse_date(cosponsor.get("sponsored_at")),
+                "withdrawn_at": _parse_date(cosponsor.get("withdrawn_at")),
+                "original_cosponsor": cosponsor.get("original_cosponsor"),
+            }
+            for cosponsor in data.get("cosponsors") or []
+            if cosponsor.get("bioguide_id")
+        }
+
+        committees = [
+            {
+                "bill_id": bill_id,
+                "ordinal": ordinal,
+                "committee_id": committee.get("committee_id"),
+                "subcommittee_id": committee.get("subcommittee_id"),
+                "committee": committee.get("committee"),
+                "activity": committee.get("activity"),
+            }
+            for ordinal, committee in enumerate(data.get("committees") or [])
+        ]
 
-    def populate(self):
-        """Ingest bill information."""
+        return {
+            Bill.__tablename__: [bill],
+            BillAction.__tablename__: actions,
+            BillCosponsor.__tablename__: list(cosponsors.values()),
+            BillCommittee.__tablename__: committees,
+        }
 
-        congress_nums = [
-            d.replace("./", "")
-            for d in glob.glob("./[0-9]*", root_dir=self.data_dir, recursive=False)
-            if d.replace("./", "", 1).isdigit()
+    def upsert_batch(self, session: Session, records: list):
+        """Upsert a batch of bills into the database."""
+        records = [
+            {**record, "sponsor_key": self.legislator_keys.get(record["sponsor_id"])}
+            for record in records
         ]
+        stmt = insert(Bill).values(records)
+        update_dict = {
+            col: stmt.excluded[col] for col in records[0] if col != "bill_id"
+        }
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bill_id"],
+            set_=update_dict,
+            where=only_if_changed(stmt, update_dict),
+        )
+        self.execute_upsert(session, stmt, "bill batch")
+
+    def replace_children(self, session: Session, bill_ids: list, rows: dict):
+        """
+        Replace the actions, cosponsors and committees of some bills.
+
+        Child rows have no identity of their own beyond their bill, so each
+        bill's old rows are deleted and its new ones inserted in bulk.
+
+        Args:
+            session (Session): The session to write through.
+            bill_ids (list[str]): The bills whose child rows are replaced.
+            rows (dict): Rows produced by `transform`, by table name.
+        """
+        if not bill_ids:
+            return
+
+        for model in BILL_CHILDREN:
+            session.execute(
+                text(
+                    f"DELETE FROM {self.qualified_name(model.__table__)} "
+                    "WHERE bill_id = ANY(:bill_ids)"
+                ),
+                {"bill_ids": bill_ids},
+            )
+
+        batch_size = 1000
+        for model in BILL_CHILDREN:
+            records = rows.get(model.__tablename__, [])
+            if model is BillCosponsor:
+                records = [
+                    {
+                        **record,
+                        "cosponsor_key": self.legislator_keys.get(
+                            record["cosponsor_id"]
+                        ),
+                    }
+                    for record in records
+                ]
+            for i in range(0, len(records), batch_size):
+                stmt = insert(model).values(records[i : i + batch_size])
+                self.execute_upsert(session, stmt, f"{model.__tablename__} batch")
+
+    def write_rows(self, session: Session, rows: dict):
+        """Write bill rows, and their child rows, produced by `transform`."""
+        bills = rows.get(Bill.__tablename__, [])
+        batch_size = 1000
+        for i in range(0, len(bills), batch_size):
+            self.upsert_batch(session, bills[i : i + batch_size])
+        self.replace_children(session, [bill["bill_id"] for bill in bills], rows)
+
+    def populate(self, writers: int = 0):
+        """
+        Ingest bill information, with each bill's actions, cosponsors and
+        committees.
+
+        Args:
+            writers (int): When non-zero, overlap parsing and writing using this
+                many writer connections.
+        """
 
         with Session(self.engine) as session:
-            session.execute(text(f"DELETE from {Bill.__tablename__}"))
+            # Staging tables have no foreign keys to cascade the delete.
+            for model in BILL_CHILDREN:
+                session.execute(
+                    text(f"DELETE from {self.qualified_name(model.__table__)}")
+                )
+            session.execute(
+                text(f"DELETE from {self.qualified_name(Bill.__table__)}")
+            )
             session.commit()
 
-            for congress_num in congress_nums:
-                bills_pathspec = f"{self.data_dir}/{congress_num}/bills"
-                datafiles = glob.glob("**/*.json", root_dir=bills_pathspec, recursive=True)
-                for datafile in datafiles:
-                    pathspec = f"{bills_pathspec}/{datafile}"
-                    with open(pathspec, "r", encoding="utf-8") as f:
-                        data = json.loads(f.read())
-
-                    bill = Bill(
-                        source_filename=pathspec.replace('../congress/', ''),
-                        bill_id=data.get("bill_id"),
-                        bill_type=data.get("bill_type"),
-                        bill_number=data.get("number"),
-                        title=data.get("official_title"),
-                        short_title=data.get("short_title"),
-                        sponsor_id=data.get("sponsor").get("bioguide_id"),
-                        status=data.get("status"),
-                        status_at=parser.parse(data.get("status_at")),
-                        congress=data.get("congress"),
-                    )
-
-                    # Add to the session
-                    session.add(bill)
+        if writers:
+            self.populate_pipelined(writers)
+            return
+
+        bill_rows = self.transform_all()
+
+        with Session(self.engine) as session:
+            self.write_rows(session, bill_rows)
 
             # Commit changes to the database
             session.commit()
@@ -0,0 +1,190 @@
+"""Collect the rows each run inserts, updates and deletes as a change feed.
+
+Changes are captured while the rows are written rather than by diffing tables
+afterwards: deletes and upserts return each row's key and an md5 of its
+contents, and upserts also say whether the row was freshly inserted (`xmax` is
+0 for a row no other transaction version has touched). A row deleted and then
+loaded again in the same run (as in a full or per-congress reload) only counts
+as an update if its hash changed.
+"""
+
+import json
+import threading
+from sqlalchemy import event, literal_column
+from sqlalchemy.orm import Session
+
+# Tables downstream consumers care about.
+TRACKED_TABLES = ("bills", "amendments", "vote_meta", "votes")
+
+# Columns worked out from other rows, left out of row hashes so that a row only
+# counts as changed when its own data does.
+DERIVED_COLUMNS = {"vote_meta": ("is_latest",)}
+
+_active_feed = None
+
+# `Session.info` key for rows waiting on their transaction to commit.
+_PENDING = "change_feed_pending"
+
+
+class ChangeFeed:
+    """Thread-safe collector of row changes for a single run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._removed = {}
+        self._written = {}
+
+    @staticmethod
+    def tracks(table):
+        """Determine if writes to a table belong in the feed."""
+        return table.name in TRACKED_TABLES and table.schema in (None, "public")
+
+    @staticmethod
+    def row_hash_sql(table):
+        """
+        SQL for an md5 of a row's contents, minus any `DERIVED_COLUMNS`.
+
+        Columns are hashed by name, so a table reflected from the database
+        hashes the same as its model.
+        """
+        derived = DERIVED_COLUMNS.get(table.name)
+        if not derived:
+            return f"md5({table.name}::text)"
+        columns = sorted(col.name for col in table.columns if col.name not in derived)
+        column_list = ", ".join(f"{table.name}.{col}" for col in columns)
+        return f"md5(ROW({column_list})::text)"
+
+    @staticmethod
+    def returning_columns(table, inserted=True):
+        """Columns to add to a statement's RETURNING clause."""
+        columns = list(table.primary_key.columns)
+        columns.append(literal_column(ChangeFeed.row_hash_sql(table)))
+        if inserted:
+            columns.append(literal_column("(xmax = 0)"))
+        return columns
+
+    @staticmethod
+    def returning_sql(table, inserted=True):
+        """A RETURNING clause for raw SQL statements."""
+        keys = [col.name for col in table.primary_key.columns]
+        sql = f" RETURNING {', '.join(keys)}, {ChangeFeed.row_hash_sql(table)}"
+        if inserted:
+            sql += ", (xmax = 0)"
+        return sql
+
+    def record_removed(self, table, rows):
+        """Record rows returned by a DELETE ... RETURNING."""
+        key_len = len(table.primary_key.columns)
+        with self._lock:
+            self._keys[table.name] = [col.name for col in table.primary_key.columns]
+            removed = self._removed.setdefault(table.name, {})
+            for row in rows:
+                removed[tuple(row[:key_len])] = row[key_len]
+
+    def record_written(self, table, rows):
+        """Record rows returned by an INSERT ... ON CONFLICT ... RETURNING."""
+        key_len = len(table.primary_key.columns)
+        with self._lock:
+            self._keys[table.name] = [col.name for col in table.primary_key.columns]
+            written = self._written.setdefault(table.name, {})
+            for row in rows:
+                key = tuple(row[:key_len])
+                digest, inserted = row[key_len], row[key_len + 1]
+                _, was_inserted = written.get(key, (None, False))
+                written[key] = (digest, inserted or was_inserted)
+
+    def record_on_commit(self, session, table, rows, removed=False):
+        """
+        Record returned rows once the session's transaction commits.
+
+        If the transaction rolls back instead, the rows are forgotten, so the
+        feed never reports writes that didn't reach the database.
+
+        Args:
+            session (Session): The session the rows were written through.
+            table (Table): The table written to.
+            rows (list[Row]): The rows returned by the statement.
+            removed (bool): Whether the rows were deleted rather than written.
+        """
+        session.info.setdefault(_PENDING, []).append((self, table, rows, removed))
+
+    def events(self):
+        """Yield one insert, update or delete event per changed row."""
+        with self._lock:
+            for table in TRACKED_TABLES:
+                if table not in self._keys:
+                    continue
+                key_names = self._keys[table]
+                removed = self._removed.get(table, {})
+                written = self._written.get(table, {})
+
+                for key, (digest, inserted) in written.items():
+                    if key in removed:
+                        if removed[key] == digest:
+                            continue
+                        op = "update"
+                    else:
+                        op = "insert" if inserted else "update"
+                    yield {"table": table, "op": op, "key": dict(zip(key_names, key))}
+
+                for key in removed:
+                    if key not in written:
+                        yield {
+                            "table": table,
+                            "op": "delete",
+                            "key": dict(zip(key_names, key)),
+                        }
+
+    def write(self, path, append=False):
+        """
+        Write the events as JSON lines.
+
+        Returns:
+            dict: Event counts by operation.
+        """
+        counts = {"insert": 0, "update": 0, "delete": 0}
+        with open(path, "a" if append else "w", encoding="utf-8") as f:
+            for change in self.events():
+                counts[change["op"]] += 1
+                f.write(json.dumps(change, default=str))
+                f.write("\n")
+        return counts
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._removed.clear()
+            self._written.clear()
+
+
+@event.listens_for(Session, "after_commit")
+def _record_committed(session):
+    if session.in_nested_transaction():
+        # A savepoint was released; the outer transaction can still roll back.
+        return
+    for feed, table, rows, removed in session.info.pop(_PENDING, []):
+        if removed:
+            feed.record_removed(table, rows)
+        else:
+            feed.record_written(table, rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    if session.in_nested_transaction():
+        # Only a savepoint rolled back.
+        return
+    session.info.pop(_PENDING, None)
+
+
+def start_feed():
+    """Start collecting changes for this run."""
+    global _active_feed  # pylint: disable=global-statement
+    _active_feed = ChangeFeed()
+    return _active_feed
+
+
+def active_feed():
+    """Return the feed collecting changes, if any."""
+    return _active_feed
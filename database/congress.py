@@ -1,8 +1,9 @@
 """Maintain and load data for `congress` table."""
 
 import glob
-import json
-import os
+from bisect import bisect_right
+from datetime import timezone
+from dateutil import parser
 import requests
 from database.base import Base, BaseOrm
 from sqlalchemy import Column, DateTime, Integer, String, inspect, text, select
@@ -23,6 +24,48 @@ class Congress(Base):
     end_date = Column(DateTime, nullable=True)
 
 
+class SessionLookup:
+    """Find the congress session a date falls in, per chamber, by binary search."""
+
+    def __init__(self, sessions):
+        """
+        Args:
+            sessions (list[dict]): Entries as found in `congress.json`.
+        """
+        self._starts = {}
+        self._sessions = {}
+        for item in sorted(sessions, key=lambda s: s["start_date"]):
+            end_date = item.get("end_date")
+            self._starts.setdefault(item["chamber"], []).append(
+                parser.parse(item["start_date"])
+            )
+            self._sessions.setdefault(item["chamber"], []).append(
+                {**item, "end_date": parser.parse(end_date) if end_date else None}
+            )
+
+    def find(self, chamber, date):
+        """
+        Return the session a chamber was in on a date.
+
+        A date on the boundary between two sessions belongs to the later one.
+        Timezone-aware dates are compared in UTC, as they'd be stored in a
+        `timestamp without time zone` column.
+
+        Returns:
+            dict | None: The `congress.json` entry, or None if no session matches.
+        """
+        if date.tzinfo is not None:
+            date = date.astimezone(timezone.utc).replace(tzinfo=None)
+        starts = self._starts.get(chamber, [])
+        index = bisect_right(starts, date) - 1
+        if index < 0:
+            return None
+        session = self._sessions[chamber][index]
+        if session["end_date"] is not None and date > session["end_date"]:
+            return None
+        return session
+
+
 class CongressOrm(BaseOrm):
     """ORM class for the Congress table."""
 
@@ -43,24 +86,30 @@ class CongressOrm(BaseOrm):
         if inspect(self.engine).has_table(Congress.__tablename__):
             Congress.__table__.drop(self.engine)
 
+    def session_lookup(self):
+        """Build a `SessionLookup` from the congress metadata file."""
+        if not self.source.exists("congress.json"):
+            print("Congress metadata not found. Votes won't get session details.")
+            return SessionLookup([])
+
+        return SessionLookup(self.source.load_json("congress.json"))
+
     def populate(self):
         """Ingest congress information."""
 
-        metadata_path = os.path.join(self.data_dir, "congress.json")
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            metadata = json.loads(f.read())
-            if len(metadata) > 0:
-                with Session(self.engine) as session:
-                    session.execute(text(f"DELETE FROM {Congress.__tablename__}"))
-                    session.commit()
-
-                    for item in metadata:
-                        c = Congress(**item)
-                        session.add(c)
-
-                    session.commit()
-            else:
-                print("Congress metadata not found. Skipping.")
+        metadata = self.source.load_json("congress.json")
+        if len(metadata) > 0:
+            with Session(self.engine) as session:
+                session.execute(text(f"DELETE FROM {Congress.__tablename__}"))
+                session.commit()
+
+                for item in metadata:
+                    c = Congress(**item)
+                    session.add(c)
+
+                session.commit()
+        else:
+            print("Congress metadata not found. Skipping.")
 
     def get_count(self, congress_num):
         """
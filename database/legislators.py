@@ -4,9 +4,11 @@ import os
 import json
 from string import Template
 import requests
+from database import decoding
 from database.base import Base, BaseOrm
-from sqlalchemy import Column, String, select, text, inspect
+from sqlalchemy import Column, Integer, String, select, text, inspect
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql import functions
 
 
@@ -29,6 +31,124 @@ class Legislator(Base):
     address = Column(String)
     phone = Column(String)
     caucus = Column(String, nullable=False)
+    legislator_key = Column(Integer, index=True)
+
+
+class LegislatorKey(Base):
+    """
+    Map each bioguide and LIS id to one integer key per person.
+
+    Keys are stored on `legislators`, `votes`, `bills` and `amendments` so
+    cross-chamber queries can join on a single narrow column. Rows survive
+    `drop_all_tables`, so a person's key never changes.
+    """
+
+    __tablename__ = "legislator_keys"
+
+    source_id = Column(String, primary_key=True)
+    id_type = Column(String, nullable=False)
+    legislator_key = Column(Integer, nullable=False, index=True)
+
+
+class LegislatorKeyMap:
+    """Look up legislator keys by bioguide or LIS id, loading them on first use."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._keys = None
+
+    def get(self, source_id):
+        """Return the key for a bioguide or LIS id, or None if it has none yet."""
+        if self._keys is None:
+            keys = {}
+            if inspect(self.engine).has_table(LegislatorKey.__tablename__):
+                with self.engine.connect() as conn:
+                    keys = dict(
+                        conn.execute(
+                            text(
+                                "SELECT source_id, legislator_key "
+                                f"FROM public.{LegislatorKey.__tablename__}"
+                            )
+                        ).all()
+                    )
+            self._keys = keys
+        return self._keys.get(source_id)
+
+
+def assign_legislator_keys(session: Session, people):
+    """
+    Give every person a key, reusing the key of any id already mapped.
+
+    Args:
+        session (Session): The session to read and write the mapping with.
+        people (Iterable[tuple[str, str | None]]): (bioguide id, LIS id) pairs.
+
+    Returns:
+        dict: bioguide id -> key.
+    """
+    existing = dict(
+        session.execute(select(LegislatorKey.source_id, LegislatorKey.legislator_key))
+        .tuples()
+        .all()
+    )
+    next_key = max(existing.values(), default=0) + 1
+    new_rows = []
+    keys = {}
+    for bioguide_id, lis_id in people:
+        key = existing.get(bioguide_id) or existing.get(lis_id)
+        if key is None:
+            key = next_key
+            next_key += 1
+        for source_id, id_type in ((bioguide_id, "bioguide"), (lis_id, "lis")):
+            if source_id and source_id not in existing:
+                existing[source_id] = key
+                new_rows.append(
+                    {"source_id": source_id, "id_type": id_type, "legislator_key": key}
+                )
+        keys[bioguide_id] = key
+
+    if new_rows:
+        session.execute(insert(LegislatorKey).values(new_rows))
+    return keys
+
+
+def ensure_key_column(engine, table, column, source_column):
+    """
+    Add a legislator key column to a table created before it existed.
+
+    Existing rows get their keys from the mapping table.
+
+    Args:
+        engine (Engine): The engine to run the DDL on.
+        table (Table): The table to add the column to.
+        column (str): The key column, eg. "sponsor_key".
+        source_column (str): The bioguide or LIS id column, eg. "sponsor_id".
+    """
+    columns = [col["name"] for col in inspect(engine).get_columns(table.name)]
+    if column in columns:
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column} integer"))
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table.name}_{column} "
+                f"ON {table.name} ({column})"
+            )
+        )
+        backfill_keys(conn, table.name, column, source_column)
+
+
+def backfill_keys(conn, table_name, column, source_column):
+    """Fill in missing legislator keys from the mapping table."""
+    conn.execute(
+        text(
+            f"""
+UPDATE {table_name} AS t SET {column} = k.legislator_key
+FROM {LegislatorKey.__tablename__} k
+WHERE t.{column} IS NULL AND k.source_id = t.{source_column}"""
+        )
+    )
 
 
 class LegislatorOrm(BaseOrm):
@@ -42,9 +162,13 @@ class LegislatorOrm(BaseOrm):
         raise NotImplementedError("This operation is not allowed in subclasses.")
 
     def create_table(self):
-        """Create the legislators table."""
+        """Create the legislators and legislator key tables."""
+        if not inspect(self.engine).has_table(LegislatorKey.__tablename__):
+            LegislatorKey.__table__.create(self.engine)
+
         if not inspect(self.engine).has_table(Legislator.__tablename__):
             Legislator.__table__.create(self.engine)
+        ensure_key_column(self.engine, Legislator.__table__, "legislator_key", "id")
 
     def drop_table(self):
         """Drop the legislators table."""
@@ -62,7 +186,7 @@ class LegislatorOrm(BaseOrm):
         for url in [base_url.substitute(type=t) for t in ["current", "historical"]]:
             response = requests.get(url, timeout=10)
             response.raise_for_status()
-            json_data = json.loads(response.text)
+            json_data = decoding.loads(response.content)
             merged_legislators.extend(json_data)
 
         with open(
@@ -71,85 +195,103 @@ class LegislatorOrm(BaseOrm):
 
             json.dump(merged_legislators, f, indent=2)
 
+    def parse(self, data):
+        """
+        Build legislators from the legislators file, without their keys.
+
+        Args:
+            data (list[dict]): The parsed `legislators.json`.
+
+        Returns:
+            list[Legislator]: The placeholder legislator, then everyone whose final
+                term ended in 2010 or later.
+        """
+        # Add a placeholder legislator.
+        placeholder = Legislator(
+            bioguide_id = "P000000",
+            lis_id=None,
+            id="P000000",
+            name="Placeholder",
+            term_type="rep",
+            state="NA",
+            district="N/A",
+            party="I",
+            url=None,
+            address=None,
+            phone=None,
+            caucus="-"
+        )
+        legislators = [placeholder]
+
+        for record in data:
+            # We should arbitrarily cut off anyone whose final term in office started pre-2010.
+            final_term = record.get("terms")[-1]
+            final_term_end = final_term.get("end", "2000-01-01")
+            (year, month, day) = final_term_end.split("-")
+            if int(year) < 2010:
+                continue
+
+            try:
+                term = record.get("terms")[-1]
+                party_name = term.get("party", "None")
+                party_shortname = (
+                    party_name[0]
+                    if party_name[0] == "D"
+                    or party_name[0] == "R"
+                    or party_name[0] == "I"
+                    else "-"
+                )
+                caucus = term.get("caucus", party_shortname)[0]
+                legislator_id = record.get("id")
+                name_record = record.get("name")
+                name = name_record.get("official_full")
+                if not name:
+                    name = f"{name_record.get("first")} {name_record.get("last")}"
+
+                legislator = Legislator(
+                    bioguide_id=record.get("id").get("bioguide"),
+                    lis_id=record.get("id").get("lis"),
+                    id=(
+                        legislator_id.get("lis")
+                        if term.get("type") == "sen"
+                        else legislator_id.get("bioguide")
+                    ),
+                    name=name,
+                    term_type=term.get("type"),
+                    state=term.get("state"),
+                    district=term.get("district", "N/A"),
+                    party=party_shortname,
+                    url=term.get("url"),
+                    address=term.get("address"),
+                    phone=term.get("phone"),
+                    caucus=caucus,
+                )
+            except TypeError as e:
+                print(f"Error processing record: {record}")
+                print(e)
+                continue
+
+            legislators.append(legislator)
+
+        return legislators
+
     def populate(self):
         """Ingest legislators information."""
 
-        pathspec = os.path.join(self.data_dir, "legislators.json")
-        with open(pathspec, "r", encoding="utf-8") as f:
-            data = json.loads(f.read())
+        legislators = self.parse(self.source.load_json("legislators.json"))
 
         with Session(self.engine) as session:
             # Truncate the table first
             session.execute(text(f"DELETE FROM {Legislator.__tablename__}"))
             session.commit()
 
-            # Add a placeholder legislator.
-            placeholder = Legislator(
-                bioguide_id = "P000000",
-                lis_id=None,
-                id="P000000",
-                name="Placeholder",
-                term_type="rep",
-                state="NA",
-                district="N/A",
-                party="I",
-                url=None,
-                address=None,
-                phone=None,
-                caucus="-"
+            # Key everyone by person, then add them to the session.
+            keys = assign_legislator_keys(
+                session, [(leg.bioguide_id, leg.lis_id) for leg in legislators]
             )
-            session.add(placeholder)
-
-            for record in data:
-                # We should arbitrarily cut off anyone whose final term in office started pre-2010.
-                final_term = record.get("terms")[-1]
-                final_term_end = final_term.get("end", "2000-01-01")
-                (year, month, day) = final_term_end.split("-")
-                if int(year) < 2010:
-                    continue
-
-                try:
-                    term = record.get("terms")[-1]
-                    party_name = term.get("party", "None")
-                    party_shortname = (
-                        party_name[0]
-                        if party_name[0] == "D"
-                        or party_name[0] == "R"
-                        or party_name[0] == "I"
-                        else "-"
-                    )
-                    caucus = term.get("caucus", party_shortname)[0]
-                    legislator_id = record.get("id")
-                    name_record = record.get("name")
-                    name = name_record.get("official_full")
-                    if not name:
-                        name = f"{name_record.get("first")} {name_record.get("last")}"
-
-                    legislator = Legislator(
-                        bioguide_id=record.get("id").get("bioguide"),
-                        lis_id=record.get("id").get("lis"),
-                        id=(
-                            legislator_id.get("lis")
-                            if term.get("type") == "sen"
-                            else legislator_id.get("bioguide")
-                        ),
-                        name=name,
-                        term_type=term.get("type"),
-                        state=term.get("state"),
-                        district=term.get("district", "N/A"),
-                        party=party_shortname,
-                        url=term.get("url"),
-                        address=term.get("address"),
-                        phone=term.get("phone"),
-                        caucus=caucus,
-                    )
-                except TypeError as e:
-                    print(f"Error processing record: {record}")
-                    print(e)
-                    continue
-
-                # Add to the session
-                session.add(legislator)
+            for legislator in legislators:
+                legislator.legislator_key = keys[legislator.bioguide_id]
+            session.add_all(legislators)
 
             # Commit changes to the database
             session.commit()
@@ -0,0 +1,109 @@
+"""Tidy up tables after a load so queries get good plans straight away.
+
+A full load or reload rewrites most of each table at once, which leaves the
+planner working from statistics describing the old data until autovacuum gets
+round to it, and leaves `votes` stored in the order the data files were read.
+The maintenance stage fixes both before the run announces its update:
+
+1. `STORAGE_PARAMETERS` are applied, so tables have the fillfactor and
+   autovacuum thresholds their write patterns call for.
+2. Optionally, tables in `CLUSTER_INDEXES` are rewritten in index order, so
+   a vote's positions, or a date range of roll calls, sit on adjacent pages.
+   `CLUSTER` locks the table against reads while it runs.
+3. Every table the run touched is analyzed.
+"""
+
+import time
+from sqlalchemy import inspect, text
+from database.base import BaseOrm
+
+# Storage parameters per table. `vote_meta` rows are updated after every load
+# (`is_latest`) and `bills` and `amendments` are upserted in place by the
+# watcher, so they leave room on each page for HOT updates. `votes` is large
+# and only ever appended to or deleted from, so it packs its pages and gets
+# analyzed and vacuumed after a smaller share of it changes.
+STORAGE_PARAMETERS = {
+    "votes": {
+        "fillfactor": 100,
+        "autovacuum_vacuum_scale_factor": 0.05,
+        "autovacuum_analyze_scale_factor": 0.02,
+    },
+    "vote_meta": {"fillfactor": 90},
+    "bills": {"fillfactor": 90},
+    "amendments": {"fillfactor": 90},
+}
+
+# Table -> (index to cluster on, DDL creating it if it's missing).
+CLUSTER_INDEXES = {
+    "votes": ("votes_pkey", None),
+    "vote_meta": (
+        "ix_vote_meta_date",
+        "CREATE INDEX IF NOT EXISTS ix_vote_meta_date ON vote_meta (date)",
+    ),
+}
+
+
+def _current_parameters(conn, table):
+    """Return a table's storage parameters as set in the catalog, as strings."""
+    options = conn.execute(
+        text("SELECT reloptions FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+        {"table": table},
+    ).scalar()
+    return dict(option.split("=", 1) for option in options or [])
+
+
+def run_maintenance(data_dir, tables, cluster=()):
+    """
+    Apply storage parameters, optionally cluster, and analyze tables.
+
+    Each step commits on its own, so locks are held only as long as it runs.
+
+    Args:
+        data_dir (str): The data directory.
+        tables (Iterable[str]): The tables the run changed, to analyze.
+        cluster (Iterable[str]): Tables from `CLUSTER_INDEXES` to cluster.
+
+    Returns:
+        list[tuple[str, float]]: Each step that ran, with its seconds taken.
+    """
+    engine = BaseOrm(data_dir).engine
+    existing = set(inspect(engine).get_table_names())
+    steps = []
+
+    def step(name, statements):
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        steps.append((name, time.perf_counter() - started))
+
+    for table, parameters in STORAGE_PARAMETERS.items():
+        if table not in existing:
+            continue
+        with engine.connect() as conn:
+            current = _current_parameters(conn, table)
+        changed = {
+            name: value
+            for name, value in parameters.items()
+            if current.get(name) != str(value)
+        }
+        if changed:
+            settings = ", ".join(f"{name} = {value}" for name, value in changed.items())
+            step(
+                f"SET ({settings}) on {table}",
+                [f"ALTER TABLE {table} SET ({settings})"],
+            )
+
+    for table in cluster:
+        index, create_index = CLUSTER_INDEXES[table]
+        statements = [create_index] if create_index else []
+        step(
+            f"CLUSTER {table} USING {index}",
+            [*statements, f"CLUSTER {table} USING {index}"],
+        )
+
+    for table in dict.fromkeys([*tables, *cluster]):
+        if table in existing:
+            step(f"ANALYZE {table}", [f"ANALYZE {table}"])
+
+    return steps
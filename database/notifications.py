@@ -0,0 +1,116 @@
+"""Tell downstream caches what an ingest changed, through Postgres NOTIFY.
+
+Every time the ingest records a new `site_meta.last_update`, it also sends a
+notification on `CHANNEL` in the same transaction, so listeners hear about it
+the moment the new data is visible. The payload is JSON:
+
+    {"last_update": "2025-03-01T06:12:44.123456",
+     "tables": ["amendments", "bills", "vote_meta", "votes", ...],
+     "congresses": ["119"]}
+
+`tables` and `congresses` list what the run loaded or rewrote. An empty
+`congresses` list means the change isn't specific to any congress (eg.
+legislators). To follow along from a shell:
+
+    python -m database.notifications
+"""
+
+import os
+import json
+import select
+import argparse
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+CHANNEL = "congress_ingest"
+
+
+def notify_update(session, last_update, tables=(), congresses=()):
+    """
+    Queue the update notification; Postgres sends it when the transaction commits.
+
+    Args:
+        session (Session | Connection): The transaction recording the update.
+        last_update (datetime): The new `site_meta.last_update`.
+        tables (Iterable[str]): The tables the run changed.
+        congresses (Iterable[str]): The congresses the run changed.
+    """
+    payload = {
+        "last_update": last_update.isoformat(),
+        "tables": sorted(set(tables)),
+        "congresses": sorted({str(c) for c in congresses}, key=int),
+    }
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": json.dumps(payload)},
+    )
+
+
+class UpdateListener:
+    """
+    Wait for ingest notifications on a connection of its own.
+
+    Use as a context manager:
+
+        with UpdateListener() as listener:
+            for update in listener:
+                invalidate(update["tables"], update["congresses"])
+    """
+
+    def __init__(self, url=None):
+        # Not pooled, so the LISTEN ends with the connection.
+        self.engine = create_engine(
+            url or os.getenv("DATABASE_URL"), poolclass=NullPool
+        )
+        self._connection = None
+        self._pending = []
+
+    def __enter__(self):
+        self._connection = self.engine.raw_connection()
+        self._connection.driver_connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return self
+
+    def __exit__(self, *exc):
+        self._connection.close()
+        self._connection = None
+
+    def wait(self, timeout=None):
+        """
+        Return the next notification's payload.
+
+        Args:
+            timeout (float | None): Seconds to wait, or None to wait forever.
+
+        Returns:
+            dict | None: The payload, or None if the timeout passed first.
+        """
+        connection = self._connection.driver_connection
+        while not self._pending:
+            if not select.select([connection], [], [], timeout)[0]:
+                return None
+            connection.poll()
+            self._pending.extend(
+                json.loads(notify.payload) for notify in connection.notifies
+            )
+            connection.notifies.clear()
+        return self._pending.pop(0)
+
+    def __iter__(self):
+        while True:
+            yield self.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--database_url",
+        help="Database to listen on (default: $DATABASE_URL)",
+    )
+    args = parser.parse_args()
+
+    with UpdateListener(args.database_url) as listener:
+        print(f"Listening on {CHANNEL}...", flush=True)
+        for update in listener:
+            print(json.dumps(update), flush=True)
@@ -0,0 +1,211 @@
+"""Pack a data directory's bills, amendments and votes into segment files.
+
+Reading one small `data.json` per document is dominated by filesystem
+metadata, especially through Docker bind mounts. `pack` copies each congress's
+documents into a single append-only segment file, one compact JSON document
+per line, with an index of where each one starts:
+
+    pack.json              congresses in the pack
+    119.index.json         path -> offset, length, digest and source signature
+    119.0.ndjson           the documents
+    congress.json          copied as-is
+    legislators.json       copied as-is
+
+Pass the pack directory as `--data_dir` and the loaders read it through
+`database.sources.PackedSource`.
+
+Packing again is incremental. Files whose modification time and size haven't
+changed aren't read. Changed documents are appended, and the index is pointed
+at the new copy. Once more of a segment is dead than alive, it's rewritten as
+the next generation, eg. `119.1.ndjson`.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from database import decoding
+from database.sources import META_FILES, PACK_MANIFEST, index_filename, open_source
+
+# The data files packed for each congress; the same ones the loaders read.
+PACKED_PATTERNS = (
+    "{congress}/bills/**/*.json",
+    "{congress}/amendments/*/*/data.json",
+    "{congress}/votes/*/*/data.json",
+)
+
+
+def _compact(raw):
+    """Re-serialize a JSON document onto a single line, or None if it's invalid."""
+    try:
+        data = decoding.loads(raw)
+    except ValueError:
+        return None
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _digest(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _write_atomic(path, body):
+    """Replace a file's contents so readers never see it half-written."""
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def _rewrite_segment(pack_dir, index):
+    """
+    Copy a segment's live documents into the next generation of the segment.
+
+    Returns:
+        str: The old segment's file name, to delete once the index is saved.
+    """
+    old_segment = index["segment"]
+    congress, generation, _ = old_segment.split(".")
+    new_segment = f"{congress}.{int(generation) + 1}.ndjson"
+
+    offset = 0
+    with open(os.path.join(pack_dir, old_segment), "rb") as src, open(
+        os.path.join(pack_dir, new_segment), "wb"
+    ) as dst:
+        for path in sorted(index["documents"]):
+            entry = index["documents"][path]
+            src.seek(entry[0])
+            dst.write(src.read(entry[1]) + b"\n")
+            entry[0] = offset
+            offset += entry[1] + 1
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    index["segment"] = new_segment
+    return old_segment
+
+
+def pack_congress(source, pack_dir, congress):
+    """
+    Bring one congress's segment up to date with the data files.
+
+    Args:
+        source (DataSource): Where to read the data files.
+        pack_dir (str): The pack directory.
+        congress (str): The congress number.
+
+    Returns:
+        dict: Counts of documents `added`, `changed`, `unchanged`, `removed` and
+            `skipped` (not valid JSON, eg. still being written).
+    """
+    index_path = os.path.join(pack_dir, index_filename(congress))
+    if os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            index = json.load(f)
+    else:
+        index = {"segment": f"{congress}.0.ndjson", "documents": {}}
+    documents = index["documents"]
+
+    paths = sorted(
+        {
+            path
+            for pattern in PACKED_PATTERNS
+            for path in source.glob(pattern.format(congress=congress))
+        }
+    )
+    # Signatures go through JSON so they compare equal to the stored ones.
+    signatures = {
+        path: json.loads(json.dumps(source.signature(path))) for path in paths
+    }
+    stale = [
+        path
+        for path in paths
+        if path not in documents or documents[path][3] != signatures[path]
+    ]
+    counts = {
+        "added": 0,
+        "changed": 0,
+        "unchanged": len(paths) - len(stale),
+        "removed": 0,
+        "skipped": 0,
+    }
+
+    segment_path = os.path.join(pack_dir, index["segment"])
+    with open(segment_path, "ab") as segment, ThreadPoolExecutor() as executor:
+        offset = segment.seek(0, os.SEEK_END)
+        bodies = executor.map(lambda path: _compact(source.read_bytes(path)), stale)
+        for path, body in zip(stale, bodies):
+            entry = documents.get(path)
+            if body is None:
+                print(f"Skipping {path} for now: not valid JSON.")
+                counts["skipped"] += 1
+                continue
+
+            digest = _digest(body)
+            if entry and entry[2] == digest:
+                # Touched, but the same document.
+                entry[3] = signatures[path]
+                counts["unchanged"] += 1
+                continue
+
+            segment.write(body + b"\n")
+            documents[path] = [offset, len(body), digest, signatures[path]]
+            offset += len(body) + 1
+            counts["changed" if entry else "added"] += 1
+        segment.flush()
+        os.fsync(segment.fileno())
+
+    for path in documents.keys() - set(paths):
+        del documents[path]
+        counts["removed"] += 1
+
+    old_segment = None
+    live = sum(entry[1] + 1 for entry in documents.values())
+    if os.path.getsize(segment_path) - live > live:
+        old_segment = _rewrite_segment(pack_dir, index)
+
+    # The index only ever points at bytes that are already on disk.
+    _write_atomic(index_path, json.dumps(index, separators=(",", ":")).encode())
+    if old_segment:
+        os.remove(os.path.join(pack_dir, old_segment))
+    return counts
+
+
+def pack(data_dir, pack_dir, congress_nums=None):
+    """
+    Pack the bills, amendments and votes in a data directory.
+
+    Args:
+        data_dir (str): The data directory, or an archive of it.
+        pack_dir (str): Where to write the pack. Created if needed; packing
+            into an existing pack updates it.
+        congress_nums (list[str] | None): The congresses to pack. Defaults to
+            every congress in the data directory. Congresses packed earlier
+            stay in the pack.
+
+    Returns:
+        dict: congress -> counts from `pack_congress`.
+    """
+    source = open_source(data_dir)
+    os.makedirs(pack_dir, exist_ok=True)
+
+    manifest_path = os.path.join(pack_dir, PACK_MANIFEST)
+    congresses = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            congresses.update(json.load(f)["congresses"])
+
+    results = {}
+    for congress in congress_nums or source.congress_dirs():
+        results[str(congress)] = pack_congress(source, pack_dir, str(congress))
+        congresses.add(str(congress))
+
+    for name in META_FILES:
+        if source.exists(name):
+            _write_atomic(os.path.join(pack_dir, name), source.read_bytes(name))
+
+    _write_atomic(
+        manifest_path,
+        json.dumps({"congresses": sorted(congresses, key=int)}, indent=2).encode(),
+    )
+    return results
@@ -0,0 +1,133 @@
+"""Overlap data file parsing with database writes.
+
+Parser threads turn data files into batches of rows and hand them to writer
+threads over a bounded queue. Each writer holds its own connection. When the
+writers fall behind the queue fills up and parsing pauses, which keeps memory
+bounded while both sides stay busy.
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import Session
+
+# Sentinel telling a writer thread that nothing more is coming.
+_DONE = object()
+
+
+def merge_rows(batch: dict, rows: dict):
+    """Append the per-table rows of one data file to a batch.
+
+    Args:
+        batch (dict): Table name -> rows, modified in place.
+        rows (dict): Table name -> rows for a single data file. Rows are a
+            list of row dicts, or any container with `extend` and `len`
+            (eg. `VotePositionBatch`).
+    """
+    for table, records in rows.items():
+        batch.setdefault(table, type(records)()).extend(records)
+
+
+def count_rows(batch: dict):
+    """Count the rows in a batch across all of its tables."""
+    return sum(len(records) for records in batch.values())
+
+
+def run_pipeline(
+    engine,
+    paths: list,
+    transform,
+    write,
+    writers: int = 1,
+    batch_size: int = 1000,
+    max_pending: int | None = None,
+    parse_workers: int | None = None,
+):
+    """
+    Parse data files and write the resulting rows concurrently.
+
+    Rows from a single data file are never split across batches, so a writer
+    always sees parent rows (eg. vote metadata) alongside their children.
+
+    Args:
+        engine (Engine): Engine the writer threads open their sessions on.
+        paths (list[str]): The data files to parse.
+        transform (Callable[[str], dict]): Turns a path into a dict of table
+            name -> list of row dicts.
+        write (Callable[[Session, dict], None]): Writes one batch of rows. The
+            writer commits after each call.
+        writers (int): Number of writer threads, each with its own connection.
+        batch_size (int): Minimum number of rows handed to a writer at once.
+        max_pending (int | None): Batches allowed to wait in the queue before
+            parsing pauses. Defaults to twice the number of writers.
+        parse_workers (int | None): Number of parser threads.
+
+    Raises:
+        Exception: The first error raised by a writer, once all threads stop.
+    """
+    writers = max(1, writers)
+    parse_workers = parse_workers or min(32, (os.cpu_count() or 1) + 4)
+    batches = queue.Queue(maxsize=max_pending or 2 * writers)
+    failed = threading.Event()
+    errors = []
+
+    def drain():
+        with Session(engine) as session:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    return
+                # Keep pulling batches after a failure so the parser side never
+                # blocks on a full queue, but stop writing them.
+                if failed.is_set():
+                    continue
+                try:
+                    write(session, batch)
+                    session.commit()
+                except Exception as e:  # pylint: disable=broad-except
+                    session.rollback()
+                    errors.append(e)
+                    failed.set()
+
+    threads = [threading.Thread(target=drain, daemon=True) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        batch = {}
+        with ThreadPoolExecutor(max_workers=parse_workers) as executor:
+            # Only keep a few files per parser in flight; submitting everything
+            # up front would let parsed rows pile up in memory.
+            in_flight = deque()
+            for path in paths:
+                in_flight.append(executor.submit(transform, path))
+                if len(in_flight) < parse_workers * 4:
+                    continue
+
+                merge_rows(batch, in_flight.popleft().result())
+                if count_rows(batch) >= batch_size:
+                    batches.put(batch)
+                    batch = {}
+                if failed.is_set():
+                    break
+
+            while in_flight and not failed.is_set():
+                merge_rows(batch, in_flight.popleft().result())
+                if count_rows(batch) >= batch_size:
+                    batches.put(batch)
+                    batch = {}
+            for future in in_flight:
+                future.cancel()
+
+        if batch and not failed.is_set():
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
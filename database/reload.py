@@ -0,0 +1,93 @@
+"""Reload a handful of congresses without touching the rest of the database."""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database.base import BaseOrm
+from database.changes import active_feed
+from database.bills import Bill, BillOrm
+from database.amendments import Amendment, AmendmentOrm
+from database.votes import Vote, VoteMeta, VoteOrm
+from database.scorecards import ScorecardOrm
+from database.rollups import refresh_rollups
+
+# vote_id looks like "h12-119.2025"; pull out the congress number.
+VOTE_CONGRESS_SQL = "split_part(split_part(vote_id, '-', 2), '.', 1)"
+
+
+def reload_congresses(data_dir, congress_nums):
+    """
+    Delete and reload bills, amendments and votes for some congresses.
+
+    Rows are deleted children first and loaded parents first, all in a single
+    transaction, so readers see either the old or the new congress data.
+    Legislator scorecards for these congresses, and rollups for the days and
+    weeks their old votes fell in, are recomputed in the same transaction.
+
+    Args:
+        data_dir (str): The data directory.
+        congress_nums (list[str]): The congresses to reload.
+    """
+    congress_nums = [str(c) for c in congress_nums]
+    orms = [
+        BillOrm(data_dir, congress_nums, atomic=True),
+        AmendmentOrm(data_dir, congress_nums, atomic=True),
+        VoteOrm(data_dir, congress_nums, atomic=True),
+    ]
+    deletes = [
+        (
+            Vote.__table__,
+            f"""
+DELETE FROM {Vote.__tablename__}
+WHERE vote_id IN (
+  SELECT vote_id FROM {VoteMeta.__tablename__}
+  WHERE {VOTE_CONGRESS_SQL} = ANY(:congress_nums)
+)""",
+        ),
+        (
+            VoteMeta.__table__,
+            f"DELETE FROM {VoteMeta.__tablename__} "
+            f"WHERE {VOTE_CONGRESS_SQL} = ANY(:congress_nums)",
+        ),
+        (
+            Amendment.__table__,
+            f"DELETE FROM {Amendment.__tablename__} "
+            "WHERE congress = ANY(:congress_nums)",
+        ),
+        (
+            Bill.__table__,
+            f"DELETE FROM {Bill.__tablename__} WHERE congress = ANY(:congress_nums)",
+        ),
+    ]
+    params = {"congress_nums": congress_nums}
+    feed = active_feed()
+    scorecard_orm = ScorecardOrm(data_dir)
+    scorecard_orm.ensure_populated()
+    orms[-1].migrate_rollup_tables()
+
+    with Session(BaseOrm(data_dir).engine) as session:
+        old_dates = list(
+            session.execute(
+                text(
+                    f"SELECT date FROM {VoteMeta.__tablename__} "
+                    f"WHERE {VOTE_CONGRESS_SQL} = ANY(:congress_nums)"
+                ),
+                params,
+            ).scalars()
+        )
+        for table, sql in deletes:
+            if feed:
+                sql += feed.returning_sql(table, inserted=False)
+            result = session.execute(text(sql), params)
+            if feed:
+                feed.record_on_commit(session, table, result.all(), removed=True)
+
+        for orm in orms:
+            orm.write_rows(session, orm.transform_all())
+
+        # Deleted votes may have been the latest on bills or nominations that
+        # span other congresses.
+        orms[-1].refresh_latest(session)
+        # Loading refreshed the periods of the new votes.
+        refresh_rollups(session, old_dates)
+        scorecard_orm.refresh(session, congresses=congress_nums)
+        session.commit()
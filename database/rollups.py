@@ -0,0 +1,151 @@
+"""Maintain daily and weekly rollups of roll calls for time-series queries."""
+
+from sqlalchemy import Column, Computed, Date, Float, Integer, String, inspect, text
+from database.base import Base
+
+# Rollups are grouped on vote_meta columns and count positions from `votes`.
+# Table names are spelled out because `database.votes` imports this module.
+ROLLUP_SQL = """
+WITH roll_calls AS (
+  SELECT
+    date_trunc('{grain}', vote_meta.date)::date AS period,
+    vote_meta.chamber,
+    vote_meta.category,
+    vote_meta.result,
+    count(*) FILTER (WHERE position.name = 'Yea') AS yea_votes,
+    count(*) FILTER (WHERE position.name = 'Nay') AS nay_votes,
+    count(*) FILTER (WHERE position.name = 'Present') AS present_votes,
+    count(*) FILTER (WHERE position.name = 'Not Voting') AS not_voting
+  FROM
+    vote_meta
+    LEFT JOIN votes ON (votes.vote_id = vote_meta.vote_id)
+    LEFT JOIN vote_positions position ON (position.code = votes.position)
+  {where}
+  GROUP BY
+    vote_meta.vote_id
+)
+SELECT
+  period,
+  chamber,
+  category,
+  result,
+  count(*) AS roll_calls,
+  sum(yea_votes) AS yea_votes,
+  sum(nay_votes) AS nay_votes,
+  sum(present_votes) AS present_votes,
+  sum(not_voting) AS not_voting,
+  sum(yea_votes - nay_votes) AS total_margin,
+  min(abs(yea_votes - nay_votes)) AS narrowest_margin,
+  max(abs(yea_votes - nay_votes)) AS widest_margin
+FROM
+  roll_calls
+GROUP BY
+  period,
+  chamber,
+  category,
+  result"""
+
+ROLLUP_COLUMNS = [
+    "period",
+    "chamber",
+    "category",
+    "result",
+    "roll_calls",
+    "yea_votes",
+    "nay_votes",
+    "present_votes",
+    "not_voting",
+    "total_margin",
+    "narrowest_margin",
+    "widest_margin",
+]
+
+
+class VoteRollup:
+    """
+    Columns shared by the rollup tables.
+
+    A roll call's margin is its Yea count minus its Nay count, so it's negative
+    when more members voted against.
+    """
+
+    period = Column(Date, primary_key=True)
+    chamber = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    result = Column(String, primary_key=True)
+    roll_calls = Column(Integer, nullable=False)
+    yea_votes = Column(Integer, nullable=False)
+    nay_votes = Column(Integer, nullable=False)
+    present_votes = Column(Integer, nullable=False)
+    not_voting = Column(Integer, nullable=False)
+    total_margin = Column(Integer, nullable=False)
+    narrowest_margin = Column(Integer, nullable=False)
+    widest_margin = Column(Integer, nullable=False)
+    average_margin = Column(
+        Float, Computed("total_margin::float / NULLIF(roll_calls, 0)", persisted=True)
+    )
+
+
+class DailyVoteRollup(VoteRollup, Base):
+    """Roll calls per day, chamber, category and result."""
+
+    __tablename__ = "vote_rollups_daily"
+
+
+class WeeklyVoteRollup(VoteRollup, Base):
+    """Roll calls per week (starting Monday), chamber, category and result."""
+
+    __tablename__ = "vote_rollups_weekly"
+
+
+# `date_trunc` field -> rollup table.
+ROLLUPS = {"day": DailyVoteRollup, "week": WeeklyVoteRollup}
+
+
+def create_rollup_tables(engine):
+    """
+    Create any missing rollup tables.
+
+    Returns:
+        bool: Whether any table was created, and so needs a full refresh.
+    """
+    created = False
+    for model in ROLLUPS.values():
+        if not inspect(engine).has_table(model.__tablename__):
+            model.__table__.create(engine)
+            created = True
+    return created
+
+
+def refresh_rollups(session, dates=None):
+    """
+    Recompute rollups, all of them or only the periods some votes fall in.
+
+    Args:
+        session (Session | Connection): Where to run the queries.
+        dates (list[datetime] | None): Vote dates, as stored in `vote_meta`,
+            whose days and weeks need recomputing, or None for every period.
+    """
+    if dates is not None and not dates:
+        return
+
+    for grain, model in ROLLUPS.items():
+        table = model.__tablename__
+        if dates is None:
+            delete_where = where = ""
+        else:
+            periods = (
+                f"SELECT date_trunc('{grain}', vote_date)::date "
+                "FROM unnest(CAST(:dates AS timestamp[])) vote_date"
+            )
+            delete_where = f"WHERE period IN ({periods})"
+            where = f"WHERE date_trunc('{grain}', vote_meta.date)::date IN ({periods})"
+
+        session.execute(text(f"DELETE FROM {table} {delete_where}"), {"dates": dates})
+        session.execute(
+            text(
+                f"INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)})"
+                + ROLLUP_SQL.format(grain=grain, where=where)
+            ),
+            {"dates": dates},
+        )
@@ -0,0 +1,148 @@
+"""Keep transformed rows on disk so unchanged data files needn't be parsed again.
+
+Entries are keyed by a hash of the data file's contents and path, and of the
+loader's transform version, so editing a file or bumping a loader's
+`TRANSFORM_VERSION` simply misses. Each entry holds one file's rows per table,
+as column names plus value tuples (vote positions keep their compact
+`VotePositionBatch` arrays), pickled and compressed.
+
+The cache only ever holds what the loaders put in it, so it's safe to delete
+at any time. Once it grows past its size limit, the least recently used
+entries are removed at the end of the run.
+"""
+
+import os
+import zlib
+import pickle
+import hashlib
+import threading
+
+_active_cache = None
+
+
+def _encode(rows):
+    packed = {}
+    for table, records in rows.items():
+        if isinstance(records, list):
+            columns = tuple(records[0]) if records else ()
+            packed[table] = (columns, [tuple(r[c] for c in columns) for r in records])
+        else:
+            packed[table] = records
+    return zlib.compress(pickle.dumps(packed, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def _decode(body):
+    rows = {}
+    for table, records in pickle.loads(zlib.decompress(body)).items():
+        if isinstance(records, tuple):
+            columns, values = records
+            rows[table] = [dict(zip(columns, v)) for v in values]
+        else:
+            rows[table] = records
+    return rows
+
+
+class RowCache:
+    """A directory of transformed rows, one file per data file and transform."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(namespace, path, raw):
+        """
+        Build the key for a data file's rows.
+
+        Args:
+            namespace (str): The loader and its transform version.
+            path (str): The data file's path, which ends up in `source_filename`.
+            raw (bytes): The data file's contents.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (namespace.encode(), path.encode(), raw):
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Return the cached rows for a key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                rows = _decode(f.read())
+            # Eviction goes by modification time, so mark the entry as used.
+            os.utime(path)
+        except FileNotFoundError:
+            rows = None
+        except (OSError, EOFError, ValueError, zlib.error, pickle.UnpicklingError):
+            # A damaged entry is just a miss; drop it so it's rewritten.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            rows = None
+
+        with self._lock:
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return rows
+
+    def put(self, key, rows):
+        """Store rows under a key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_encode(rows))
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits its limit.
+
+        Returns:
+            tuple: (entries removed, bytes left)
+        """
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed, total
+
+
+def open_row_cache(directory, max_bytes):
+    """Read and write transformed rows through a cache directory for this run."""
+    global _active_cache  # pylint: disable=global-statement
+    _active_cache = RowCache(directory, max_bytes)
+    return _active_cache
+
+
+def active_row_cache():
+    """Return the row cache, if one is open."""
+    return _active_cache
@@ -0,0 +1,258 @@
+"""Maintain the `legislator_scorecards` table of per-congress voting records."""
+
+from sqlalchemy import (
+    Column,
+    Computed,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    inspect,
+    text,
+)
+from sqlalchemy.orm import Session
+from database.base import Base, BaseOrm
+from database.votes import Vote, VoteMeta, VotePosition
+
+# The congress a vote belongs to. vote_meta.congress is only stamped when
+# congress.json covers the vote's date, but the vote_id always says.
+VOTE_CONGRESS_SQL = (
+    "COALESCE(vote_meta.congress, "
+    "split_part(split_part(vote_meta.vote_id, '-', 2), '.', 1))"
+)
+
+# The (legislator_id, congress) pairs with a position on any of :vote_ids.
+TOUCHED_PAIRS_SQL = f"""
+SELECT votes.legislator_id, {VOTE_CONGRESS_SQL}
+FROM {Vote.__tablename__} votes
+  JOIN {VoteMeta.__tablename__} vote_meta USING (vote_id)
+WHERE votes.vote_id = ANY(:vote_ids)"""
+
+SCORECARD_COLUMNS = [
+    "legislator_id",
+    "congress",
+    "legislator_key",
+    "party",
+    "roll_calls",
+    "votes_cast",
+    "party_votes",
+    "with_party",
+    "majority_votes",
+    "with_majority",
+]
+
+
+def scorecard_sql(where=""):
+    """
+    Build the query computing scorecards from `votes`, `vote_meta` and `legislators`.
+
+    Each roll call's party position is whichever of Yea or Nay most of the
+    party's members voted; ties have no position and don't count towards unity.
+
+    Args:
+        where (str): An extra condition on `votes` and `vote_meta` limiting which
+            legislators' records are computed, eg. to a few congresses.
+
+    Returns:
+        str: A SELECT producing rows with `SCORECARD_COLUMNS`.
+    """
+    return f"""
+WITH positions AS (
+  SELECT
+    votes.vote_id,
+    votes.legislator_id,
+    votes.legislator_key,
+    {VOTE_CONGRESS_SQL} AS congress,
+    vote_meta.majority_party,
+    legislators.party,
+    position.name AS position
+  FROM
+    {Vote.__tablename__} votes
+    JOIN {VoteMeta.__tablename__} vote_meta USING (vote_id)
+    JOIN legislators ON (legislators.id = votes.legislator_id)
+    JOIN {VotePosition.__tablename__} position ON (position.code = votes.position)
+  {f"WHERE {where}" if where else ""}
+),
+party_positions AS (
+  -- Every member's vote counts, not just the legislators being computed.
+  SELECT
+    votes.vote_id,
+    legislators.party,
+    CASE
+      WHEN count(*) FILTER (WHERE position.name = 'Yea')
+        > count(*) FILTER (WHERE position.name = 'Nay') THEN 'Yea'
+      WHEN count(*) FILTER (WHERE position.name = 'Nay')
+        > count(*) FILTER (WHERE position.name = 'Yea') THEN 'Nay'
+    END AS position
+  FROM
+    {Vote.__tablename__} votes
+    JOIN legislators ON (legislators.id = votes.legislator_id)
+    JOIN {VotePosition.__tablename__} position ON (position.code = votes.position)
+  WHERE
+    votes.vote_id IN (SELECT vote_id FROM positions)
+  GROUP BY
+    votes.vote_id,
+    legislators.party
+)
+SELECT
+  positions.legislator_id,
+  positions.congress,
+  max(positions.legislator_key) AS legislator_key,
+  max(positions.party) AS party,
+  count(*) AS roll_calls,
+  count(*) FILTER (WHERE positions.position <> 'Not Voting') AS votes_cast,
+  count(own.position) FILTER (
+    WHERE positions.position IN ('Yea', 'Nay')
+  ) AS party_votes,
+  count(*) FILTER (WHERE positions.position = own.position) AS with_party,
+  count(majority.position) FILTER (
+    WHERE positions.position IN ('Yea', 'Nay')
+  ) AS majority_votes,
+  count(*) FILTER (WHERE positions.position = majority.position) AS with_majority
+FROM
+  positions
+  LEFT JOIN party_positions own ON (
+    own.vote_id = positions.vote_id AND own.party = positions.party
+  )
+  LEFT JOIN party_positions majority ON (
+    majority.vote_id = positions.vote_id
+    AND majority.party = positions.majority_party
+  )
+GROUP BY
+  positions.legislator_id,
+  positions.congress"""
+
+
+class LegislatorScorecard(Base):
+    """
+    Each legislator's voting record in a congress.
+
+    Counts are stored and the rates derived from them, so recomputing any
+    legislator's row never depends on anyone else's.
+    """
+
+    __tablename__ = "legislator_scorecards"
+
+    legislator_id = Column(String, ForeignKey("legislators.id"), primary_key=True)
+    congress = Column(String, primary_key=True)
+    legislator_key = Column(Integer, index=True)
+    party = Column(String)
+    # Roll calls the legislator appears on, and those they didn't miss.
+    roll_calls = Column(Integer, nullable=False)
+    votes_cast = Column(Integer, nullable=False)
+    # Yea/Nay votes where their party had a majority position, and those
+    # that matched it.
+    party_votes = Column(Integer, nullable=False)
+    with_party = Column(Integer, nullable=False)
+    # The same against the position of the chamber's majority party.
+    majority_votes = Column(Integer, nullable=False)
+    with_majority = Column(Integer, nullable=False)
+    participation_rate = Column(
+        Float, Computed("votes_cast::float / NULLIF(roll_calls, 0)", persisted=True)
+    )
+    party_unity_rate = Column(
+        Float, Computed("with_party::float / NULLIF(party_votes, 0)", persisted=True)
+    )
+    majority_agreement_rate = Column(
+        Float,
+        Computed("with_majority::float / NULLIF(majority_votes, 0)", persisted=True),
+    )
+
+
+class ScorecardOrm(BaseOrm):
+    """ORM class to interact with the legislator_scorecards table."""
+
+    def __init__(self, data_dir="./"):
+        super().__init__(data_dir)
+
+    def drop_all_tables(self):
+        """Override to restrict dropping tables."""
+        raise NotImplementedError("This operation is not allowed in subclasses.")
+
+    def create_table(self):
+        """Create the legislator_scorecards table."""
+        if not inspect(self.engine).has_table(LegislatorScorecard.__tablename__):
+            LegislatorScorecard.__table__.create(self.engine)
+
+    def drop_table(self):
+        """Drop the legislator_scorecards table."""
+        if inspect(self.engine).has_table(LegislatorScorecard.__tablename__):
+            LegislatorScorecard.__table__.drop(self.engine)
+
+    def ensure_populated(self):
+        """Create and fill the table if it's missing, eg. in an older database."""
+        if not inspect(self.engine).has_table(LegislatorScorecard.__tablename__):
+            self.create_table()
+            self.populate()
+
+    def refresh(self, session, vote_ids=None, congresses=None):
+        """
+        Recompute scorecards, all of them or only those some votes went into.
+
+        Args:
+            session (Session | Connection): Where to run the queries.
+            vote_ids (list[str] | None): Only recompute the legislators, in the
+                congresses, that have a position on one of these votes.
+            congresses (list[str] | None): Only recompute these congresses.
+        """
+        table = LegislatorScorecard.__tablename__
+        params = {"vote_ids": vote_ids, "congresses": congresses}
+        if vote_ids is not None:
+            where = (
+                f"(votes.legislator_id, {VOTE_CONGRESS_SQL}) IN ({TOUCHED_PAIRS_SQL})"
+            )
+            delete_where = f"(legislator_id, congress) IN ({TOUCHED_PAIRS_SQL})"
+        elif congresses is not None:
+            where = f"{VOTE_CONGRESS_SQL} = ANY(:congresses)"
+            delete_where = "congress = ANY(:congresses)"
+        else:
+            where = delete_where = ""
+
+        session.execute(
+            text(
+                f"DELETE FROM {table}"
+                + (f" WHERE {delete_where}" if delete_where else "")
+            ),
+            params,
+        )
+        session.execute(
+            text(
+                f"INSERT INTO {table} ({', '.join(SCORECARD_COLUMNS)})"
+                + scorecard_sql(where)
+            ),
+            params,
+        )
+
+    def populate(self):
+        """Recompute every scorecard from scratch."""
+        with Session(self.engine) as session:
+            self.refresh(session)
+            session.commit()
+
+    def find_mismatches(self):
+        """
+        Compare the table with a from-scratch recomputation.
+
+        Returns:
+            list[tuple]: (legislator_id, congress) of every row that's missing,
+                extra or has different counts.
+        """
+        columns = ", ".join(SCORECARD_COLUMNS)
+        with self.engine.connect() as conn:
+            return conn.execute(text(f"""
+WITH expected AS ({scorecard_sql()}),
+actual AS (SELECT {columns} FROM {LegislatorScorecard.__tablename__}),
+differences AS (
+  (SELECT * FROM expected EXCEPT ALL SELECT * FROM actual)
+  UNION ALL
+  (SELECT * FROM actual EXCEPT ALL SELECT * FROM expected)
+)
+SELECT DISTINCT legislator_id, congress FROM differences
+ORDER BY legislator_id, congress""")).all()
+
+    def get_count(self):
+        """Count the number of scorecards."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text(f"SELECT count(*) FROM {LegislatorScorecard.__tablename__}")
+            ).scalar()
@@ -0,0 +1,82 @@
+"""Full-text search over bill titles and amendment purposes.
+
+`bills` and `amendments` each carry a generated `search_vector` column with a
+GIN index, so Postgres keeps it up to date as rows are loaded and searching
+doesn't need the full scans an `ILIKE '%...%'` does.
+"""
+
+from sqlalchemy import text
+
+# Search configuration used both for the stored vectors and for queries.
+SEARCH_CONFIG = "english"
+
+# Short titles are the most telling, so they outrank the official title.
+BILL_SEARCH_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(short_title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'B')"
+)
+AMENDMENT_SEARCH_SQL = f"to_tsvector('{SEARCH_CONFIG}', coalesce(purpose, ''))"
+
+
+def ensure_search_column(engine, table, expression):
+    """
+    Add the search column and its index to a table created before they existed.
+
+    Args:
+        engine (Engine): The engine to run the DDL on.
+        table (Table): The table to add the column to.
+        expression (str): SQL expression the column is generated from.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS search_vector "
+                f"tsvector GENERATED ALWAYS AS ({expression}) STORED"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table.name}_search_vector "
+                f"ON {table.name} USING gin (search_vector)"
+            )
+        )
+
+
+def search(engine, query, congress=None, limit=20):
+    """
+    Search bills and amendments, best matches first.
+
+    The query uses web search syntax: quoted phrases, `or`, and `-` to exclude
+    a word.
+
+    Args:
+        engine (Engine): The engine to query.
+        query (str): What to search for.
+        congress (str | None): Only return results from this congress.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list[dict]: Results with `kind` ("bill" or "amendment"), `id`,
+            `bill_id`, `congress`, `text` and `rank`.
+    """
+    sql = f"""
+WITH q AS (SELECT websearch_to_tsquery('{SEARCH_CONFIG}', :query) AS query)
+SELECT 'bill' AS kind, bill_id AS id, bill_id, congress,
+  coalesce(short_title, title) AS text,
+  ts_rank_cd(search_vector, q.query) AS rank
+FROM bills, q
+WHERE search_vector @@ q.query
+  AND (CAST(:congress AS varchar) IS NULL OR congress = :congress)
+UNION ALL
+SELECT 'amendment', amendment_id, bill_id, congress, purpose,
+  ts_rank_cd(search_vector, q.query)
+FROM amendments, q
+WHERE search_vector @@ q.query
+  AND (CAST(:congress AS varchar) IS NULL OR congress = :congress)
+ORDER BY rank DESC, id
+LIMIT :limit"""
+    with engine.connect() as conn:
+        result = conn.execute(
+            text(sql), {"query": query, "congress": congress, "limit": limit}
+        )
+        return [dict(row) for row in result.mappings()]
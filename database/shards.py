@@ -0,0 +1,235 @@
+"""Split the ingest across machines by congress, then merge the pieces."""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database.base import BaseOrm
+from database.changes import active_feed
+from database.bills import BILL_CHILDREN, Bill, BillCosponsor, BillOrm
+from database.amendments import Amendment, AmendmentOrm
+from database.votes import Vote, VoteMeta, VoteOrm, VotePositionException
+from database.legislators import LegislatorOrm, backfill_keys
+from database.rollups import refresh_rollups
+
+# Tables each shard loads, in the order they have to be merged.
+SHARD_TABLES = [
+    Bill.__table__,
+    *(model.__table__ for model in BILL_CHILDREN),
+    Amendment.__table__,
+    VoteMeta.__table__,
+    Vote.__table__,
+    VotePositionException.__table__,
+]
+
+BILL_CHILD_TABLES = {model.__table__ for model in BILL_CHILDREN}
+
+# Legislator key columns to fill in after merging, for shards that were loaded
+# before the key mapping knew about everyone.
+KEY_COLUMNS = [
+    (Bill.__table__, "sponsor_key", "sponsor_id"),
+    (BillCosponsor.__table__, "cosponsor_key", "cosponsor_id"),
+    (Amendment.__table__, "sponsor_key", "sponsor_id"),
+    (Vote.__table__, "legislator_key", "legislator_id"),
+]
+
+# Comment put on a staging schema once its shard has finished loading.
+LOADED_MARKER = "loaded"
+
+# Arbitrary advisory lock id serializing table creation between shards.
+_DDL_LOCK_KEY = 7_110_119
+
+
+def parse_shard(spec: str):
+    """
+    Parse a shard spec of the form "i/N".
+
+    Args:
+        spec (str): The shard spec, eg. "2/4". Shards are numbered from 1.
+
+    Returns:
+        tuple[int, int]: The shard index and the total number of shards.
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError as e:
+        raise ValueError(f"Shard must look like 'i/N', got '{spec}'.") from e
+
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}.")
+    return index, count
+
+
+def shard_schema(index: int):
+    """Name of the staging schema a shard loads into."""
+    return f"shard_{index}"
+
+
+def shard_congresses(congress_nums, index: int, count: int):
+    """Pick the congress numbers a shard is responsible for."""
+    return [str(c) for c in congress_nums if int(c) % count == index - 1]
+
+
+def prepare_shard(data_dir, index: int):
+    """
+    Make sure the public tables exist and give the shard an empty staging schema.
+
+    Shards may start at the same time, so creating the public tables is done
+    under an advisory lock.
+    """
+    orm = BaseOrm(data_dir)
+    with orm.engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _DDL_LOCK_KEY})
+        try:
+            LegislatorOrm(data_dir).create_table()
+            BillOrm(data_dir).create_table()
+            AmendmentOrm(data_dir).create_table()
+            VoteOrm(data_dir).create_table()
+        finally:
+            conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _DDL_LOCK_KEY}
+            )
+            conn.commit()
+
+    schema = shard_schema(index)
+    with orm.engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+
+def _merge_statement(table, schema, returning=""):
+    """Build an upsert copying one staged table into its public counterpart."""
+    columns = [col.name for col in table.columns if col.computed is None]
+    keys = [col.name for col in table.primary_key.columns]
+    values = [col for col in columns if col not in keys]
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in values)
+    current = ", ".join(f"{table.name}.{col}" for col in values)
+    excluded = ", ".join(f"EXCLUDED.{col}" for col in values)
+
+    return f"""
+INSERT INTO public.{table.name} AS {table.name} ({column_list})
+SELECT {column_list}
+FROM {schema}.{table.name}
+ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}
+WHERE ({current}) IS DISTINCT FROM ({excluded}){returning}"""
+
+
+def mark_shard_loaded(data_dir, index: int):
+    """
+    Record that a shard finished loading, as a comment on its staging schema.
+
+    `prepare_shard` recreates the schema, so a shard that is loading again, or
+    crashed partway, is never marked.
+    """
+    with BaseOrm(data_dir).engine.begin() as conn:
+        conn.execute(
+            text(f"COMMENT ON SCHEMA {shard_schema(index)} IS '{LOADED_MARKER}'")
+        )
+
+
+def _orphans_statement(table, schema):
+    """
+    Build a DELETE of staged rows whose references are missing from the public
+    tables, or None if the table references nothing.
+
+    Staging tables have no foreign keys, so these rows would otherwise only fail
+    once they're merged, taking the whole merge with them.
+    """
+    conditions = []
+    for fk in table.foreign_key_constraints:
+        columns = [col.name for col in fk.columns]
+        referred = [element.column.name for element in fk.elements]
+        present = " AND ".join(f"s.{col} IS NOT NULL" for col in columns)
+        match = " AND ".join(
+            f"r.{ref} = s.{col}" for col, ref in zip(columns, referred)
+        )
+        conditions.append(
+            f"({present} AND NOT EXISTS "
+            f"(SELECT 1 FROM public.{fk.referred_table.name} r WHERE {match}))"
+        )
+    if not conditions:
+        return None
+    return f"DELETE FROM {schema}.{table.name} AS s WHERE " + " OR ".join(conditions)
+
+
+def missing_shards(data_dir, count: int):
+    """List the staging schemas of shards that have not finished loading."""
+    orm = BaseOrm(data_dir)
+    schemas = [shard_schema(index) for index in range(1, count + 1)]
+    with orm.engine.connect() as conn:
+        found = set(
+            conn.execute(
+                text(
+                    "SELECT nspname FROM pg_namespace "
+                    "WHERE nspname = ANY(:schemas) "
+                    "AND obj_description(oid, 'pg_namespace') = :marker"
+                ),
+                {"schemas": schemas, "marker": LOADED_MARKER},
+            ).scalars()
+        )
+    return [schema for schema in schemas if schema not in found]
+
+
+def merge_shards(data_dir, count: int):
+    """
+    Merge every shard's staging tables into the public tables.
+
+    The merge runs in a single transaction, in dependency order, and drops the
+    staging schemas once they have been copied. Legislators have to be loaded
+    beforehand so the foreign keys hold. Staged rows referencing rows that
+    aren't there, eg. a bill whose sponsor isn't in `legislators`, are left
+    out and counted, much as a regular load skips batches that break a
+    constraint; rows referencing those rows are then left out in turn.
+
+    Args:
+        data_dir (str): The data directory.
+        count (int): The total number of shards.
+
+    Returns:
+        dict: Table name -> staged rows left out for missing references.
+
+    Raises:
+        RuntimeError: If any shard has not been loaded.
+    """
+    missing = missing_shards(data_dir, count)
+    if missing:
+        raise RuntimeError(f"Shards not loaded yet: {', '.join(missing)}")
+
+    orm = BaseOrm(data_dir)
+    schemas = [shard_schema(index) for index in range(1, count + 1)]
+    feed = active_feed()
+    skipped = {}
+    with Session(orm.engine) as session:
+        for table in SHARD_TABLES:
+            tracked = feed is not None and feed.tracks(table)
+            returning = feed.returning_sql(table) if tracked else ""
+            orphans = [_orphans_statement(table, schema) for schema in schemas]
+            for schema, orphans_sql in zip(schemas, orphans):
+                if orphans_sql:
+                    dropped = session.execute(text(orphans_sql)).rowcount
+                    if dropped:
+                        skipped[table.name] = skipped.get(table.name, 0) + dropped
+                if table in BILL_CHILD_TABLES:
+                    # A bill's staged child rows replace all of its current ones.
+                    session.execute(
+                        text(
+                            f"DELETE FROM public.{table.name} WHERE bill_id IN "
+                            f"(SELECT bill_id FROM {schema}.{Bill.__tablename__})"
+                        )
+                    )
+                result = session.execute(
+                    text(_merge_statement(table, schema, returning))
+                )
+                if tracked:
+                    feed.record_on_commit(session, table, result.all())
+
+        for table, column, source_column in KEY_COLUMNS:
+            backfill_keys(session, table.name, column, source_column)
+
+        # Each shard only knew about its own votes.
+        VoteOrm(data_dir).refresh_latest(session)
+        refresh_rollups(session)
+
+        for schema in schemas:
+            session.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        session.commit()
+    return skipped
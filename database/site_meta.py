@@ -5,6 +5,7 @@ import pytz
 from sqlalchemy import Column, DateTime, String, inspect
 from sqlalchemy.orm import Session
 from database.base import Base, BaseOrm
+from database.notifications import notify_update
 
 
 class SiteMeta(Base):
@@ -41,11 +42,18 @@ class SiteMetaOrm(BaseOrm):
         ):
             SiteMeta.__table__.drop(self.engine)
 
-    def set_last_update(self):
-        """Insert a new update record."""
+    def set_last_update(self, tables=(), congresses=()):
+        """
+        Insert a new update record, and notify listeners of what changed.
+
+        Args:
+            tables (Iterable[str]): The tables this run changed.
+            congresses (Iterable[str]): The congresses this run changed.
+        """
         with Session(self.engine) as session:
             update = SiteMeta(
                 last_update=datetime.now(), tz="America/New_York"
             )
             session.add(update)
+            notify_update(session, update.last_update, tables, congresses)
             session.commit()
@@ -0,0 +1,452 @@
+"""Export pre-rendered, gzip-compressed JSON documents for the public site.
+
+Every legislator, bill and vote gets its own document, plus an index file per
+kind, laid out so the site can serve them straight from disk or a CDN:
+
+    legislators/index.json.gz    legislators/<id>.json.gz
+    bills/index.json.gz          bills/<bill_id>.json.gz
+    votes/index.json.gz          votes/<vote_id>.json.gz
+
+Documents are rendered deterministically and hashed before compression. The
+hashes are kept in a manifest, so a later export only rewrites documents whose
+contents changed and removes documents for rows that no longer exist.
+
+A full export renders every document. Given the votes and bills an ingest
+changed, an export renders only their documents, the bills and legislators
+those votes touch, and the index files, which are patched from the previous
+export.
+"""
+
+import os
+import json
+import gzip
+import hashlib
+from itertools import groupby
+from sqlalchemy import text
+from database.base import BaseOrm
+
+MANIFEST = "manifest.json"
+
+# Index documents an incremental export patches.
+INDEXES = ("votes/index", "bills/index", "legislators/index")
+
+# Rows streamed from the server at a time for the large per-position queries.
+STREAM_ROWS = 10000
+
+# Fields of a vote repeated in the votes index and in bill documents.
+SUMMARY_FIELDS = (
+    "vote_id",
+    "chamber",
+    "date",
+    "category",
+    "result",
+    "bill_id",
+    "amendment_id",
+)
+
+
+def _default(value):
+    """Serialize the dates and decimals JSON doesn't know about."""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def render(document):
+    """Render a document to canonical JSON bytes."""
+    return json.dumps(
+        document, sort_keys=True, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+class SnapshotWriter:
+    """Write documents under an output directory, skipping unchanged ones."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.previous = {}
+        self.current = {}
+        self.counts = {"written": 0, "unchanged": 0, "removed": 0}
+
+        manifest_path = os.path.join(output_dir, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.previous = json.load(f)
+
+    def carry_over(self):
+        """Keep every previous document unless it's rewritten or removed."""
+        self.current = dict(self.previous)
+
+    def read(self, relpath):
+        """
+        Read a document from the previous export.
+
+        Returns:
+            dict | list | None: The document, or None if there isn't one.
+        """
+        relpath = f"{relpath}.json.gz"
+        path = os.path.join(self.output_dir, relpath)
+        if relpath not in self.previous or not os.path.exists(path):
+            return None
+        with gzip.open(path, "rb") as f:
+            return json.loads(f.read())
+
+    def remove(self, relpath):
+        """Remove a document when the export finishes."""
+        self.current.pop(f"{relpath}.json.gz", None)
+
+    def write(self, relpath, document):
+        """
+        Write one document, unless the same contents are already on disk.
+
+        Args:
+            relpath (str): Path relative to the output directory, without the
+                `.json.gz` suffix.
+            document (dict | list): The document to write.
+        """
+        relpath = f"{relpath}.json.gz"
+        body = render(document)
+        digest = hashlib.sha256(body).hexdigest()
+        self.current[relpath] = digest
+
+        path = os.path.join(self.output_dir, relpath)
+        if self.previous.get(relpath) == digest and os.path.exists(path):
+            self.counts["unchanged"] += 1
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename it into place so a reader never
+        # sees a half-written document. mtime=0 keeps the output reproducible.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                f.write(body)
+        os.replace(tmp_path, path)
+        self.counts["written"] += 1
+
+    def finish(self):
+        """
+        Remove documents that weren't written this time and save the manifest.
+
+        Returns:
+            dict: Counts of documents written, unchanged and removed.
+        """
+        for relpath in self.previous.keys() - self.current.keys():
+            path = os.path.join(self.output_dir, relpath)
+            if os.path.exists(path):
+                os.remove(path)
+            self.counts["removed"] += 1
+
+        manifest_path = os.path.join(self.output_dir, MANIFEST)
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.current, f, indent=0, sort_keys=True)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        return self.counts
+
+
+def _stream(conn, sql, params=None):
+    """Stream the rows of a query as mappings without buffering them all."""
+    result = conn.execution_options(
+        stream_results=True, yield_per=STREAM_ROWS
+    ).execute(text(sql), params or {})
+    return result.mappings()
+
+
+def _only(column, ids):
+    """A WHERE clause limiting a query to some ids, or nothing for every row."""
+    if ids is None:
+        return "", {}
+    return f"WHERE {column} = ANY(:ids)", {"ids": list(ids)}
+
+
+def _as_json(document):
+    """A document as it reads back from disk, eg. with dates as strings."""
+    return json.loads(render(document))
+
+
+def _without(row, column):
+    """A row as a dict, minus the column it was grouped by."""
+    return {key: value for key, value in row.items() if key != column}
+
+
+def _tally(positions):
+    """Count the positions in a vote."""
+    totals = {}
+    for position in positions:
+        totals[position["position"]] = totals.get(position["position"], 0) + 1
+    return totals
+
+
+def export_votes(conn, writer, vote_ids=None):
+    """
+    Write one document per vote and the votes index.
+
+    Args:
+        conn (Connection): The connection to read from.
+        writer (SnapshotWriter): Where to write the documents.
+        vote_ids (list[str] | None): Only write these votes' documents and patch
+            them into the previous index, or None for every vote.
+
+    Returns:
+        dict: vote_id -> summary of every vote, reused by the bill documents.
+    """
+    where, params = _only("vote_id", vote_ids)
+    meta = {
+        row["vote_id"]: dict(row)
+        for row in conn.execute(
+            text(f"SELECT * FROM enriched_vote_meta {where} ORDER BY vote_id"),
+            params,
+        ).mappings()
+    }
+
+    where, params = _only("v.vote_id", vote_ids)
+    rows = _stream(
+        conn,
+        f"""
+SELECT v.vote_id, v.legislator_id, v.position, v.original_position,
+  l.name, l.party, l.state
+FROM votes_text v
+LEFT JOIN legislators l ON l.id = v.legislator_id
+{where}
+ORDER BY v.vote_id, v.legislator_id""",
+        params,
+    )
+    summaries = {}
+    if vote_ids is not None:
+        summaries = {
+            summary["vote_id"]: summary
+            for summary in writer.read("votes/index")
+            if summary["vote_id"] not in vote_ids
+        }
+    written = set()
+
+    def write_vote(vote_id, positions):
+        vote = meta.get(vote_id, {"vote_id": vote_id})
+        totals = _tally(positions)
+        summary = {key: vote.get(key) for key in SUMMARY_FIELDS}
+        summaries[vote_id] = _as_json({**summary, "totals": totals})
+        written.add(vote_id)
+        writer.write(
+            f"votes/{vote_id}", {**vote, "totals": totals, "positions": positions}
+        )
+
+    for vote_id, group in groupby(rows, key=lambda row: row["vote_id"]):
+        write_vote(vote_id, [_without(row, "vote_id") for row in group])
+
+    # Votes nobody has cast a position on yet still get a document.
+    for vote_id in sorted(meta.keys() - written):
+        write_vote(vote_id, [])
+
+    for vote_id in set(vote_ids or ()) - written:
+        writer.remove(f"votes/{vote_id}")
+
+    writer.write("votes/index", sorted(summaries.values(), key=lambda s: s["vote_id"]))
+    return summaries
+
+
+def export_bills(conn, writer, vote_summaries, bill_ids=None):
+    """
+    Write one document per bill, with its amendments and roll calls.
+
+    Args:
+        conn (Connection): The connection to read from.
+        writer (SnapshotWriter): Where to write the documents.
+        vote_summaries (dict): vote_id -> summary of every vote.
+        bill_ids (list[str] | None): Only write these bills' documents and patch
+            them into the previous index, or None for every bill.
+    """
+    where, params = _only("bill_id", bill_ids)
+    amendments = {}
+    for row in conn.execute(
+        text(
+            "SELECT amendment_id, bill_id, sponsor_id, chamber, purpose, congress "
+            f"FROM amendments {where} ORDER BY amendment_id"
+        ),
+        params,
+    ).mappings():
+        amendments.setdefault(row["bill_id"], []).append(dict(row))
+
+    roll_calls = {}
+    for summary in vote_summaries.values():
+        if summary["bill_id"]:
+            roll_calls.setdefault(summary["bill_id"], []).append(summary)
+
+    index = {}
+    if bill_ids is not None:
+        index = {
+            entry["bill_id"]: entry
+            for entry in writer.read("bills/index")
+            if entry["bill_id"] not in bill_ids
+        }
+    written = set()
+    for row in _stream(
+        conn,
+        "SELECT bill_id, bill_type, bill_number, title, short_title, sponsor_id, "
+        f"status, status_at, congress FROM bills {where} ORDER BY bill_id",
+        params,
+    ):
+        bill = dict(row)
+        bill_votes = sorted(
+            roll_calls.get(bill["bill_id"], []),
+            key=lambda s: (s["date"], s["vote_id"]),
+        )
+        writer.write(
+            f"bills/{bill['bill_id']}",
+            {
+                **bill,
+                "amendments": amendments.get(bill["bill_id"], []),
+                "votes": bill_votes,
+            },
+        )
+        index[bill["bill_id"]] = {
+            key: bill[key]
+            for key in ("bill_id", "title", "short_title", "status", "congress")
+        }
+        written.add(bill["bill_id"])
+
+    for bill_id in set(bill_ids or ()) - written:
+        writer.remove(f"bills/{bill_id}")
+
+    writer.write("bills/index", [index[bill_id] for bill_id in sorted(index)])
+
+
+def export_legislators(conn, writer, legislator_ids=None):
+    """
+    Write one document per legislator with their voting record.
+
+    Args:
+        conn (Connection): The connection to read from.
+        writer (SnapshotWriter): Where to write the documents.
+        legislator_ids (list[str] | None): Only write these legislators'
+            documents and patch them into the previous index, or None for
+            every legislator.
+    """
+    where, params = _only("id", legislator_ids)
+    legislators = {
+        row["id"]: dict(row)
+        for row in conn.execute(
+            text(
+                "SELECT id, bioguide_id, lis_id, name, term_type, state, district, "
+                f"party, caucus, url FROM legislators {where} ORDER BY id"
+            ),
+            params,
+        ).mappings()
+    }
+
+    where, params = _only("v.legislator_id", legislator_ids)
+    rows = _stream(
+        conn,
+        f"""
+SELECT v.legislator_id, v.vote_id, v.position, v.original_position,
+  vm.date, vm.chamber, vm.category, vm.result, vm.bill_id, vm.amendment_id,
+  vm.nomination_title
+FROM votes_text v
+JOIN vote_meta vm USING (vote_id)
+{where}
+ORDER BY v.legislator_id, vm.date, v.vote_id""",
+        params,
+    )
+    vote_counts = {}
+    for legislator_id, group in groupby(rows, key=lambda row: row["legislator_id"]):
+        record = [_without(row, "legislator_id") for row in group]
+        vote_counts[legislator_id] = len(record)
+        legislator = legislators.get(legislator_id, {"id": legislator_id})
+        writer.write(f"legislators/{legislator_id}", {**legislator, "votes": record})
+
+    for legislator_id, legislator in legislators.items():
+        if legislator_id not in vote_counts:
+            writer.write(f"legislators/{legislator_id}", {**legislator, "votes": []})
+
+    index = {}
+    if legislator_ids is not None:
+        index = {
+            entry["id"]: entry
+            for entry in writer.read("legislators/index")
+            if entry["id"] not in legislator_ids
+        }
+        for legislator_id in (
+            set(legislator_ids) - legislators.keys() - vote_counts.keys()
+        ):
+            writer.remove(f"legislators/{legislator_id}")
+    for legislator_id, legislator in legislators.items():
+        index[legislator_id] = {
+            "id": legislator_id,
+            "name": legislator["name"],
+            "party": legislator["party"],
+            "state": legislator["state"],
+            "term_type": legislator["term_type"],
+            "votes": vote_counts.get(legislator_id, 0),
+        }
+
+    writer.write(
+        "legislators/index",
+        [index[legislator_id] for legislator_id in sorted(index)],
+    )
+
+
+def export_snapshots(data_dir, output_dir, vote_ids=None, bill_ids=None):
+    """
+    Export static JSON documents for legislators, bills and votes.
+
+    Run this after `create_views`, since documents are built from the
+    `enriched_vote_meta` and `votes_text` views.
+
+    Args:
+        data_dir (str): The data directory.
+        output_dir (str): Where to write the documents.
+        vote_ids (Iterable[str] | None): Votes whose rows changed.
+        bill_ids (Iterable[str] | None): Bills whose rows, or amendments,
+            changed. Without either, every document is exported; so is it when
+            there's no previous export to patch.
+
+    Returns:
+        dict: Counts of documents written, unchanged and removed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    writer = SnapshotWriter(output_dir)
+    orm = BaseOrm(data_dir)
+
+    incremental = (vote_ids is not None or bill_ids is not None) and all(
+        writer.read(index) is not None for index in INDEXES
+    )
+    vote_ids = set(vote_ids or ())
+    bill_ids = set(bill_ids or ())
+    legislator_ids = set()
+    if incremental:
+        writer.carry_over()
+        # Bills and legislators the votes touched before this ingest.
+        for vote_id in vote_ids:
+            vote = writer.read(f"votes/{vote_id}")
+            if vote is not None:
+                bill_ids.add(vote.get("bill_id"))
+                legislator_ids.update(p["legislator_id"] for p in vote["positions"])
+
+    # One read-only transaction, so every document sees the same data.
+    with orm.engine.connect() as conn:
+        conn.execute(
+            text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        )
+        if not incremental:
+            vote_summaries = export_votes(conn, writer)
+            export_bills(conn, writer, vote_summaries)
+            export_legislators(conn, writer)
+            return writer.finish()
+
+        legislator_ids.update(
+            conn.execute(
+                text(
+                    "SELECT DISTINCT legislator_id FROM votes_text "
+                    "WHERE vote_id = ANY(:ids)"
+                ),
+                {"ids": list(vote_ids)},
+            ).scalars()
+        )
+        vote_summaries = export_votes(conn, writer, vote_ids)
+        bill_ids.update(
+            vote_summaries[vote_id]["bill_id"]
+            for vote_id in vote_ids
+            if vote_id in vote_summaries
+        )
+        bill_ids.discard(None)
+        export_bills(conn, writer, vote_summaries, bill_ids)
+        export_legislators(conn, writer, legislator_ids)
+
+    return writer.finish()
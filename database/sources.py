@@ -0,0 +1,385 @@
+"""Read the scraper's data files from a directory or straight out of an archive.
+
+Loaders address data files by their path relative to the scraper's `data`
+folder, eg. `119/votes/2025/h12/data.json`, whatever that folder lives in:
+
+- a directory, such as the sibling `congress/data` checkout (only ever read);
+- a `.tar`, `.tar.gz`, `.tar.bz2` or `.tar.xz` bundle;
+- a `.zip` bundle;
+- a pack directory written by `database.packs.pack`, with one segment file per
+  congress instead of one file per document.
+
+Archives may keep the files under a prefix like `data/` or `congress/data/`;
+it's found and stripped automatically. Members are never extracted into files
+of their own.
+"""
+
+import os
+import bz2
+import gzip
+import lzma
+import mmap
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from fnmatch import fnmatchcase
+from database import decoding
+
+# Folders inside each congress directory holding the files the loaders read.
+DATA_FOLDERS = ("bills", "amendments", "votes")
+
+# Files at the top of the data folder.
+META_FILES = ("congress.json", "legislators.json")
+
+# Marks a pack directory and lists the congresses packed into it.
+PACK_MANIFEST = "pack.json"
+
+# Decompressors for compressed tarballs, by magic number.
+_DECOMPRESSORS = {
+    b"\x1f\x8b": gzip.open,
+    b"BZh": bz2.open,
+    b"\xfd7zXZ": lzma.open,
+}
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def source_filename(relpath):
+    """
+    The `source_filename` stored for a data file.
+
+    It's the same whichever kind of source the file came from, and matches what
+    a load from the default `data` directory has always stored.
+    """
+    return f"data/{relpath}"
+
+
+def index_filename(congress):
+    """The name of a congress's segment index in a pack directory."""
+    return f"{congress}.index.json"
+
+
+def _matches(parts, pattern):
+    """Match path parts against glob pattern parts, where `**` spans folders."""
+    if not pattern:
+        return not parts
+    if pattern[0] == "**":
+        return any(_matches(parts[i:], pattern[1:]) for i in range(len(parts) + 1))
+    return (
+        bool(parts)
+        and fnmatchcase(parts[0], pattern[0])
+        and _matches(parts[1:], pattern[1:])
+    )
+
+
+def _archive_root(names):
+    """Find the folder inside an archive that holds the congress directories."""
+    roots = set()
+    for name in names:
+        parts = name.split("/")
+        if parts[-1] in META_FILES:
+            roots.add("/".join(parts[:-1]))
+        for i, part in enumerate(parts[:-2]):
+            if part.isdigit() and parts[i + 1] in DATA_FOLDERS:
+                roots.add("/".join(parts[:i]))
+                break
+    return min(roots, key=len, default="")
+
+
+class DataSource:
+    """Read-only access to data files by their path relative to the data folder."""
+
+    def __init__(self, location):
+        self.location = location
+
+    def files(self):
+        """List every file in the source."""
+        raise NotImplementedError("Subclasses must override.")
+
+    def glob(self, pattern):
+        """
+        List the files matching a glob pattern, in a stable order.
+
+        Args:
+            pattern (str): eg. `*/votes/*/*/data.json`. `**` matches any number
+                of folders.
+
+        Returns:
+            list[str]: Matching paths relative to the data folder.
+        """
+        pattern_parts = pattern.split("/")
+        return sorted(
+            path for path in self.files() if _matches(path.split("/"), pattern_parts)
+        )
+
+    def exists(self, relpath):
+        """Determine if a data file exists."""
+        raise NotImplementedError("Subclasses must override.")
+
+    def read_bytes(self, relpath):
+        """Read a data file."""
+        raise NotImplementedError("Subclasses must override.")
+
+    def signature(self, relpath):
+        """
+        Something that changes when a data file does.
+
+        Returns:
+            tuple | None: (modification time, size), or None if it's missing.
+        """
+        raise NotImplementedError("Subclasses must override.")
+
+    def load_json(self, relpath):
+        """Load a JSON data file."""
+        return decoding.loads(self.read_bytes(relpath))
+
+    def congress_dirs(self):
+        """List the congress numbers that have a directory in the source."""
+        return sorted(
+            {
+                path.split("/", 1)[0]
+                for path in self.files()
+                if "/" in path and path.split("/", 1)[0].isdigit()
+            },
+            key=int,
+        )
+
+
+class DirectorySource(DataSource):
+    """Data files in a directory, eg. the scraper's own `data` folder."""
+
+    def __init__(self, location):
+        super().__init__(location)
+        self.root = Path(location)
+
+    def files(self):
+        return [
+            path.relative_to(self.root).as_posix()
+            for path in self.root.rglob("*")
+            if path.is_file()
+        ]
+
+    def glob(self, pattern):
+        # Let the filesystem narrow things down instead of walking every file.
+        return sorted(
+            path.relative_to(self.root).as_posix()
+            for path in self.root.glob(pattern)
+            if path.is_file()
+        )
+
+    def exists(self, relpath):
+        return (self.root / relpath).is_file()
+
+    def read_bytes(self, relpath):
+        return (self.root / relpath).read_bytes()
+
+    def signature(self, relpath):
+        try:
+            stat = os.stat(self.root / relpath)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def congress_dirs(self):
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            (d.name for d in self.root.iterdir() if d.is_dir() and d.name.isdigit()),
+            key=int,
+        )
+
+
+class TarSource(DataSource):
+    """
+    Data files inside a tarball, read without extracting it.
+
+    Compressed tarballs can't be read at random, so they're decompressed once
+    into an anonymous temporary file. Members are then read by offset, which is
+    safe from any number of threads.
+    """
+
+    def __init__(self, location):
+        super().__init__(location)
+        with open(location, "rb") as f:
+            magic = f.read(6)
+        decompress = next(
+            (
+                opener
+                for prefix, opener in _DECOMPRESSORS.items()
+                if magic.startswith(prefix)
+            ),
+            None,
+        )
+        if decompress:
+            self._file = tempfile.TemporaryFile()
+            with decompress(location, "rb") as compressed:
+                shutil.copyfileobj(compressed, self._file, 1024 * 1024)
+            self._file.seek(0)
+        else:
+            self._file = open(location, "rb")  # pylint: disable=consider-using-with
+
+        members = {}
+        with tarfile.open(fileobj=self._file, mode="r:") as tar:
+            for member in tar:
+                if member.isfile():
+                    members[member.name.removeprefix("./")] = (
+                        member.offset_data,
+                        member.size,
+                        member.mtime,
+                    )
+        root = _archive_root(members)
+        prefix = f"{root}/" if root else ""
+        self._members = {
+            name[len(prefix) :]: entry
+            for name, entry in members.items()
+            if name.startswith(prefix)
+        }
+
+    def files(self):
+        return self._members.keys()
+
+    def exists(self, relpath):
+        return relpath in self._members
+
+    def read_bytes(self, relpath):
+        offset, size, _ = self._members[relpath]
+        return os.pread(self._file.fileno(), size, offset)
+
+    def signature(self, relpath):
+        entry = self._members.get(relpath)
+        return None if entry is None else (entry[2], entry[1])
+
+
+class ZipSource(DataSource):
+    """Data files inside a zip file, read without extracting it."""
+
+    def __init__(self, location):
+        super().__init__(location)
+        self._zip = zipfile.ZipFile(location)  # pylint: disable=consider-using-with
+        self._lock = threading.Lock()
+        infos = {info.filename: info for info in self._zip.infolist()}
+        infos = {name: info for name, info in infos.items() if not info.is_dir()}
+        root = _archive_root(infos)
+        prefix = f"{root}/" if root else ""
+        self._members = {
+            name[len(prefix) :]: info
+            for name, info in infos.items()
+            if name.startswith(prefix)
+        }
+
+    def files(self):
+        return self._members.keys()
+
+    def exists(self, relpath):
+        return relpath in self._members
+
+    def read_bytes(self, relpath):
+        with self._lock:
+            return self._zip.read(self._members[relpath])
+
+    def signature(self, relpath):
+        info = self._members.get(relpath)
+        return None if info is None else (info.date_time, info.file_size)
+
+
+class PackedSource(DataSource):
+    """
+    Data files packed into one segment file per congress.
+
+    A segment holds one compact JSON document per line, and the congress's
+    index maps each data file's path to its offset and length. Segments are
+    memory mapped, so reading a document is a slice rather than an open, a stat
+    and a read. `congress.json` and `legislators.json` are kept as plain files.
+    """
+
+    def __init__(self, location):
+        super().__init__(location)
+        self.root = Path(location)
+        manifest = decoding.loads((self.root / PACK_MANIFEST).read_bytes())
+        self._congresses = manifest["congresses"]
+        self._documents = {}
+        self._maps = {}
+        self._lock = threading.Lock()
+        for congress in self._congresses:
+            index = decoding.loads((self.root / index_filename(congress)).read_bytes())
+            for relpath, (offset, length, _, signature) in index["documents"].items():
+                self._documents[relpath] = (index["segment"], offset, length, signature)
+
+    def _map(self, segment):
+        """Memory map a segment the first time one of its documents is read."""
+        if segment not in self._maps:
+            with self._lock:
+                if segment not in self._maps:
+                    with open(self.root / segment, "rb") as f:
+                        self._maps[segment] = mmap.mmap(
+                            f.fileno(), 0, access=mmap.ACCESS_READ
+                        )
+        return self._maps[segment]
+
+    def files(self):
+        return list(self._documents) + [
+            name for name in META_FILES if (self.root / name).is_file()
+        ]
+
+    def exists(self, relpath):
+        if relpath in META_FILES:
+            return (self.root / relpath).is_file()
+        return relpath in self._documents
+
+    def read_bytes(self, relpath):
+        if relpath in META_FILES:
+            return (self.root / relpath).read_bytes()
+        segment, offset, length, _ = self._documents[relpath]
+        return self._map(segment)[offset : offset + length]
+
+    def signature(self, relpath):
+        entry = self._documents.get(relpath)
+        return None if entry is None else entry[3]
+
+    def congress_dirs(self):
+        return sorted(self._congresses, key=int)
+
+
+def watchable(location):
+    """Determine if a location is a plain directory whose files can be watched."""
+    return os.path.isdir(location) and not os.path.isfile(
+        os.path.join(location, PACK_MANIFEST)
+    )
+
+
+def open_source(location):
+    """
+    Open the data source at a location, once per process.
+
+    Args:
+        location (str): A data directory, a tar or zip archive of one, or a
+            pack directory.
+
+    Returns:
+        DataSource: The source. Repeated calls return the same object, so an
+            archive is only indexed (and decompressed) once.
+
+    Raises:
+        ValueError: If the location is a file that isn't a tar or zip archive.
+    """
+    key = os.path.abspath(location)
+    with _sources_lock:
+        if key not in _sources:
+            if os.path.isfile(os.path.join(location, PACK_MANIFEST)):
+                source = PackedSource(location)
+            elif not os.path.isfile(location):
+                source = DirectorySource(location)
+            elif zipfile.is_zipfile(location):
+                source = ZipSource(location)
+            elif tarfile.is_tarfile(location):
+                source = TarSource(location)
+            else:
+                raise ValueError(
+                    f"{location} is neither a directory nor a tar or zip archive."
+                )
+            _sources[key] = source
+        return _sources[key]
@@ -3,6 +3,7 @@
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from database.base import BaseOrm
+from database.votes import OTHER_POSITION
 
 
 def create_views(data_dir):
@@ -11,67 +12,55 @@ def create_views(data_dir):
     orm = BaseOrm(data_dir)
     engine = orm.engine
     with Session(engine) as session:
-        # Create a view that shows only the last vote on each vote ID.
+        # Create a view that shows only the last vote on each bill or nomination.
+        # `is_latest` is maintained by the ingest.
         session.execute(text("DROP VIEW IF EXISTS latest_vote_ids"))
         session.execute(
             text(
                 """
 CREATE VIEW latest_vote_ids as
-WITH
-  temp_vm AS (
-    SELECT
-      vm_1.vote_number,
-      vm_1.vote_id,
-      vm_1.bill_id,
-      vm_1.chamber,
-      vm_1.date,
-      vm_1.result,
-      vm_1.category,
-      vm_1.nomination_title,
-      vm_1.source_filename,
-      CASE
-        WHEN (vm_1.bill_id IS NULL) THEN (
-          SUBSTRING(
-            vm_1.nomination_title
-            FROM
-              1 FOR 10
-          )
-        )::character varying
-        ELSE vm_1.bill_id
-      END AS unique_matching_field
-    FROM
-      vote_meta vm_1
-  )
 SELECT
-  vm.vote_number,
-  vm.vote_id,
-  vm.bill_id,
-  vm.chamber,
-  vm.date,
-  vm.result,
-  vm.category,
-  vm.nomination_title,
-  vm.source_filename,
-  vm.unique_matching_field
+  vote_number,
+  vote_id,
+  bill_id,
+  chamber,
+  date,
+  result,
+  category,
+  nomination_title,
+  source_filename,
+  unique_matching_field
 FROM
-  (
-    temp_vm vm
-    JOIN (
-      SELECT
-        temp_vm.unique_matching_field,
-        max(temp_vm.date) AS latest_date
-      FROM
-        temp_vm
-      GROUP BY
-        temp_vm.unique_matching_field
-    ) latest_votes ON (
-      (
-        (
-          (vm.unique_matching_field)::text = (latest_votes.unique_matching_field)::text
+  vote_meta
+WHERE
+  is_latest;"""
+            )
         )
-        AND (vm.date = latest_votes.latest_date)
-      )
-    )
+
+        # Create a view that shows vote positions as text instead of codes.
+        session.execute(text("DROP VIEW IF EXISTS votes_text"))
+        session.execute(
+            text(
+                f"""
+CREATE VIEW votes_text AS
+SELECT
+  votes.vote_id,
+  votes.legislator_id,
+  CASE
+    WHEN (position.name = '{OTHER_POSITION}') THEN exceptions.original_position
+    ELSE position.name
+  END AS position,
+  CASE
+    WHEN (original.name = '{OTHER_POSITION}') THEN exceptions.original_position
+    ELSE original.name
+  END AS original_position
+FROM
+  votes
+  JOIN vote_positions position ON (position.code = votes.position)
+  JOIN vote_positions original ON (original.code = votes.original_position)
+  LEFT JOIN vote_position_exceptions exceptions ON (
+    (exceptions.vote_id)::text = (votes.vote_id)::text
+    AND (exceptions.legislator_id)::text = (votes.legislator_id)::text
   );"""
             )
         )
@@ -105,7 +94,7 @@ SELECT
     WHEN (
       (vote_meta.amendment_id IS NOT NULL)
       AND (amendments.sponsor_id IS NULL)
-    ) THEN congress.party
+    ) THEN vote_meta.majority_party
     WHEN (
       (vote_meta.category)::text = ANY (
         (
@@ -117,11 +106,11 @@ SELECT
           ]
         )::text[]
       )
-    ) THEN congress.party
+    ) THEN vote_meta.majority_party
     WHEN (
       ((vote_meta.category)::text = 'cloture'::text)
       AND (vote_meta.nomination_title IS NOT NULL)
-    ) THEN congress.party
+    ) THEN vote_meta.majority_party
     ELSE b_sponsor.party
   END AS sponsor_party
 FROM
@@ -129,38 +118,20 @@ FROM
     (
       (
         (
-          (
-            vote_meta
-            LEFT JOIN bills USING (bill_id)
-          )
-          LEFT JOIN amendments USING (amendment_id)
-        )
-        LEFT JOIN legislators a_sponsor ON (
-          (
-            (amendments.sponsor_id)::text = (a_sponsor.bioguide_id)::text
-          )
+          vote_meta
+          LEFT JOIN bills USING (bill_id)
         )
+        LEFT JOIN amendments USING (amendment_id)
       )
-      LEFT JOIN legislators b_sponsor ON (
+      LEFT JOIN legislators a_sponsor ON (
         (
-          (bills.sponsor_id)::text = (b_sponsor.bioguide_id)::text
+          (amendments.sponsor_id)::text = (a_sponsor.bioguide_id)::text
         )
       )
     )
-    LEFT JOIN congress ON (
+    LEFT JOIN legislators b_sponsor ON (
       (
-        (
-          (vote_meta.chamber)::text = (congress.chamber)::text
-        )
-        AND (
-          (vote_meta.date >= congress.start_date)
-          AND (
-            vote_meta.date <= COALESCE(
-              congress.end_date,
-              '9999-12-31 00:00:00'::timestamp without time zone
-            )
-          )
-        )
+        (bills.sponsor_id)::text = (b_sponsor.bioguide_id)::text
       )
     )
   )
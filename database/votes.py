@@ -1,25 +1,37 @@
 """Maintain and load data for `vote_meta` and `votes` tables."""
 
-import os
 import re
-import json
-from pathlib import Path
+import uuid
+import zlib
+import hashlib
+from functools import cached_property
+from array import array
 from concurrent.futures import ThreadPoolExecutor
 from dateutil import parser
-from database.base import Base, BaseOrm, load_json
-from database.amendments import AmendmentOrm
-from sqlalchemy.exc import IntegrityError
+from database.base import Base, BaseOrm, copy_rows, only_if_changed
+from database.amendments import Amendment, AmendmentOrm
+from database.congress import CongressOrm
+from database.changes import active_feed
+from database.legislators import LegislatorKeyMap, ensure_key_column
+from database.rollups import create_rollup_tables, refresh_rollups
+from database.sources import source_filename
 from sqlalchemy.orm import Session, relationship
 from sqlalchemy.sql import functions
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import (
+    Boolean,
     Column,
+    Index,
     Integer,
+    SmallInteger,
     String,
     DateTime,
     ForeignKey,
+    ForeignKeyConstraint,
     inspect,
+    or_,
     select,
+    text,
 )
 
 
@@ -38,28 +50,81 @@ class VoteMeta(Base):
     nomination_title = Column(String)
     amendment_id = Column(String, ForeignKey("amendments.amendment_id"), nullable=True)
     source_filename = Column(String, nullable=False)
+    # The congress session the vote took place in, and who held the chamber.
+    congress = Column(String)
+    session = Column(Integer)
+    majority_party = Column(String)
+    # The bill, or the start of the nomination title, votes are grouped by.
+    unique_matching_field = Column(String)
+    # Whether this is the latest vote on its bill or nomination. Depends on
+    # other rows, so it's one of the change feed's DERIVED_COLUMNS.
+    is_latest = Column(Boolean, nullable=False, server_default="false")
+
+    __table_args__ = (
+        Index(
+            "ix_vote_meta_latest",
+            "unique_matching_field",
+            postgresql_where=text("is_latest"),
+        ),
+    )
 
     # Relationships
     amendment = relationship("Amendment")
 
 
+class VotePosition(Base):
+    """Lookup table for the response codes stored in `votes`."""
+
+    __tablename__ = "vote_positions"
+
+    code = Column(SmallInteger, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False, unique=True)
+
+
 class Vote(Base):
     """
     ORM class for individual votes.
+
+    Positions are stored as `vote_positions` codes; the `votes_text` view shows
+    them as text.
     """
 
     __tablename__ = "votes"
 
     vote_id = Column(String, ForeignKey("vote_meta.vote_id"), primary_key=True)
     legislator_id = Column(String, ForeignKey("legislators.id"), primary_key=True)
-    position = Column(String, nullable=False)
-    original_position = Column(String, nullable=False)
+    legislator_key = Column(Integer, index=True)
+    position = Column(SmallInteger, ForeignKey("vote_positions.code"), nullable=False)
+    original_position = Column(
+        SmallInteger, ForeignKey("vote_positions.code"), nullable=False
+    )
 
     # Relationships
     legislator = relationship("Legislator")
     vote_meta = relationship("VoteMeta")
 
 
+class VotePositionException(Base):
+    """
+    Original responses missing from `vote_positions`, eg. speaker-race names.
+
+    The vote itself is stored with the `OTHER_POSITION` code.
+    """
+
+    __tablename__ = "vote_position_exceptions"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["vote_id", "legislator_id"],
+            ["votes.vote_id", "votes.legislator_id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    vote_id = Column(String, primary_key=True)
+    legislator_id = Column(String, primary_key=True)
+    original_position = Column(String, nullable=False)
+
+
 # These are the canonical responses to be stored.
 KNOWN_RESPONSES = ["Nay", "Not Voting", "Present", "Yea"]
 
@@ -75,51 +140,554 @@ NORMALIZE_RESPONSES = {
     "Jeffries": "Nay",
 }
 
+# Responses we expect to see, in a fixed order so they can be stored as codes.
+RESPONSE_NAMES = KNOWN_RESPONSES + [
+    r for r in NORMALIZE_RESPONSES if r not in KNOWN_RESPONSES
+]
+
+# Lookup entry for responses that aren't in RESPONSE_NAMES. The actual text is
+# kept in `vote_position_exceptions`.
+OTHER_POSITION = "(other)"
+
+
+def unique_matching_field(bill_id, nomination_title):
+    """The bill id, or for nominations the first 10 characters of the title."""
+    if bill_id is not None:
+        return bill_id
+    return nomination_title[:10] if nomination_title is not None else None
+
+
+def latest_vote_ids(rows):
+    """
+    Pick the latest vote on each bill or nomination.
+
+    Args:
+        rows (Iterable[tuple[str, str | None, datetime]]): (vote_id,
+            unique_matching_field, date) for every vote to consider.
+
+    Returns:
+        set[str]: The latest vote ids. Votes tied for latest all count; votes
+            without a matching field never do.
+    """
+    latest = {}
+    for vote_id, field, date in rows:
+        if field is None:
+            continue
+        best = latest.get(field)
+        if best is None or date > best[0]:
+            latest[field] = (date, [vote_id])
+        elif date == best[0]:
+            best[1].append(vote_id)
+    return {vote_id for _, vote_ids in latest.values() for vote_id in vote_ids}
+
+
+class VotePositionBatch:
+    """
+    Column-oriented buffer of individual vote positions.
+
+    A roll call repeats the same vote_id, and a handful of responses, for every
+    legislator. Rather than keeping one dict per position, vote ids, legislator
+    ids and responses are each stored once and rows are small integer codes
+    packed into arrays. The normalized position is derived from the original
+    response when rows are read back out, so it isn't stored at all.
+    """
+
+    __slots__ = (
+        "vote_ids",
+        "legislator_ids",
+        "responses",
+        "vote_codes",
+        "legislator_codes",
+        "response_codes",
+        "_vote_lookup",
+        "_legislator_lookup",
+        "_response_lookup",
+    )
+
+    def __init__(self):
+        self.vote_ids = []
+        self.legislator_ids = []
+        self.responses = list(RESPONSE_NAMES)
+        self.vote_codes = array("I")
+        self.legislator_codes = array("I")
+        self.response_codes = array("H")
+        self._vote_lookup = {}
+        self._legislator_lookup = {}
+        self._response_lookup = {r: i for i, r in enumerate(self.responses)}
+
+    def __len__(self):
+        return len(self.vote_codes)
+
+    @staticmethod
+    def _encode(values: list, lookup: dict, value):
+        """Return the code for a value, adding it to the dictionary if needed."""
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(values)
+            values.append(value)
+        return code
+
+    def _empty_like(self):
+        """An empty batch sharing this batch's dictionaries."""
+        batch = VotePositionBatch()
+        batch.vote_ids = self.vote_ids
+        batch._vote_lookup = self._vote_lookup
+        batch.legislator_ids = self.legislator_ids
+        batch._legislator_lookup = self._legislator_lookup
+        batch.responses = self.responses
+        batch._response_lookup = self._response_lookup
+        return batch
+
+    def append(self, vote_id: str, legislator_id: str, response: str):
+        """Add one legislator's response to a vote."""
+        self.vote_codes.append(self._encode(self.vote_ids, self._vote_lookup, vote_id))
+        self.legislator_codes.append(
+            self._encode(self.legislator_ids, self._legislator_lookup, legislator_id)
+        )
+        self.response_codes.append(
+            self._encode(self.responses, self._response_lookup, response)
+        )
+
+    def extend(self, other: "VotePositionBatch"):
+        """Append every row of another batch, re-coding it against this one."""
+
+        def remap(values, lookup, other_values):
+            return [self._encode(values, lookup, v) for v in other_values]
+
+        vote_map = remap(self.vote_ids, self._vote_lookup, other.vote_ids)
+        legislator_map = remap(
+            self.legislator_ids, self._legislator_lookup, other.legislator_ids
+        )
+        response_map = remap(self.responses, self._response_lookup, other.responses)
+
+        self.vote_codes.extend(vote_map[c] for c in other.vote_codes)
+        self.legislator_codes.extend(legislator_map[c] for c in other.legislator_codes)
+        self.response_codes.extend(response_map[c] for c in other.response_codes)
+
+    def rows(self, start: int = 0, stop: int | None = None):
+        """Yield rows as dicts for the votes table, one at a time."""
+        for i in range(start, len(self) if stop is None else min(stop, len(self))):
+            response = self.responses[self.response_codes[i]]
+            yield {
+                "vote_id": self.vote_ids[self.vote_codes[i]],
+                "legislator_id": self.legislator_ids[self.legislator_codes[i]],
+                "position": NORMALIZE_RESPONSES.get(response, response),
+                # Store the original response for reference
+                "original_position": response,
+            }
+
+    def chunks(self, size: int):
+        """Yield lists of at most `size` row dicts."""
+        for start in range(0, len(self), size):
+            yield list(self.rows(start, start + size))
+
+    def deduplicated(self):
+        """
+        Keep only the last row for each vote and legislator.
+
+        Returns:
+            VotePositionBatch: This batch if it has no duplicates, otherwise a
+                new one keeping the surviving rows in their original order.
+        """
+        last = {}
+        for i, key in enumerate(zip(self.vote_codes, self.legislator_codes)):
+            last[key] = i
+        if len(last) == len(self):
+            return self
+
+        batch = self._empty_like()
+        for i in sorted(last.values()):
+            batch.vote_codes.append(self.vote_codes[i])
+            batch.legislator_codes.append(self.legislator_codes[i])
+            batch.response_codes.append(self.response_codes[i])
+        return batch
+
+    def partition(self, count: int):
+        """
+        Split the rows into `count` batches by a hash of their vote_id.
+
+        Returns:
+            list[VotePositionBatch]: The partitions, some possibly empty.
+        """
+        vote_buckets = [zlib.crc32(v.encode()) % count for v in self.vote_ids]
+        buckets = [self._empty_like() for _ in range(count)]
+        for i, vote_code in enumerate(self.vote_codes):
+            bucket = buckets[vote_buckets[vote_code]]
+            bucket.vote_codes.append(vote_code)
+            bucket.legislator_codes.append(self.legislator_codes[i])
+            bucket.response_codes.append(self.response_codes[i])
+        return buckets
+
 
 class VoteOrm(BaseOrm):
     """Class for interacting with the ORM and reusing a single engine definition."""
 
-    def __init__(self, data_dir="./"):
-        super().__init__(data_dir)
-        self.amendment_orm = AmendmentOrm(data_dir)
+    def __init__(self, data_dir="./", congress_nums=None, schema=None, atomic=False):
+        super().__init__(data_dir, congress_nums, schema, atomic)
+        self.amendment_orm = AmendmentOrm(data_dir, congress_nums, schema, atomic)
+        self._position_codes = None
+        self._sessions = None
+        self._cache_namespace = None
+
+    @cached_property
+    def legislator_keys(self):
+        """Look up legislator keys, through the database once it's first needed."""
+        return LegislatorKeyMap(self.engine)
 
     def drop_all_tables(self):
         """Override to restrict dropping tables."""
         raise NotImplementedError("This operation is not allowed in subclasses.")
 
     def create_table(self):
-        """Create the vote_meta and votes tables in the database."""
+        """Create the vote_meta, votes and position tables in the database."""
+        if self.schema:
+            self.create_staging_table(VoteMeta.__table__)
+            self.create_staging_table(Vote.__table__)
+            self.create_staging_table(VotePositionException.__table__)
+            return
+
+        if not inspect(self.engine).has_table(VotePosition.__tablename__):
+            VotePosition.__table__.create(self.engine)
+        self.seed_positions()
+
         if not inspect(self.engine).has_table(VoteMeta.__tablename__):
             VoteMeta.__table__.create(self.engine)
 
         if not inspect(self.engine).has_table(Vote.__tablename__):
             Vote.__table__.create(self.engine)
 
+        if not inspect(self.engine).has_table(VotePositionException.__tablename__):
+            VotePositionException.__table__.create(self.engine)
+
+        self.migrate_text_positions()
+        self.migrate_session_columns()
+        self.migrate_latest_columns()
+        ensure_key_column(
+            self.engine, Vote.__table__, "legislator_key", "legislator_id"
+        )
+        self.migrate_rollup_tables()
+
     def drop_table(self):
-        """Drop the vote_meta and votes tables from the database."""
-        if inspect(self.engine).has_table(Vote.__tablename__):
-            Vote.__table__.drop(self.engine)
+        """Drop the vote_meta, votes and position tables from the database."""
+        for table in (
+            VotePositionException.__table__,
+            Vote.__table__,
+            VoteMeta.__table__,
+            VotePosition.__table__,
+        ):
+            if inspect(self.engine).has_table(table.name):
+                table.drop(self.engine)
+
+    def seed_positions(self):
+        """
+        Add any known responses missing from the `vote_positions` lookup table.
+
+        Existing codes are never changed, since they're stored in `votes`; new
+        responses get the next free code.
+        """
+        with self.engine.begin() as conn:
+            existing = dict(
+                conn.execute(
+                    text(f"SELECT name, code FROM {VotePosition.__tablename__}")
+                ).all()
+            )
+            next_code = max(existing.values(), default=-1) + 1
+            for name in RESPONSE_NAMES + [OTHER_POSITION]:
+                if name not in existing:
+                    conn.execute(
+                        insert(VotePosition).values(code=next_code, name=name)
+                    )
+                    next_code += 1
+        self._position_codes = None
+
+    def position_codes(self):
+        """Map response names to their `vote_positions` codes."""
+        if self._position_codes is None:
+            with self.engine.connect() as conn:
+                self._position_codes = dict(
+                    conn.execute(
+                        text(
+                            "SELECT name, code "
+                            f"FROM public.{VotePosition.__tablename__}"
+                        )
+                    ).all()
+                )
+        return self._position_codes
+
+    def migrate_text_positions(self):
+        """Convert a `votes` table created with text positions to codes."""
+        columns = {
+            col["name"]: col["type"]
+            for col in inspect(self.engine).get_columns(Vote.__tablename__)
+        }
+        if not isinstance(columns["position"], String):
+            return
+
+        codes = self.position_codes()
+        known = [name for name in codes if name != OTHER_POSITION]
+        params = {f"name_{i}": name for i, name in enumerate(known)}
+        cases = " ".join(
+            f"WHEN :name_{i} THEN {codes[name]}" for i, name in enumerate(known)
+        )
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"""
+INSERT INTO {VotePositionException.__tablename__}
+  (vote_id, legislator_id, original_position)
+SELECT vote_id, legislator_id, original_position
+FROM {Vote.__tablename__}
+WHERE original_position <> ALL(:known)
+ON CONFLICT DO NOTHING"""
+                ),
+                {"known": known},
+            )
+            for column in ("position", "original_position"):
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {Vote.__tablename__} ALTER COLUMN {column} "
+                        f"TYPE smallint USING CASE {column} {cases} "
+                        f"ELSE {codes[OTHER_POSITION]} END"
+                    ),
+                    params,
+                )
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {Vote.__tablename__} ADD FOREIGN KEY ({column}) "
+                        f"REFERENCES {VotePosition.__tablename__} (code)"
+                    )
+                )
+
+    def migrate_session_columns(self):
+        """
+        Add the session columns to a `vote_meta` table created before them.
+
+        Existing rows are filled in from the congress table, if it's loaded.
+        """
+        columns = [
+            col["name"]
+            for col in inspect(self.engine).get_columns(VoteMeta.__tablename__)
+        ]
+        if "majority_party" in columns:
+            return
+
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {VoteMeta.__tablename__} "
+                    "ADD COLUMN IF NOT EXISTS congress varchar, "
+                    "ADD COLUMN IF NOT EXISTS session integer, "
+                    "ADD COLUMN IF NOT EXISTS majority_party varchar"
+                )
+            )
+            if inspect(conn).has_table("congress"):
+                conn.execute(
+                    text(
+                        f"""
+UPDATE {VoteMeta.__tablename__} AS vm
+SET congress = c.congress, session = c.session, majority_party = c.party
+FROM congress c
+WHERE c.chamber = vm.chamber
+  AND vm.date >= c.start_date
+  AND vm.date <= COALESCE(c.end_date, 'infinity'::timestamp)"""
+                    )
+                )
+
+    def migrate_latest_columns(self):
+        """Add `unique_matching_field` and `is_latest` to an older `vote_meta`."""
+        columns = [
+            col["name"]
+            for col in inspect(self.engine).get_columns(VoteMeta.__tablename__)
+        ]
+        if "is_latest" in columns:
+            return
+
+        with Session(self.engine) as session:
+            session.execute(
+                text(
+                    f"""
+ALTER TABLE {VoteMeta.__tablename__}
+  ADD COLUMN IF NOT EXISTS unique_matching_field varchar,
+  ADD COLUMN IF NOT EXISTS is_latest boolean NOT NULL DEFAULT false"""
+                )
+            )
+            session.execute(
+                text(
+                    f"""
+UPDATE {VoteMeta.__tablename__}
+SET unique_matching_field =
+  COALESCE(bill_id, SUBSTRING(nomination_title FROM 1 FOR 10))"""
+                )
+            )
+            session.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_vote_meta_latest "
+                    f"ON {VoteMeta.__tablename__} (unique_matching_field) "
+                    "WHERE is_latest"
+                )
+            )
+            self.refresh_latest(session)
+            session.commit()
+
+    def refresh_latest(self, session, fields=None):
+        """
+        Recompute `is_latest` for some bills and nominations.
+
+        Args:
+            session (Session | Connection): Where to run the queries.
+            fields (list[str] | None): The `unique_matching_field` values to
+                refresh, or None for all of them.
+        """
+        table = self.qualified_name(VoteMeta.__table__)
+        where = "" if fields is None else "WHERE unique_matching_field = ANY(:fields)"
+        params = {"fields": fields}
+        rows = session.execute(
+            text(f"SELECT vote_id, unique_matching_field, date FROM {table} {where}"),
+            params,
+        ).all()
+        params["latest"] = sorted(latest_vote_ids(rows))
+        session.execute(
+            text(
+                f"""
+UPDATE {table} SET is_latest = (vote_id = ANY(:latest))
+{where + " AND" if where else "WHERE"}
+  is_latest IS DISTINCT FROM (vote_id = ANY(:latest))"""
+            ),
+            params,
+        )
+
+    def migrate_rollup_tables(self):
+        """Create the rollup tables, filling them in from any votes already loaded."""
+        if create_rollup_tables(self.engine):
+            with Session(self.engine) as session:
+                refresh_rollups(session)
+                session.commit()
+
+    def vote_dates(self, session, vote_ids=None):
+        """
+        Look up the stored dates of some votes, to find the rollup periods to refresh.
+
+        Args:
+            session (Session | Connection): Where to run the query.
+            vote_ids (list[str] | None): The votes, or None for every vote in this
+                load's congresses.
+
+        Returns:
+            list[datetime] | None: The dates, or None if this load covers every
+                congress.
+        """
+        statement = select(VoteMeta.date)
+        if vote_ids is not None:
+            statement = statement.where(VoteMeta.vote_id.in_(vote_ids))
+        elif self.congress_nums is not None:
+            statement = statement.where(
+                or_(
+                    *[
+                        VoteMeta.vote_id.like(f"%-{congress_num}.%")
+                        for congress_num in self.congress_nums
+                    ]
+                )
+            )
+        else:
+            return None
+        return list(session.execute(statement).scalars())
+
+    def session_lookup(self):
+        """The congress session lookup, built on first use."""
+        if self._sessions is None:
+            self._sessions = CongressOrm(self.data_dir).session_lookup()
+        return self._sessions
+
+    def cache_namespace(self):
+        """Votes are stamped with sessions from congress.json, so it's in the key."""
+        if self._cache_namespace is None:
+            congress = (
+                self.source.read_bytes("congress.json")
+                if self.source.exists("congress.json")
+                else b""
+            )
+            digest = hashlib.blake2b(congress, digest_size=8).hexdigest()
+            self._cache_namespace = f"{super().cache_namespace()}/{digest}"
+        return self._cache_namespace
+
+    def cacheable(self, data):
+        """
+        Determine if a vote's rows depend on nothing but its own data file.
+
+        Votes on amendments don't: whether they get a placeholder depends on the
+        amendment's data file, and "h-bill" amendments are looked up in the
+        bill's data file.
+        """
+        return not data.get("amendment")
+
+    def encode_votes(self, records, exceptions: list):
+        """
+        Swap the text positions of vote rows for their lookup codes, and add
+        legislator keys.
+
+        Args:
+            records (Iterable[dict]): Vote rows with text positions.
+            exceptions (list): Rows for `vote_position_exceptions` are appended
+                here for every original position missing from the lookup table.
+
+        Yields:
+            dict: Vote rows with coded positions.
+        """
+        codes = self.position_codes()
+        other = codes[OTHER_POSITION]
+        for record in records:
+            original = codes.get(record["original_position"], other)
+            if original == other:
+                exceptions.append(
+                    {
+                        "vote_id": record["vote_id"],
+                        "legislator_id": record["legislator_id"],
+                        "original_position": record["original_position"],
+                    }
+                )
+            yield {
+                "vote_id": record["vote_id"],
+                "legislator_id": record["legislator_id"],
+                "legislator_key": self.legislator_keys.get(record["legislator_id"]),
+                "position": codes.get(record["position"], other),
+                "original_position": original,
+            }
+
+    @staticmethod
+    def position_exceptions_upsert(records: list):
+        """Build an upsert for responses missing from the lookup table."""
+        stmt = insert(VotePositionException).values(records)
+        return stmt.on_conflict_do_update(
+            index_elements=["vote_id", "legislator_id"],
+            set_={"original_position": stmt.excluded.original_position},
+            where=only_if_changed(stmt, ["original_position"]),
+        )
 
-        if inspect(self.engine).has_table(VoteMeta.__tablename__):
-            VoteMeta.__table__.drop(self.engine)
+    def upsert_position_exceptions(self, session: Session, records: list):
+        """Upsert the original text of responses missing from the lookup table."""
+        stmt = self.position_exceptions_upsert(records)
+        self.execute_upsert(session, stmt, "position exceptions")
 
     def upsert_vote_batch(self, session: Session, records: list):
-        """Upsert a record into the database."""
-        stmt = insert(Vote).values(records)
+        """Upsert a batch of vote rows with text positions into the database."""
+        exceptions = []
+        stmt = insert(Vote).values(list(self.encode_votes(records, exceptions)))
 
         stmt = stmt.on_conflict_do_update(
             index_elements=["vote_id", "legislator_id"],
             set_={
+                "legislator_key": stmt.excluded.legislator_key,
                 "position": stmt.excluded.position,
                 "original_position": stmt.excluded.original_position,
             },
+            where=only_if_changed(
+                stmt, ["legislator_key", "position", "original_position"]
+            ),
         )
 
-        try:
-            session.execute(stmt)
-        except IntegrityError as e:
-            print(f"Failed to upsert batch: {e}")
-            session.rollback()
+        self.execute_upsert(session, stmt, "batch")
+        if exceptions:
+            self.upsert_position_exceptions(session, exceptions)
 
     def upsert_vote_meta(self, session: Session, record_dict: dict):
         """Upsert a record into the database."""
@@ -128,13 +696,13 @@ class VoteOrm(BaseOrm):
             col: stmt.excluded[col] for col in record_dict if col != "vote_id"
         }
 
-        stmt = stmt.on_conflict_do_update(index_elements=["vote_id"], set_=update_dict)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["vote_id"],
+            set_=update_dict,
+            where=only_if_changed(stmt, update_dict),
+        )
 
-        try:
-            session.execute(stmt)
-        except IntegrityError as e:
-            print(f"Failed to upsert {record_dict.get('vote_id')}: {e}")
-            session.rollback()
+        self.execute_upsert(session, stmt, record_dict.get("vote_id"))
 
     def _amendment_datafile_exists(self, amendment_id: str):
         """Determine if an amendment id has a corresponding data file."""
@@ -144,181 +712,335 @@ class VoteOrm(BaseOrm):
             return False
 
         type_extended, type_basic, congress_num = match.group(1, 2, 3)
-        return os.path.exists(
-            os.path.join(
-                self.data_dir,
-                congress_num,
-                "amendments",
-                type_basic,
-                type_extended,
-                "data.json",
-            )
+        return self.source.exists(
+            f"{congress_num}/amendments/{type_basic}/{type_extended}/data.json"
         )
 
-    def populate(self):
+    def datafiles(self):
+        """List the vote data files for every congress in this load."""
+        return [
+            path
+            for path in self.source.glob("*/votes/*/*/data.json")
+            if path.split("/")[0].isdigit()
+            and self.includes_congress(path.split("/")[0])
+        ]
+
+    def transform(self, path, data=None):
         """
-        Ingest votes and metadata.
+        Turn a vote data file into rows for the vote_meta and votes tables.
 
-        Because votes and vote metadata are so tightly coupled, always drop and reload
-        them at the same time.
+        Any placeholder amendments the vote needs are returned under the
+        amendments table so they can be written first.
+        """
+        if data is None:
+            data = self.source.load_json(path)
+        placeholders = []
+
+        # Get vote metadata first
+        bill_info = data.get("bill")
+        if bill_info:
+            b_type = bill_info.get("type")
+            b_number = bill_info.get("number")
+            b_congress = bill_info.get("congress")
+            bill_id = f"{b_type}{b_number}-{b_congress}"
+        else:
+            bill_id = None
+        chamber = data.get("chamber")
+        is_nomination = "nomination" in data
+        nomination_title = (
+            None if not is_nomination else data.get("nomination").get("title")
+        )
+        amendment = data.get("amendment")
+        amendment_id = None  # and we'll override it if we can.
+
+        if amendment:
+            amendment_number = amendment.get("number")
+            amendment_type = amendment.get("type")
+            congress = str(data.get("congress"))
+            # Senate amendments are straightforward.
+            # House ones not so much. When the type = "h-bill":
+            #   - the number is the amendment number _to that
+            #     bill_, not the amendment id number
+            #   - you have to go back to the bill itself, to the
+            #     "amendments" key, reverse the array so the first
+            #     amendment is index 0, then find the nth
+            #     amendment, then get the amendment_id from there
+
+            if amendment_type in ("s", "h"):
+                amendment_id = f"{amendment_type}amdt{amendment_number}-{congress}"
+            elif amendment_type == "h-bill":
+                obd = data.get("bill")
+                obd_type = obd.get("type")
+                bill_number = f"{obd_type}{obd.get("number")}"  # eg. hr1048
+                bill_pathspec = f"{congress}/bills/{obd_type}/{bill_number}/data.json"
+
+                if self.source.exists(bill_pathspec):
+                    bill_data = self.source.load_json(bill_pathspec)
+                    bill_amendments = bill_data.get("amendments", [])
+                    if bill_amendments:
+                        amendment_id = bill_amendments[-1 * int(amendment_number)].get(
+                            "amendment_id"
+                        )
+
+            # If we've gotten to this point and still don't have an
+            # # amendment_id, just skip the amendment altogether.
+            if amendment_id is not None and not self._amendment_datafile_exists(
+                amendment_id
+            ):
+                # P000000 is a placeholder in the legislator table.
+                print(f"Creating placeholder amendment for {amendment_id}...")
+                placeholders.append(
+                    AmendmentOrm.placeholder(
+                        amendment_id=amendment_id,
+                        bill_id=bill_id,
+                        sponsor_id="P000000",
+                        congress=congress,
+                    )
+                )
+
+        vote_date = parser.parse(data.get("date"))
+        congress_session = self.session_lookup().find(chamber, vote_date) or {}
+        vote_meta_entry = {
+            "vote_number": data.get("number"),
+            "vote_id": data.get("vote_id"),
+            "bill_id": bill_id,
+            "chamber": chamber,
+            "date": vote_date,
+            "result": data.get("result_text"),
+            "category": data.get("category").strip(),
+            "nomination_title": nomination_title,
+            "amendment_id": amendment_id,
+            "source_filename": source_filename(path),
+            "congress": congress_session.get("congress"),
+            "session": congress_session.get("session"),
+            "majority_party": congress_session.get("party"),
+            "unique_matching_field": unique_matching_field(bill_id, nomination_title),
+        }
+
+        # Load specific votes next
+        vote_entries = VotePositionBatch()
+        votes_data = data.get("votes")
+        for response, people in votes_data.items():
+            vote_id = data.get("vote_id")
+
+            for person in people:
+                if isinstance(person, dict):
+                    # Determine if the ID present is a lid or a bid
+                    legislator_lid = person.get("id") if chamber == "s" else None
+                    legislator_bid = person.get("id") if chamber == "h" else None
+                    legislator_id = legislator_lid if chamber == "s" else legislator_bid
+                    vote_entries.append(vote_id, legislator_id, response)
+
+        return {
+            Amendment.__tablename__: placeholders,
+            VoteMeta.__tablename__: [vote_meta_entry],
+            Vote.__tablename__: vote_entries,
+        }
+
+    def write_rows(self, session: Session, rows: dict):
         """
+        Write placeholder amendments, vote metadata and votes, in that order.
+
+        Afterwards `is_latest` is refreshed for the bills and nominations the
+        vote metadata belongs to, and the rollups for the days and weeks the votes
+        fall in (before and after the write, in case a date changed).
+        """
+        vote_ids = [entry["vote_id"] for entry in rows.get(VoteMeta.__tablename__, [])]
+        dates = self.vote_dates(session, vote_ids) if vote_ids else []
+
+        self._write_rows(session, rows)
+
+        fields = {
+            entry["unique_matching_field"]
+            for entry in rows.get(VoteMeta.__tablename__, [])
+            if entry["unique_matching_field"] is not None
+        }
+        if fields:
+            self.refresh_latest(session, sorted(fields))
+
+        if vote_ids and not self.schema:
+            refresh_rollups(session, dates + self.vote_dates(session, vote_ids))
+
+    def _write_rows(self, session: Session, rows: dict):
+        """Write rows without refreshing `is_latest`."""
+        placeholders = {
+            p["amendment_id"]: p for p in rows.get(Amendment.__tablename__, [])
+        }
+        for amendment_id in sorted(placeholders):
+            self.amendment_orm.upsert(session, placeholders[amendment_id])
+            session.flush()
+
+        for vote_meta_entry in rows.get(VoteMeta.__tablename__, []):
+            self.upsert_vote_meta(session, vote_meta_entry)
+
+        vote_entries = rows.get(Vote.__tablename__) or VotePositionBatch()
+        for batch in vote_entries.chunks(1000):
+            self.upsert_vote_batch(session, batch)
 
-        vote_files = [
-            str(path)
-            for path in Path(self.data_dir).glob("*/votes/*/*/data.json")
-            if path.is_file() and path.parts[-5].isdigit()
+    def write_batch(self, session: Session, rows: dict):
+        """
+        Write one pipelined batch.
+
+        Placeholders are committed on their own, in a stable order, so that
+        concurrent writers never hold each other's placeholder rows for long.
+        `is_latest` is refreshed once all batches are in, since concurrent
+        writers can't see each other's rows.
+        """
+        placeholders = rows.get(Amendment.__tablename__)
+        if placeholders:
+            self._write_rows(session, {Amendment.__tablename__: placeholders})
+            session.commit()
+
+        self._write_rows(
+            session,
+            {table: r for table, r in rows.items() if table != Amendment.__tablename__},
+        )
+
+    def write_votes_parallel(self, vote_entries: VotePositionBatch, partitions: int):
+        """
+        Write votes over several connections at once, all or nothing.
+
+        Rows are split by a hash of their vote_id and each partition is copied
+        into an unlogged staging table on its own connection. Only once every
+        partition has landed are they merged into `votes` in one transaction, so
+        a failed partition leaves `votes` untouched.
+
+        Partitions go by vote_id, so rows repeating a vote and legislator share
+        a partition; each partition keeps only the last of them, which is the
+        row both `votes` and `vote_position_exceptions` get.
+        """
+        columns = [
+            "vote_id",
+            "legislator_id",
+            "legislator_key",
+            "position",
+            "original_position",
+        ]
+        buckets = [
+            bucket.deduplicated() for bucket in vote_entries.partition(partitions)
         ]
+        exceptions = [[] for _ in buckets]
 
-        with ThreadPoolExecutor() as executor:
-            vote_data = [
-                {"vote_file": str(path), "data": data}
-                for path, data in zip(vote_files, executor.map(load_json, vote_files))
-            ]
+        target = self.qualified_name(Vote.__table__)
+        # Unique per load, so concurrent loads don't drop each other's table.
+        staging = f"{target}_staging_{uuid.uuid4().hex[:12]}"
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+            conn.execute(
+                text(
+                    f"CREATE UNLOGGED TABLE {staging} "
+                    f"(LIKE {target} INCLUDING DEFAULTS)"
+                )
+            )
 
-        with Session(self.engine) as session:
-            # Rather than do the ORM bit piece by piece, store them and batch
-            # upsert them all at once.
-            vote_meta_entries = []
-            vote_entries = []
-
-            for entry in vote_data:
-                vote_file: str = entry["vote_file"]
-                data: dict = entry["data"]
-
-                # Get vote metadata first
-                bill_info = data.get("bill")
-                if bill_info:
-                    b_type = bill_info.get("type")
-                    b_number = bill_info.get("number")
-                    b_congress = bill_info.get("congress")
-                    bill_id = f"{b_type}{b_number}-{b_congress}"
-                else:
-                    bill_id = None
-                chamber = data.get("chamber")
-                is_nomination = "nomination" in data
-                nomination_title = (
-                    None if not is_nomination else data.get("nomination").get("title")
+        try:
+            with ThreadPoolExecutor(max_workers=partitions) as executor:
+                futures = [
+                    executor.submit(
+                        copy_rows,
+                        self.engine,
+                        staging,
+                        columns,
+                        self.encode_votes(bucket.rows(), bucket_exceptions),
+                    )
+                    for bucket, bucket_exceptions in zip(buckets, exceptions)
+                    if bucket
+                ]
+                for future in futures:
+                    future.result()
+
+            column_list = ", ".join(columns)
+            feed = active_feed()
+            returning = (
+                feed.returning_sql(Vote.__table__) if feed and not self.schema else ""
+            )
+            with Session(self.engine) as session:
+                result = session.execute(
+                    text(
+                        f"""
+INSERT INTO {target} ({column_list})
+SELECT {column_list}
+FROM {staging}
+ON CONFLICT (vote_id, legislator_id) DO UPDATE SET
+  legislator_key = EXCLUDED.legislator_key,
+  position = EXCLUDED.position,
+  original_position = EXCLUDED.original_position
+WHERE ({target}.legislator_key, {target}.position, {target}.original_position)
+  IS DISTINCT FROM
+  (EXCLUDED.legislator_key, EXCLUDED.position, EXCLUDED.original_position)"""
+                        + returning
+                    )
                 )
-                amendment = data.get("amendment")
-                amendment_id = None  # and we'll override it if we can.
-
-                if amendment:
-                    amendment_number = amendment.get("number")
-                    amendment_type = amendment.get("type")
-                    congress = str(data.get("congress"))
-                    # Senate amendments are straightforward.
-                    # House ones not so much. When the type = "h-bill":
-                    #   - the number is the amendment number _to that
-                    #     bill_, not the amendment id number
-                    #   - you have to go back to the bill itself, to the
-                    #     "amendments" key, reverse the array so the first
-                    #     amendment is index 0, then find the nth
-                    #     amendment, then get the amendment_id from there
-
-                    if amendment_type in ("s", "h"):
-                        amendment_id = (
-                            f"{amendment_type}amdt{amendment_number}-{congress}"
-                        )
-                    elif amendment_type == "h-bill":
-                        obd = data.get("bill")
-                        obd_type = obd.get("type")
-                        bill_number = f"{obd_type}{obd.get("number")}"  # eg. hr1048
-                        bill_pathspec = os.path.join(
-                            self.data_dir,
-                            str(congress),
-                            "bills",
-                            obd_type,
-                            str(bill_number),
-                            "data.json",
-                        )
+                if returning:
+                    feed.record_on_commit(session, Vote.__table__, result.all())
 
-                        if os.path.exists(bill_pathspec):
-                            with open(bill_pathspec, "r", encoding="utf-8") as bill_f:
-                                bill_data = json.loads(bill_f.read())
-                            bill_amendments = bill_data.get("amendments", [])
-                            if bill_amendments:
-                                amendment_id = bill_amendments[
-                                    -1 * int(amendment_number)
-                                ].get("amendment_id")
-
-                    # If we've gotten to this point and still don't have an
-                    # # amendment_id, just skip the amendment altogether.
-                    if (
-                        amendment_id is not None
-                        and not self._amendment_datafile_exists(amendment_id)
-                    ):
-                        # P000000 is a placeholder in the legislator table.
-                        print(f"Creating placeholder amendment for {amendment_id}...")
-                        self.amendment_orm.create_placeholder(
-                            amendment_id=amendment_id,
-                            bill_id=bill_id,
-                            sponsor_id="P000000",
-                            congress=congress,
-                            session=session,
+                # Not through `execute_upsert`: a failure has to undo the votes.
+                exception_rows = [row for rows in exceptions for row in rows]
+                batch_size = 1000
+                for i in range(0, len(exception_rows), batch_size):
+                    session.execute(
+                        self.position_exceptions_upsert(
+                            exception_rows[i : i + batch_size]
                         )
+                    )
+                session.commit()
+        finally:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
 
-                vote_meta_entry = {
-                    "vote_number": data.get("number"),
-                    "vote_id": data.get("vote_id"),
-                    "bill_id": bill_id,
-                    "chamber": chamber,
-                    "date": parser.parse(data.get("date")),
-                    "result": data.get("result_text"),
-                    "category": data.get("category").strip(),
-                    "nomination_title": nomination_title,
-                    "amendment_id": amendment_id,
-                    "source_filename": vote_file,
-                }
-                vote_meta_entries.append(vote_meta_entry)
-                # Add to session
-                # self.upsert_vote_meta(session, vote_meta)
-                # session.flush()
-
-                # Load specific votes next
-                votes_data = data.get("votes")
-                for response, people in votes_data.items():
-                    vote_id = data.get("vote_id")
-
-                    for person in people:
-                        if isinstance(person, dict):
-                            # Determine if the ID present is a lid or a bid
-                            legislator_lid = (
-                                person.get("id") if chamber == "s" else None
-                            )
-                            legislator_bid = (
-                                person.get("id") if chamber == "h" else None
-                            )
-                            legislator_id = (
-                                legislator_lid if chamber == "s" else legislator_bid
-                            )
-                            normalized_response = NORMALIZE_RESPONSES.get(
-                                response, response
-                            )
-
-                            vote = {
-                                "vote_id": vote_id,
-                                "legislator_id": legislator_id,
-                                "position": normalized_response,
-                                # Store the original response for reference
-                                "original_position": response,
-                            }
-
-                            vote_entries.append(vote)
-                            # Add to sesssion
-                            # self.upsert_vote(session, vote)
-                            # session.flush()
+    def populate(self, writers: int = 0, vote_partitions: int = 0):
+        """
+        Ingest votes and metadata.
 
+        Because votes and vote metadata are so tightly coupled, always drop and reload
+        them at the same time.
+
+        Args:
+            writers (int): When non-zero, overlap parsing and writing using this
+                many writer connections.
+            vote_partitions (int): When non-zero (and not pipelining), split the
+                votes across this many connections written in parallel.
+
+        Afterwards `is_latest` and the daily and weekly rollups are refreshed.
+        """
+
+        if writers:
+            self.populate_pipelined(writers)
+        else:
+            self.populate_batched(vote_partitions)
+
+        with Session(self.engine) as session:
+            self.refresh_latest(session)
+            if not self.schema:
+                # Everything when loading every congress, otherwise just the
+                # days and weeks this load's votes fall in.
+                refresh_rollups(session, self.vote_dates(session))
+            session.commit()
+
+    def populate_batched(self, vote_partitions: int = 0):
+        """Parse every data file, then write the rows in batches."""
+        vote_rows = self.transform_all()
+
+        with Session(self.engine) as session:
             # Commit changes
-            # Push the vote_meta entries and commit.
-            for vote_meta_entry in vote_meta_entries:
-                self.upsert_vote_meta(session, vote_meta_entry)
+            # Push the placeholders and vote_meta entries and commit.
+            self._write_rows(
+                session,
+                {
+                    table: vote_rows.get(table, [])
+                    for table in (Amendment.__tablename__, VoteMeta.__tablename__)
+                },
+            )
             session.commit()
 
+            vote_entries = vote_rows.get(Vote.__tablename__) or VotePositionBatch()
+            if vote_partitions:
+                self.write_votes_parallel(vote_entries, vote_partitions)
+                return
+
             # The number of votes can easily be in the 100s of thousands.
             # Batch commit 1000 at a time.
-            batch_size = 1000
-            for i in range(0, len(vote_entries), batch_size):
-                batch = vote_entries[i : i + batch_size]
+            for batch in vote_entries.chunks(1000):
                 self.upsert_vote_batch(session, batch)
                 session.commit()
 
@@ -0,0 +1,269 @@
+"""Parse and check every data file without touching the database."""
+
+import sys
+import time
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from shared_meta import downloaded_sessions
+from stdout_logger import StdoutLogger
+from database.base import TRANSFORM_ERRORS
+from database.bills import BILL_CHILDREN, Bill, BillOrm
+from database.votes import Vote, VoteMeta, VoteOrm
+from database.amendments import Amendment, AmendmentOrm
+from database.legislators import LegislatorOrm
+from database.sources import open_source
+
+# Fields each kind of data file needs for the loaders to produce a valid row,
+# as dotted paths into the document.
+REQUIRED_FIELDS = {
+    "bills": (
+        "bill_id",
+        "bill_type",
+        "number",
+        "official_title",
+        "sponsor.bioguide_id",
+        "status",
+        "status_at",
+        "congress",
+    ),
+    "amendments": (
+        "amendment_id",
+        "amends_bill.bill_id",
+        "sponsor",
+        "chamber",
+        "congress",
+    ),
+    "votes": (
+        "vote_id",
+        "number",
+        "chamber",
+        "date",
+        "result_text",
+        "category",
+        "votes",
+    ),
+}
+
+# How many examples of each kind of anomaly to print.
+EXAMPLES = 5
+
+
+def _lookup(data, field):
+    """Follow a dotted path into a document, or return None if any part is missing."""
+    for key in field.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+class DryRun:
+    """
+    Run the scan, parse and transform stages of an ingest without a database.
+
+    Bills, amendments and votes are checked in one pool of threads. Each
+    document is checked for the fields the loaders depend on, then transformed,
+    and the rows' references to legislators, bills and other rows are resolved
+    in memory, the way the database's keys would.
+    """
+
+    def __init__(self, data_dir, congress_nums: list[str] = []):
+        self.data_dir = data_dir
+        self.congress_nums = (
+            congress_nums if len(congress_nums) > 0 else downloaded_sessions(data_dir)
+        )
+        self.orms = {
+            "bills": BillOrm(data_dir, self.congress_nums),
+            "amendments": AmendmentOrm(data_dir, self.congress_nums),
+            "votes": VoteOrm(data_dir, self.congress_nums),
+        }
+        self.logger = StdoutLogger(__name__)
+        self.anomalies = defaultdict(list)
+
+    def _flag(self, kind, example):
+        self.anomalies[kind].append(example)
+
+    def check_file(self, stage, path):
+        """
+        Parse, check and transform one data file.
+
+        Returns:
+            tuple: (rows by table, [(anomaly, example)], seconds taken)
+        """
+        started = time.perf_counter()
+        orm = self.orms[stage]
+        try:
+            data = orm.source.load_json(path)
+        except ValueError as e:
+            problems = [("unreadable JSON", f"{path}: {e}")]
+            return {}, problems, time.perf_counter() - started
+
+        problems = [
+            (f"missing {field}", path)
+            for field in REQUIRED_FIELDS[stage]
+            if _lookup(data, field) is None
+        ]
+        try:
+            rows = orm.transform(path, data)
+        except TRANSFORM_ERRORS as e:
+            problems.append((f"{stage} transform failed", f"{path}: {e!r}"))
+            rows = {}
+        return rows, problems, time.perf_counter() - started
+
+    def load_legislators(self):
+        """Return the legislator ids and bioguide ids a full load would have."""
+        source = open_source(self.data_dir)
+        if not source.exists("legislators.json"):
+            self._flag("missing legislators.json", self.data_dir)
+            return set(), set()
+
+        legislators = LegislatorOrm(self.data_dir).parse(
+            source.load_json("legislators.json")
+        )
+        return {leg.id for leg in legislators}, {leg.bioguide_id for leg in legislators}
+
+    def run(self):
+        """
+        Check every data file and log what was found.
+
+        Returns:
+            int: The number of anomalies.
+        """
+        started = time.perf_counter()
+        legislator_ids, bioguide_ids = self.load_legislators()
+
+        jobs = [
+            (stage, path)
+            for stage, orm in self.orms.items()
+            for path in orm.datafiles()
+        ]
+        scanned = time.perf_counter()
+
+        files = defaultdict(int)
+        row_counts = defaultdict(int)
+        seconds = defaultdict(float)
+        sources = {}  # (table, id) -> first file with that id
+        sponsors = []  # (sponsor_id, path)
+        amended_bills = []  # (bill_id, path)
+        placeholders = set()
+
+        def record(table, row_id, path):
+            first = sources.setdefault((table, row_id), path)
+            if first != path:
+                self._flag(f"duplicate {table} id", f"{row_id}: {first}, {path}")
+
+        with ThreadPoolExecutor() as executor:
+            results = executor.map(lambda job: (*job, *self.check_file(*job)), jobs)
+            for stage, path, rows, problems, elapsed in results:
+                files[stage] += 1
+                seconds[stage] += elapsed
+                for kind, example in problems:
+                    self._flag(kind, example)
+
+                for bill in rows.get(Bill.__tablename__, []):
+                    row_counts[Bill.__tablename__] += 1
+                    record(Bill.__tablename__, bill["bill_id"], path)
+                    sponsors.append((bill["sponsor_id"], path))
+                for model in BILL_CHILDREN:
+                    row_counts[model.__tablename__] += len(
+                        rows.get(model.__tablename__, [])
+                    )
+
+                for amendment in rows.get(Amendment.__tablename__, []):
+                    if stage == "votes":
+                        # Placeholders the vote loader creates itself.
+                        placeholders.add(amendment["amendment_id"])
+                        continue
+                    row_counts[Amendment.__tablename__] += 1
+                    record(Amendment.__tablename__, amendment["amendment_id"], path)
+                    sponsors.append((amendment["sponsor_id"], path))
+                    amended_bills.append((amendment["bill_id"], path))
+
+                for vote_meta in rows.get(VoteMeta.__tablename__, []):
+                    row_counts[VoteMeta.__tablename__] += 1
+                    record(VoteMeta.__tablename__, vote_meta["vote_id"], path)
+                    if vote_meta["congress"] is None:
+                        self._flag("vote outside known congress sessions", path)
+
+                positions = rows.get(Vote.__tablename__)
+                if positions is not None:
+                    row_counts[Vote.__tablename__] += len(positions)
+                    for legislator_id in positions.legislator_ids:
+                        if legislator_id not in legislator_ids:
+                            self._flag(
+                                "vote by unknown legislator", f"{legislator_id}: {path}"
+                            )
+
+        # Every file has been read, so references can be resolved.
+        for sponsor_id, path in sponsors:
+            if sponsor_id is not None and sponsor_id not in bioguide_ids:
+                self._flag("unknown sponsor", f"{sponsor_id}: {path}")
+        for bill_id, path in amended_bills:
+            if bill_id is not None and (Bill.__tablename__, bill_id) not in sources:
+                self._flag("amendment to unknown bill", f"{bill_id}: {path}")
+
+        finished = time.perf_counter()
+        self.report(files, row_counts, seconds, scanned - started, finished - scanned)
+        self.logger.info(
+            "Placeholder amendments votes would create: %s", len(placeholders)
+        )
+        return sum(len(examples) for examples in self.anomalies.values())
+
+    def report(self, files, row_counts, seconds, scan_seconds, parse_seconds):
+        """Log throughput per stage, then every kind of anomaly with examples."""
+        print("")
+        self.logger.info(
+            "Congresses: %s", ", ".join(str(c) for c in self.congress_nums)
+        )
+        self.logger.info(
+            "Found %s data files in %.2fs.", sum(files.values()), scan_seconds
+        )
+        for stage in self.orms:
+            self.logger.info(
+                "[%s] %s files, %.2fs of parsing (%.0f files/s per thread)",
+                stage,
+                files[stage],
+                seconds[stage],
+                files[stage] / seconds[stage] if seconds[stage] else 0,
+            )
+        total = sum(files.values())
+        self.logger.info(
+            "Parsed %s files in %.2fs (%.0f files/s).",
+            total,
+            parse_seconds,
+            total / parse_seconds if parse_seconds else 0,
+        )
+        for table, count in row_counts.items():
+            self.logger.info("Rows for %s: %s", table, count)
+
+        print("")
+        if not self.anomalies:
+            self.logger.info("No anomalies found.")
+            return
+        for kind in sorted(self.anomalies):
+            examples = self.anomalies[kind]
+            self.logger.warning("%s: %s", kind, len(examples))
+            for example in examples[:EXAMPLES]:
+                self.logger.warning("  %s", example)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data_dir",
+        default="data",
+        help="Directory containing the data, or an archive of it (default: 'data')",
+    )
+    parser.add_argument(
+        "--congress",
+        help="Congress number to check; separate multiple numbers with a comma",
+    )
+    args = parser.parse_args()
+
+    congress_args = (
+        [x for x in args.congress.split(",") if x.isdigit()] if args.congress else []
+    )
+
+    dry_run = DryRun(data_dir=args.data_dir, congress_nums=congress_args)
+    sys.exit(1 if dry_run.run() else 0)
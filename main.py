@@ -2,24 +2,266 @@
 Main script to ingest data
 """
 
+import os
+import sys
+import argparse
+from dotenv import dotenv_values
+from database.base import BaseOrm
+from database.bills import BILL_CHILDREN, Bill, BillOrm
+from database.votes import Vote, VoteMeta, VoteOrm, VotePositionException
+from database.views import create_views
+from database.congress import Congress, CongressOrm
+from database.rollups import DailyVoteRollup, WeeklyVoteRollup
+from database.scorecards import LegislatorScorecard, ScorecardOrm
+from database.site_meta import SiteMetaOrm
+from database.amendments import Amendment, AmendmentOrm
+from database.legislators import Legislator, LegislatorOrm
+from database.reload import reload_congresses
+from database.changes import start_feed
+from database.row_cache import open_row_cache
+from database.decoding import decoder_name
+from database.maintenance import CLUSTER_INDEXES, run_maintenance
+from database.snapshots import export_snapshots
+from database.sources import watchable
+from database.packs import pack
+from database.shards import (
+    mark_shard_loaded,
+    merge_shards,
+    missing_shards,
+    parse_shard,
+    prepare_shard,
+    shard_congresses,
+    shard_schema,
+)
+from sanity_check import SanityCheck
+from dry_run import DryRun
+from watcher import Watcher
+from shared_meta import downloaded_sessions
+from stdout_logger import StdoutLogger
+from profiler import StageProfiler
 
-if __name__ == "__main__":
+logger = StdoutLogger(__name__)
+profiler = StageProfiler()
+
+# Tables rewritten for the congresses a run loads, announced when it finishes.
+CONGRESS_TABLES = [
+    Congress.__tablename__,
+    Bill.__tablename__,
+    *(model.__tablename__ for model in BILL_CHILDREN),
+    Amendment.__tablename__,
+    VoteMeta.__tablename__,
+    Vote.__tablename__,
+    VotePositionException.__tablename__,
+    LegislatorScorecard.__tablename__,
+    DailyVoteRollup.__tablename__,
+    WeeklyVoteRollup.__tablename__,
+]
+
+# Full loads and merges start from scratch, legislators included.
+ALL_TABLES = [Legislator.__tablename__] + CONGRESS_TABLES
+
+
+def load_legislators(args):
+    """Load legislators."""
+    logger.info("Importing legislators...")
+    with profiler.stage("legislators"):
+        legis_orm = LegislatorOrm(args.data_dir)
+        legis_orm.create_table()
+        legis_orm.populate()
+
+
+def load_congress_data(args, congress_nums, schema=None):
+    """Load bills, amendments, votes and vote metadata for some congresses."""
+    logger.info("Importing bills...")
+    with profiler.stage("bills"):
+        bill_orm = BillOrm(args.data_dir, congress_nums, schema)
+        bill_orm.create_table()
+        bill_orm.populate(writers=args.writers)
+
+    logger.info("Importing amendments...")
+    with profiler.stage("amendments"):
+        amend_orm = AmendmentOrm(args.data_dir, congress_nums, schema)
+        amend_orm.create_table()
+        amend_orm.populate(writers=args.writers)
+
+    logger.info("Importing votes and vote metadata...")
+    with profiler.stage("votes"):
+        vote_orm = VoteOrm(args.data_dir, congress_nums, schema)
+        vote_orm.create_table()
+        vote_orm.populate(writers=args.writers, vote_partitions=args.vote_partitions)
+
+
+def load_congress_meta(args):
+    """Load congress session metadata; vote metadata is stamped from the same file."""
+    logger.info("Importing Congress session metadata...")
+    with profiler.stage("congress"):
+        congress_orm = CongressOrm(args.data_dir)
+        congress_orm.create_table()
+        congress_orm.populate()
+
+
+def load_scorecards(args):
+    """Compute every legislator's scorecard from the freshly loaded votes."""
+    logger.info("Computing legislator scorecards...")
+    with profiler.stage("scorecards"):
+        scorecard_orm = ScorecardOrm(args.data_dir)
+        scorecard_orm.create_table()
+        scorecard_orm.populate()
+
+
+def finish(args, congress_nums, tables):
+    """
+    Tidy up the tables, set up views and metadata, announce what changed, and
+    sanity-check.
+    """
+    logger.info("Running table maintenance...")
+    with profiler.stage("maintenance"):
+        steps = run_maintenance(args.data_dir, tables, args.cluster or [])
+    for step, seconds in steps:
+        logger.info("[maintenance] %s: %.2fs", step, seconds)
+
+    logger.info("Setting up views...")
+    # TODO: what's interesting here is that when running for the first time,
+    # no views were created.
+    with profiler.stage("views"):
+        create_views(args.data_dir)
+
+    if args.snapshot_dir:
+        logger.info("Exporting static JSON snapshots...")
+        with profiler.stage("snapshots"):
+            counts = export_snapshots(args.data_dir, args.snapshot_dir)
+        logger.info(
+            "Exported snapshots to %s (%s written, %s unchanged, %s removed).",
+            args.snapshot_dir,
+            counts["written"],
+            counts["unchanged"],
+            counts["removed"],
+        )
+
+    # Update the database with the latest update time
+    logger.info("Updating site metadata...")
+    with profiler.stage("site_meta"):
+        site_meta_orm = SiteMetaOrm()
+        site_meta_orm.create_table()
+        site_meta_orm.set_last_update(tables, congress_nums)
+
+    logger.info("Running sanity checks...")
+    with profiler.stage("sanity"):
+        checker = SanityCheck(args.data_dir, congress_nums)
+        checker.run()
+
+
+def run_full(args, congress_nums):
+    """Wipe the database and load everything."""
+    logger.info("Dropping all tables in preparation for data load...")
+    with profiler.stage("drop"):
+        base_orm = BaseOrm(args.data_dir)
+        base_orm.drop_all_tables()
+
+    load_legislators(args)
+    load_congress_meta(args)
+    load_congress_data(args, congress_nums)
+    load_scorecards(args)
+    finish(args, congress_nums, ALL_TABLES)
+
+
+def run_reload(args, congress_nums):
+    """Reload only the chosen congresses, leaving everything else in place."""
+    load_congress_meta(args)
+    logger.info("Reloading congresses %s...", ", ".join(congress_nums))
+    with profiler.stage("reload"):
+        reload_congresses(args.data_dir, congress_nums)
+    finish(args, congress_nums, CONGRESS_TABLES)
+
+
+def run_watch(args):
+    """Ingest new and changed data files as the scraper writes them."""
+    watch_nums = (
+        [x for x in args.congress.split(",") if x.isdigit()] if args.congress else None
+    )
+    watcher = Watcher(
+        args.data_dir,
+        watch_nums,
+        interval=args.interval,
+        changes_path=args.changes,
+        snapshot_dir=args.snapshot_dir,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching.")
+
+
+def run_pack(args, congress_nums):
+    """Pack the data directory into per-congress segment files."""
+    logger.info("Packing congresses %s into %s...", ", ".join(congress_nums), args.pack)
+    with profiler.stage("pack"):
+        results = pack(args.data_dir, args.pack, congress_nums)
+    for congress, counts in results.items():
+        logger.info(
+            "[%s] %s added, %s changed, %s unchanged, %s removed, %s skipped.",
+            congress,
+            counts["added"],
+            counts["changed"],
+            counts["unchanged"],
+            counts["removed"],
+            counts["skipped"],
+        )
+    logger.info("Load it with --data_dir %s.", args.pack)
+
+
+def run_dry_run(args, congress_nums):
+    """Parse and check every data file without touching the database."""
+    logger.info("Checking data files without loading them...")
+    with profiler.stage("dry_run"):
+        anomalies = DryRun(args.data_dir, congress_nums).run()
+    if anomalies:
+        logger.error("Found %s anomalies.", anomalies)
+        sys.exit(1)
+
+
+def run_shard(args, congress_nums):
+    """Load one shard's congresses into its own staging schema."""
+    index, count = parse_shard(args.shard)
+    shard_nums = shard_congresses(congress_nums, index, count)
+    logger.info(
+        "Loading shard %s of %s (congresses: %s)...",
+        index,
+        count,
+        ", ".join(shard_nums) or "none",
+    )
+
+    prepare_shard(args.data_dir, index)
+    load_congress_data(args, shard_nums, shard_schema(index))
+    mark_shard_loaded(args.data_dir, index)
+    logger.info("Shard loaded. Run with --merge %s once every shard is done.", count)
+
+
+def run_merge(args, congress_nums):
+    """Combine every shard's staging schema into the public tables."""
+    missing = missing_shards(args.data_dir, args.merge)
+    if missing:
+        logger.error("Shards not loaded yet: %s", ", ".join(missing))
+        sys.exit(1)
+
+    logger.info("Dropping all tables in preparation for data load...")
+    with profiler.stage("drop"):
+        base_orm = BaseOrm(args.data_dir)
+        base_orm.drop_all_tables()
+
+    load_legislators(args)
+    load_congress_meta(args)
 
-    import os
-    import argparse
-    from dotenv import dotenv_values
-    from database.base import BaseOrm
-    from database.bills import BillOrm
-    from database.votes import VoteOrm
-    from database.views import create_views
-    from database.congress import CongressOrm
-    from database.site_meta import SiteMetaOrm
-    from database.amendments import AmendmentOrm
-    from database.legislators import LegislatorOrm
-    from sanity_check import SanityCheck
-    from stdout_logger import StdoutLogger
-
-    logger = StdoutLogger(__name__)
+    logger.info("Merging %s shards...", args.merge)
+    with profiler.stage("merge"):
+        skipped = merge_shards(args.data_dir, args.merge)
+    for table, count in skipped.items():
+        logger.warning("Skipped %s %s rows whose references are missing.", count, table)
+    load_scorecards(args)
+    finish(args, congress_nums, ALL_TABLES)
+
+
+if __name__ == "__main__":
 
     # Check if we've passed "data_dir=" to the script, and if so, use it in the
     # populate methods.
@@ -27,7 +269,10 @@ if __name__ == "__main__":
     parser.add_argument(
         "--data_dir",
         default="data",
-        help="Directory containing the data (default: 'data')",
+        help=(
+            "Directory containing the data, eg. the scraper's own congress/data, "
+            "or a .tar, .tar.gz or .zip of it (default: 'data')"
+        ),
     )
     parser.add_argument(
         "--environment",
@@ -35,8 +280,153 @@ if __name__ == "__main__":
         type=str,
         help="The environment to use (default: 'prod')",
     )
+    parser.add_argument(
+        "--writers",
+        default=0,
+        type=int,
+        help=(
+            "Overlap parsing and database writes for bills, amendments and votes "
+            "using this many writer connections (default: 0, parse then write)"
+        ),
+    )
+    parser.add_argument(
+        "--vote_partitions",
+        default=0,
+        type=int,
+        help=(
+            "Split vote rows across this many connections written in parallel, "
+            "then merge them in one transaction (default: 0, single connection). "
+            "Can't be combined with --writers"
+        ),
+    )
+    parser.add_argument(
+        "--congress",
+        help="Congress number to load; separate multiple numbers with a comma",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--shard",
+        help=(
+            "Load only this shard's congresses, as 'i/N', into a staging schema "
+            "for a later --merge"
+        ),
+    )
+    mode.add_argument(
+        "--merge",
+        type=int,
+        help="Merge this many loaded shards and finish the ingest",
+    )
+    mode.add_argument(
+        "--reload",
+        action="store_true",
+        help=(
+            "Delete and reload only the --congress congresses, in one transaction, "
+            "without wiping the rest of the database"
+        ),
+    )
+
+    mode.add_argument(
+        "--pack",
+        metavar="PACK_DIR",
+        help=(
+            "Pack the --data_dir's bills, amendments and votes into one segment "
+            "file per congress in this directory, for use as a faster --data_dir, "
+            "then exit. Packing into an existing pack only appends what changed"
+        ),
+    )
+    mode.add_argument(
+        "--dry_run",
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Parse and check every bill, amendment and vote file, resolve "
+            "references in memory and report anomalies and throughput, without "
+            "a database. Exits with status 1 if anything would not ingest cleanly"
+        ),
+    )
+    mode.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and ingest new or changed data files as they appear",
+    )
+    parser.add_argument(
+        "--changes",
+        help=(
+            "Write one JSON line per bill, amendment, vote_meta or votes row "
+            "inserted, updated or deleted in this run to this file"
+        ),
+    )
+    parser.add_argument(
+        "--snapshot_dir",
+        help=(
+            "After creating the views, export gzipped JSON documents per "
+            "legislator, bill and vote to this directory, rewriting only those "
+            "that changed"
+        ),
+    )
+    parser.add_argument(
+        "--cluster",
+        action="append",
+        choices=sorted(CLUSTER_INDEXES),
+        help=(
+            "After loading, rewrite this table in index order: votes by vote and "
+            "legislator, vote_meta by date. Blocks reads of the table while it "
+            "runs; repeat to cluster both"
+        ),
+    )
+    parser.add_argument(
+        "--row_cache",
+        metavar="CACHE_DIR",
+        help=(
+            "Keep the rows transformed from each bill, amendment and vote file in "
+            "this directory, keyed by the file's contents, and reuse them instead "
+            "of parsing unchanged files again"
+        ),
+    )
+    parser.add_argument(
+        "--row_cache_mb",
+        default=2048,
+        type=int,
+        help=(
+            "Evict the least recently used cached rows once the --row_cache "
+            "directory grows past this many megabytes (default: 2048)"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write a cProfile dump for each stage",
+    )
+    parser.add_argument(
+        "--profile_memory",
+        "--profile-memory",
+        action="store_true",
+        help="Write the top tracemalloc allocations for each stage",
+    )
+    parser.add_argument(
+        "--profile_sql",
+        "--profile-sql",
+        action="store_true",
+        help="Write SQL statement timings for each stage",
+    )
+    parser.add_argument(
+        "--profile_dir",
+        help="Where to write profiling output (default: profiles/<timestamp>)",
+    )
+    parser.add_argument(
+        "--interval",
+        default=5.0,
+        type=float,
+        help="Seconds between polls of the data directory in --watch mode",
+    )
 
     args = parser.parse_args()
+    if args.reload and not args.congress:
+        parser.error("--reload requires --congress")
+    if args.writers and args.vote_partitions:
+        parser.error("--vote_partitions can't be combined with --writers")
+    if args.watch and not watchable(args.data_dir):
+        parser.error("--watch requires a data directory, not an archive or pack")
 
     base_env = dotenv_values(".env")
     if args.environment != "prod":
@@ -44,48 +434,71 @@ if __name__ == "__main__":
         base_env.update(override_env)
     os.environ.update(base_env)
 
-    logger.info("Dropping all tables in preparation for data load...")
-    base_orm = BaseOrm(args.data_dir)
-    base_orm.drop_all_tables()
-
-    logger.info("Importing legislators...")
-    legis_orm = LegislatorOrm(args.data_dir)
-    legis_orm.create_table()
-    legis_orm.populate()
+    try:
+        logger.info("Decoding JSON with %s.", decoder_name())
+    except ValueError as e:
+        parser.error(str(e))
 
-    logger.info("Importing bills...")
-    bill_orm = BillOrm(args.data_dir)
-    bill_orm.create_table()
-    bill_orm.populate()
+    congress_nums = (
+        [x for x in args.congress.split(",") if x.isdigit()]
+        if args.congress
+        else [str(x) for x in downloaded_sessions(args.data_dir)]
+    )
 
-    logger.info("Importing amendments...")
-    amend_orm = AmendmentOrm(args.data_dir)
-    amend_orm.create_table()
-    amend_orm.populate()
+    profiler.configure(
+        output_dir=args.profile_dir,
+        cpu=args.profile,
+        memory=args.profile_memory,
+        sql=args.profile_sql,
+    )
+    if profiler.enabled:
+        logger.info("Writing profiles to %s", profiler.output_dir)
 
-    logger.info("Importing votes and vote metadata...")
-    vote_orm = VoteOrm(args.data_dir)
-    vote_orm.create_table()
-    vote_orm.populate()
+    feed = (
+        start_feed()
+        if args.changes and not (args.shard or args.pack or args.dry_run)
+        else None
+    )
 
-    logger.info("Importing Congress session metadata...")
-    congress_orm = CongressOrm(args.data_dir)
-    congress_orm.create_table()
-    congress_orm.populate()
+    row_cache = (
+        open_row_cache(args.row_cache, args.row_cache_mb * 1024 * 1024)
+        if args.row_cache and not (args.pack or args.dry_run or args.watch)
+        else None
+    )
 
-    logger.info("Setting up views...")
-    # TODO: what's interesting here is that when running for the first time,
-    # no views were created.
-    create_views(args.data_dir)
+    if args.pack:
+        run_pack(args, congress_nums)
+    elif args.dry_run:
+        run_dry_run(args, congress_nums)
+    elif args.shard:
+        run_shard(args, congress_nums)
+    elif args.merge:
+        run_merge(args, congress_nums)
+    elif args.reload:
+        run_reload(args, congress_nums)
+    elif args.watch:
+        run_watch(args)
+    else:
+        run_full(args, congress_nums)
 
-    # Update the database with the latest update time
-    logger.info("Updating site metadata...")
-    site_meta_orm = SiteMetaOrm()
-    site_meta_orm.create_table()
-    site_meta_orm.set_last_update()
+    if feed and not args.watch:
+        counts = feed.write(args.changes)
+        logger.info(
+            "Wrote change feed to %s (%s inserted, %s updated, %s deleted).",
+            args.changes,
+            counts["insert"],
+            counts["update"],
+            counts["delete"],
+        )
 
-    logger.info("Running sanity checks...")
-    checker = SanityCheck(args.data_dir)
-    checker.run()
+    if row_cache:
+        removed, size = row_cache.evict()
+        logger.info(
+            "Row cache: %s hits, %s misses, %s evicted, %.1f MB.",
+            row_cache.hits,
+            row_cache.misses,
+            removed,
+            size / 1024 / 1024,
+        )
 
     logger.info("Done!")
@@ -0,0 +1,146 @@
+"""Per-stage CPU, memory and SQL profiling for the ingest."""
+
+import os
+import csv
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StageProfiler:
+    """
+    Profile each ingest stage separately and write the results to a directory.
+
+    For every stage this can produce:
+      - `<stage>.prof`: a cProfile dump (open with snakeviz, pstats, etc.).
+        cProfile only sees the thread running the stage, not worker threads.
+      - `<stage>.memory.txt`: the top allocation sites from tracemalloc, plus
+        the peak traced memory.
+      - `<stage>.sql.csv`: time spent per SQL statement, across all threads.
+    A `summary.json` with wall time per stage is written after every stage.
+    """
+
+    def __init__(self):
+        self.output_dir = None
+        self.cpu = False
+        self.memory = False
+        self.sql = False
+        self.top_allocations = 25
+        self.summary = {}
+        self._sql_times = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """Determine if any kind of profiling is switched on."""
+        return self.cpu or self.memory or self.sql
+
+    def configure(self, output_dir=None, cpu=False, memory=False, sql=False):
+        """
+        Switch profiling on.
+
+        Args:
+            output_dir (str | None): Where to write results. Defaults to a
+                timestamped folder under `profiles/`.
+            cpu (bool): Capture a cProfile dump per stage.
+            memory (bool): Capture tracemalloc top allocations per stage.
+            sql (bool): Capture SQL statement timings per stage.
+        """
+        self.cpu, self.memory, self.sql = cpu, memory, sql
+        if not self.enabled:
+            return
+
+        self.output_dir = output_dir or os.path.join(
+            "profiles", datetime.now().strftime("%Y%m%d-%H%M%S")
+        )
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        if sql:
+            event.listen(Engine, "before_cursor_execute", self._before_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        # pylint: disable=unused-argument,too-many-arguments
+        conn.info.setdefault("profiler_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        # pylint: disable=unused-argument,too-many-arguments
+        elapsed = time.perf_counter() - conn.info["profiler_start"].pop()
+        with self._lock:
+            stats = self._sql_times.setdefault(statement, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+
+    def _path(self, stage, suffix):
+        return os.path.join(self.output_dir, f"{stage}{suffix}")
+
+    def _write_sql(self, stage):
+        with self._lock:
+            sql_times, self._sql_times = self._sql_times, {}
+
+        path = self._path(stage, ".sql.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["calls", "total_seconds", "mean_seconds", "statement"])
+            for statement, (calls, total) in sorted(
+                sql_times.items(), key=lambda item: item[1][1], reverse=True
+            ):
+                writer.writerow(
+                    [
+                        calls,
+                        f"{total:.6f}",
+                        f"{total / calls:.6f}",
+                        " ".join(statement.split()),
+                    ]
+                )
+
+    def _write_memory(self, stage, snapshot, peak):
+        stats = snapshot.statistics("lineno")
+        with open(self._path(stage, ".memory.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n")
+            f.write(f"Top {self.top_allocations} allocation sites by size:\n\n")
+            for stat in stats[: self.top_allocations]:
+                f.write(f"{stat}\n")
+
+    @contextmanager
+    def stage(self, name):
+        """Profile everything that runs inside the block as one stage."""
+        if not self.enabled:
+            yield
+            return
+
+        with self._lock:
+            self._sql_times = {}
+        profile = cProfile.Profile() if self.cpu else None
+        if self.memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        if profile:
+            profile.enable()
+
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            elapsed = time.perf_counter() - started
+
+            if profile:
+                profile.dump_stats(self._path(name, ".prof"))
+            if self.memory:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self._write_memory(name, snapshot, peak)
+            if self.sql:
+                self._write_sql(name)
+
+            self.summary[name] = round(elapsed, 3)
+            with open(self._path("summary", ".json"), "w", encoding="utf-8") as f:
+                json.dump({"stage_seconds": self.summary}, f, indent=2)
@@ -6,6 +6,7 @@ from stdout_logger import StdoutLogger
 from database.votes import VoteOrm
 from database.congress import CongressOrm
 from database.legislators import LegislatorOrm
+from database.scorecards import ScorecardOrm
 
 COLORS = {
     "HEADER": "\033[95m",
@@ -94,12 +95,32 @@ class SanityCheck:
             self._print_pass_fail(pass_fail, congress_num)
             print("")
 
+    def _run_scorecard_sanity_check(self):
+        """
+        Sanity-check legislator scorecards.
+        The incrementally maintained table should match a from-scratch
+        recomputation.
+        """
+        scorecard_orm = ScorecardOrm(self.data_dir)
+        scorecard_orm.ensure_populated()
+        mismatches = scorecard_orm.find_mismatches()
+
+        self.logger.info("Scorecard count: %s", scorecard_orm.get_count())
+        self.logger.info("Scorecards out of date: %s", len(mismatches))
+        for legislator_id, congress in mismatches[:10]:
+            self.logger.warning(
+                "[%s] Scorecard out of date: %s", congress, legislator_id
+            )
+        self._print_pass_fail(not mismatches, "n/a")
+        print("")
+
     def run(self):
         """Run all sanity checks."""
         print("")
         self._run_legislator_sanity_check()
         self._run_vote_sanity_check()
         self._run_congress_sanity_check()
+        self._run_scorecard_sanity_check()
 
 
 if __name__ == "__main__":
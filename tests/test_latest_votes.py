@@ -0,0 +1,82 @@
+"""Tests for picking the latest vote on each bill or nomination."""
+
+from datetime import datetime
+from database.votes import latest_vote_ids, unique_matching_field
+
+
+def test_bill_id_is_the_matching_field():
+    assert unique_matching_field("hr1-119", None) == "hr1-119"
+
+
+def test_bill_id_takes_precedence_over_nomination_title():
+    assert unique_matching_field("hr1-119", "Jane Doe, of Ohio") == "hr1-119"
+
+
+def test_nomination_title_is_truncated_to_ten_characters():
+    assert unique_matching_field(None, "Jane Doe, of Ohio") == "Jane Doe, "
+    assert unique_matching_field(None, "Short") == "Short"
+
+
+def test_no_bill_or_nomination_has_no_matching_field():
+    assert unique_matching_field(None, None) is None
+
+
+def test_later_vote_displaces_earlier_one():
+    rows = [
+        ("h1-119.2025", "hr1-119", datetime(2025, 1, 10)),
+        ("h2-119.2025", "hr1-119", datetime(2025, 2, 10)),
+        ("s1-119.2025", "hr2-119", datetime(2025, 1, 5)),
+    ]
+    assert latest_vote_ids(rows) == {"h2-119.2025", "s1-119.2025"}
+
+
+def test_earlier_vote_seen_later_does_not_displace():
+    rows = [
+        ("h2-119.2025", "hr1-119", datetime(2025, 2, 10)),
+        ("h1-119.2025", "hr1-119", datetime(2025, 1, 10)),
+    ]
+    assert latest_vote_ids(rows) == {"h2-119.2025"}
+
+
+def test_votes_tied_on_date_are_all_latest():
+    date = datetime(2025, 3, 1, 14, 30)
+    rows = [
+        ("h1-119.2025", "hr1-119", datetime(2025, 2, 1)),
+        ("h2-119.2025", "hr1-119", date),
+        ("s3-119.2025", "hr1-119", date),
+    ]
+    assert latest_vote_ids(rows) == {"h2-119.2025", "s3-119.2025"}
+
+
+def test_tie_is_broken_by_a_later_vote():
+    date = datetime(2025, 3, 1)
+    rows = [
+        ("h2-119.2025", "hr1-119", date),
+        ("s3-119.2025", "hr1-119", date),
+        ("h4-119.2025", "hr1-119", datetime(2025, 3, 2)),
+    ]
+    assert latest_vote_ids(rows) == {"h4-119.2025"}
+
+
+def test_votes_without_matching_field_are_never_latest():
+    rows = [
+        ("s1-119.2025", None, datetime(2025, 1, 1)),
+        ("s2-119.2025", None, datetime(2025, 2, 1)),
+    ]
+    assert latest_vote_ids(rows) == set()
+
+
+def test_nominations_match_on_truncated_title():
+    rows = [
+        (
+            "s1-119.2025",
+            unique_matching_field(None, "Jane Doe, of Ohio, to be a Judge"),
+            datetime(2025, 1, 1),
+        ),
+        (
+            "s2-119.2025",
+            unique_matching_field(None, "Jane Doe, of Ohio, to be an Ambassador"),
+            datetime(2025, 2, 1),
+        ),
+    ]
+    assert latest_vote_ids(rows) == {"s2-119.2025"}
@@ -0,0 +1,33 @@
+"""Tests for leaving staged rows with missing references out of a shard merge."""
+
+from database.bills import Bill
+from database.votes import VotePositionException
+from database.shards import SHARD_TABLES, _orphans_statement
+
+
+def test_orphans_are_checked_against_the_public_tables():
+    sql = _orphans_statement(Bill.__table__, "shard_1")
+    assert sql.startswith("DELETE FROM shard_1.bills AS s WHERE ")
+    assert "NOT EXISTS (SELECT 1 FROM public.legislators r" in sql
+    assert "r.bioguide_id = s.sponsor_id" in sql
+
+
+def test_null_references_are_not_orphans():
+    sql = _orphans_statement(Bill.__table__, "shard_1")
+    assert "s.sponsor_id IS NOT NULL AND NOT EXISTS" in sql
+
+
+def test_composite_references_match_on_every_column():
+    sql = _orphans_statement(VotePositionException.__table__, "shard_2")
+    assert "s.vote_id IS NOT NULL AND s.legislator_id IS NOT NULL" in sql
+    assert "r.vote_id = s.vote_id AND r.legislator_id = s.legislator_id" in sql
+
+
+def test_referenced_tables_are_merged_first():
+    # Orphans are only caught if what they reference is already merged.
+    merged = set()
+    for table in SHARD_TABLES:
+        for fk in table.foreign_key_constraints:
+            referred = fk.referred_table
+            assert referred not in SHARD_TABLES or referred in merged
+        merged.add(table)
@@ -0,0 +1,153 @@
+"""Tests for picking up data files as they land in a watched directory."""
+
+import json
+import pytest
+import watcher
+from database.bills import BillOrm
+from database.amendments import AmendmentOrm
+from database.votes import VoteOrm
+from database.scorecards import ScorecardOrm
+
+
+class FakeSession:
+    """Stands in for a database session; the loaders' writes are stubbed out."""
+
+    commits = 0
+
+    def __init__(self, engine):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        FakeSession.commits += 1
+
+
+@pytest.fixture(name="written")
+def fixture_written(monkeypatch):
+    """Stub out the database, collecting the bill ids each ingest writes."""
+    written = []
+    # The engine is created but never connects.
+    monkeypatch.setenv("DATABASE_URL", "postgresql://localhost/unused")
+
+    def write_rows(orm, session, rows):
+        written.extend(bill["bill_id"] for bill in rows.get("bills", []))
+
+    for orm_class in (BillOrm, AmendmentOrm, VoteOrm):
+        monkeypatch.setattr(orm_class, "write_rows", write_rows)
+    monkeypatch.setattr(VoteOrm, "migrate_rollup_tables", lambda orm: None)
+    monkeypatch.setattr(ScorecardOrm, "ensure_populated", lambda orm: None)
+    monkeypatch.setattr(watcher.Watcher, "refresh", lambda self: None)
+    monkeypatch.setattr(watcher, "Session", FakeSession)
+    FakeSession.commits = 0
+    return written
+
+
+def write_bill(data_dir, number, title="A bill"):
+    """Drop a bill data file into the data directory."""
+    path = data_dir / "119" / "bills" / "hr" / f"hr{number}" / "data.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                "bill_id": f"hr{number}-119",
+                "bill_type": "hr",
+                "number": str(number),
+                "congress": "119",
+                "official_title": title,
+                "sponsor": {"bioguide_id": "B000001"},
+                "status": "INTRODUCED",
+                "status_at": "2025-01-03",
+            }
+        )
+    )
+    return path
+
+
+def new_watcher(data_dir):
+    return watcher.Watcher(str(data_dir), interval=0, debounce=0)
+
+
+def test_files_already_there_are_not_ingested(tmp_path, written):
+    write_bill(tmp_path, 1)
+    assert new_watcher(tmp_path).run_once() == 0
+    assert not written
+
+
+def test_new_file_is_ingested(tmp_path, written):
+    watch = new_watcher(tmp_path)
+    write_bill(tmp_path, 1)
+    assert watch.run_once() == 1
+    assert written == ["hr1-119"]
+    assert FakeSession.commits == 1
+    assert watch.run_once() == 0
+
+
+def test_modified_file_is_ingested_again(tmp_path, written):
+    write_bill(tmp_path, 1)
+    watch = new_watcher(tmp_path)
+    write_bill(tmp_path, 1, title="A longer title than before")
+    assert watch.run_once() == 1
+    assert written == ["hr1-119"]
+
+
+def test_unchanged_signature_is_not_ingested(tmp_path, written):
+    write_bill(tmp_path, 1)
+    write_bill(tmp_path, 2)
+    watch = new_watcher(tmp_path)
+    write_bill(tmp_path, 2, title="Amended")
+    assert watch.poll() == ["119/bills/hr/hr2/data.json"]
+
+
+def test_files_landing_while_waiting_are_ingested_together(
+    tmp_path, written, monkeypatch
+):
+    watch = new_watcher(tmp_path)
+    write_bill(tmp_path, 1)
+    burst = [2, 3]
+
+    def sleep(seconds):
+        if burst:
+            write_bill(tmp_path, burst.pop(0))
+
+    monkeypatch.setattr(watcher.time, "sleep", sleep)
+    assert watch.run_once() == 3
+    assert written == ["hr1-119", "hr2-119", "hr3-119"]
+    assert FakeSession.commits == 1
+
+
+def test_unparseable_file_is_skipped_and_retried(tmp_path, written):
+    watch = new_watcher(tmp_path)
+    write_bill(tmp_path, 1)
+    half_written = tmp_path / "119" / "bills" / "hr" / "hr2" / "data.json"
+    half_written.parent.mkdir(parents=True)
+    half_written.write_text('{"bill_id": "hr2-')
+
+    assert watch.run_once() == 1
+    assert written == ["hr1-119"]
+    assert "119/bills/hr/hr2/data.json" not in watch.seen
+
+    write_bill(tmp_path, 2)
+    assert watch.run_once() == 1
+    assert written == ["hr1-119", "hr2-119"]
+
+
+def test_failed_ingest_is_retried_on_the_next_poll(tmp_path, written, monkeypatch):
+    watch = new_watcher(tmp_path)
+    write_bill(tmp_path, 1)
+
+    def fail(orm, session, rows):
+        raise RuntimeError("database went away")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(BillOrm, "write_rows", fail)
+        with pytest.raises(RuntimeError):
+            watch.run_once()
+    assert "119/bills/hr/hr1/data.json" not in watch.seen
+
+    assert watch.run_once() == 1
+    assert written == ["hr1-119"]
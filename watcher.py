@@ -0,0 +1,192 @@
+"""Watch the data directory and ingest new or changed data files as they land."""
+
+import time
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from database.base import TRANSFORM_ERRORS
+from database.bills import Bill, BillOrm
+from database.votes import VoteMeta, VoteOrm
+from database.views import create_views
+from database.site_meta import SiteMetaOrm
+from database.amendments import Amendment, AmendmentOrm
+from database.rollups import ROLLUPS
+from database.scorecards import LegislatorScorecard, ScorecardOrm
+from database.changes import active_feed
+from database.snapshots import export_snapshots
+from database.pipeline import merge_rows
+from stdout_logger import StdoutLogger
+
+# Relationships on the models above resolve "Legislator" by name.
+from database.legislators import Legislator  # pylint: disable=unused-import
+
+
+class Watcher:
+    """Poll the data directory for new or modified bill, amendment and vote files."""
+
+    def __init__(
+        self,
+        data_dir,
+        congress_nums=None,
+        interval=5.0,
+        debounce=1.0,
+        changes_path=None,
+        snapshot_dir=None,
+    ):
+        self.data_dir = data_dir
+        self.changes_path = changes_path
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self.debounce = debounce
+        self.logger = StdoutLogger(__name__)
+
+        # Loaders in the order their rows have to be written.
+        self.orms = [
+            BillOrm(data_dir, congress_nums, atomic=True),
+            AmendmentOrm(data_dir, congress_nums, atomic=True),
+            VoteOrm(data_dir, congress_nums, atomic=True),
+        ]
+        self.orms[-1].migrate_rollup_tables()
+        self.scorecard_orm = ScorecardOrm(data_dir)
+        self.scorecard_orm.ensure_populated()
+        self.seen = self.snapshot()
+        # What the last ingest changed, for the update notification.
+        self.changed_tables = set()
+        self.changed_congresses = set()
+        # Votes and bills whose snapshot documents need rewriting.
+        self.changed_vote_ids = set()
+        self.changed_bill_ids = set()
+
+    def snapshot(self):
+        """Map every watched data file to its modification time and size."""
+        files = {}
+        for orm in self.orms:
+            for path in orm.datafiles():
+                signature = orm.source.signature(path)
+                if signature is not None:
+                    files[path] = signature
+        return files
+
+    def poll(self):
+        """Return the data files added or modified since the last poll."""
+        current = self.snapshot()
+        changed = [path for path, sig in current.items() if self.seen.get(path) != sig]
+        self.seen = current
+        return changed
+
+    def wait_for_quiet(self, changed):
+        """Keep collecting changes until a burst of writes has settled down."""
+        changed = set(changed)
+        while True:
+            time.sleep(self.debounce)
+            more = self.poll()
+            if not more:
+                return sorted(changed)
+            changed.update(more)
+
+    def _owner(self, path):
+        """Find the loader responsible for a data file."""
+        parts = path.split("/")
+        for orm, folder in zip(self.orms, ("bills", "amendments", "votes")):
+            if folder in parts:
+                return orm
+        return None
+
+    def ingest(self, paths):
+        """
+        Ingest the given data files through the regular loaders.
+
+        Files that can't be parsed yet (eg. still being written) are forgotten
+        so the next poll picks them up again. Scorecards are recomputed only for
+        the legislators with a position on one of the ingested votes.
+
+        Returns:
+            int: The number of files ingested.
+        """
+        ingested = 0
+        vote_ids = set()
+        self.changed_tables = set()
+        self.changed_congresses = set()
+        self.changed_bill_ids = set()
+        with Session(self.orms[0].engine) as session:
+            for orm in self.orms:
+                rows = {}
+                for path in paths:
+                    if self._owner(path) is not orm:
+                        continue
+                    try:
+                        merge_rows(rows, orm.transform(path))
+                    except TRANSFORM_ERRORS as e:
+                        self.logger.warning("Skipping %s for now: %s", path, e)
+                        self.seen.pop(path, None)
+                        continue
+                    ingested += 1
+                    self.changed_congresses.add(path.split("/")[0])
+                orm.write_rows(session, rows)
+                self.changed_tables.update(table for table in rows if rows[table])
+                vote_ids.update(
+                    entry["vote_id"] for entry in rows.get(VoteMeta.__tablename__, [])
+                )
+                for table in (Bill.__tablename__, Amendment.__tablename__):
+                    self.changed_bill_ids.update(
+                        entry["bill_id"]
+                        for entry in rows.get(table, [])
+                        if entry["bill_id"] is not None
+                    )
+            if vote_ids:
+                self.scorecard_orm.refresh(session, vote_ids=sorted(vote_ids))
+                self.changed_tables.add(LegislatorScorecard.__tablename__)
+                self.changed_tables.update(m.__tablename__ for m in ROLLUPS.values())
+            session.commit()
+
+        self.changed_vote_ids = vote_ids
+        return ingested
+
+    def refresh(self):
+        """Refresh everything that depends on the freshly ingested rows."""
+        create_views(self.data_dir)
+        site_meta_orm = SiteMetaOrm()
+        site_meta_orm.create_table()
+        site_meta_orm.set_last_update(self.changed_tables, self.changed_congresses)
+        if self.snapshot_dir:
+            export_snapshots(
+                self.data_dir,
+                self.snapshot_dir,
+                vote_ids=self.changed_vote_ids,
+                bill_ids=self.changed_bill_ids,
+            )
+
+    def run_once(self):
+        """Poll once and ingest whatever changed. Returns the files ingested."""
+        changed = self.poll()
+        if not changed:
+            return 0
+
+        changed = self.wait_for_quiet(changed)
+        try:
+            ingested = self.ingest(changed)
+        except Exception:
+            # Nothing was committed, so make the next poll pick these up again.
+            for path in changed:
+                self.seen.pop(path, None)
+            raise
+        if ingested:
+            self.refresh()
+            self.logger.info("Ingested %s changed data files.", ingested)
+
+            feed = active_feed()
+            if feed and self.changes_path:
+                feed.write(self.changes_path, append=True)
+                feed.reset()
+        return ingested
+
+    def run(self):
+        """Watch forever."""
+        self.logger.info(
+            "Watching %s for changes every %ss...", self.data_dir, self.interval
+        )
+        while True:
+            try:
+                self.run_once()
+            except SQLAlchemyError as e:
+                self.logger.error("Ingest failed, retrying on the next poll: %s", e)
+            time.sleep(self.interval)